@@ -0,0 +1,529 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from copy import deepcopy
+from itertools import islice
+import fiabledb
+
+
+def timed(function, *args, **kwargs):
+    """Run a function and return its result and the seconds it took"""
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def fill(db: fiabledb.FiableDB, records: int = 100000, updates: int = 100000) -> None:
+    """Fill a database with records and some revisions of them"""
+    db.add(
+        [
+            {"name": f"user{i}", "email": f"user{i}@example.com", "age": i % 90}
+            for i in range(records)
+        ]
+    )
+    for i in range(updates):
+        db.update(i % records + 1, {"age": i % 77})
+
+
+def benchmark_snapshot(records: int = 100000, updates: int = 100000) -> None:
+    """Compare the size and load time of the JSON file and a snapshot"""
+    with tempfile.TemporaryDirectory() as directory:
+        json_file = os.path.join(directory, "db.json")
+        journal_file = os.path.join(directory, "db.jsonl")
+
+        db = fiabledb.FiableDB(json_file)
+        db.start(journal=False)
+        fill(db, records, updates)
+        _, save_json = timed(db.save)
+        _, load_json = timed(db.load)
+
+        db = fiabledb.FiableDB(journal_file)
+        db.start(journal=True)
+        fill(db, records, updates)
+        _, save_journal = timed(db.save)
+        _, load_journal = timed(db.load)
+        journal_size = os.path.getsize(journal_file)
+        _, checkpoint = timed(db.checkpoint)
+        _, load_snapshot = timed(db.load)
+
+        snapshot_file = fiabledb.get_snapshot_file(journal_file)
+        print(f"{records} records, {records + updates} revisions")
+        print(f"{'':10} {'size MB':>10} {'write s':>10} {'load s':>10}")
+        for name, size, write, load in (
+            ("json", os.path.getsize(json_file), save_json, load_json),
+            ("journal", journal_size, save_journal, load_journal),
+            ("snapshot", os.path.getsize(snapshot_file), checkpoint, load_snapshot),
+        ):
+            print(f"{name:10} {size / 2**20:10.1f} {write:10.2f} {load:10.2f}")
+
+
+def benchmark_lazy(records: int = 20000, updates: int = 80000) -> None:
+    """Compare the memory and start time of a journal loaded eagerly and lazily"""
+    with tempfile.TemporaryDirectory() as directory:
+        journal_file = os.path.join(directory, "db.jsonl")
+        db = fiabledb.FiableDB(journal_file)
+        db.start(journal=True)
+        db.add([{"name": f"user{i}", "bio": "x" * 1000} for i in range(records)])
+        for i in range(updates):
+            db.update(i % records + 1, {"visits": i})
+        db.save()
+        # Writes the offsets file
+        db.start(lazy=True)
+
+        print(f"{records} records of 1 KB, {records + updates} revisions")
+        print(f"{'':10} {'memory MB':>10} {'start s':>10} {'find_all s':>10}")
+        for lazy in (False, True):
+            db = fiabledb.FiableDB(journal_file)
+            _, started = timed(db.start, lazy=lazy)
+            _, found = timed(db.find_all)
+            del db
+            tracemalloc.start()
+            db = fiabledb.FiableDB(journal_file)
+            db.start(lazy=lazy)
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            name = "lazy" if lazy else "eager"
+            print(f"{name:10} {memory / 2**20:10.1f} {started:10.2f} {found:10.2f}")
+
+
+def benchmark_instances(databases: int = 100, records: int = 1000) -> None:
+    """Measure the memory and start time of many databases open in one process"""
+    with tempfile.TemporaryDirectory() as directory:
+        files = [os.path.join(directory, f"db{i}.jsonl") for i in range(databases)]
+        for file_name in files:
+            db = fiabledb.FiableDB(file_name)
+            db.start(journal=True)
+            fill(db, records, records)
+            db.save()
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        opened = []
+        for file_name in files:
+            db = fiabledb.FiableDB(file_name)
+            db.start()
+            opened.append(db)
+        started = time.perf_counter() - started
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        _, found = timed(lambda: [db.find_one(id=records) for db in opened])
+
+        print(f"{databases} databases of {records} records open at once")
+        print(f"{'memory MB':>10} {'start s':>10} {'find_one s':>10}")
+        print(f"{memory / 2**20:10.1f} {started:10.2f} {found:10.4f}")
+
+
+def benchmark_threads(records: int = 10000, seconds: float = 1.0) -> None:
+    """Measure the reads per second of several threads while another one writes"""
+    with tempfile.TemporaryDirectory() as directory:
+        db = fiabledb.FiableDB(os.path.join(directory, "db.json"))
+        db.start()
+        fill(db, records, 0)
+
+        print(f"{records} records, one thread updating them")
+        print(f"{'readers':>10} {'reads/s':>10} {'writes/s':>10}")
+        for readers in (1, 2, 4, 8):
+            stop = threading.Event()
+            counts = [0] * (readers + 1)
+
+            def read(slot):
+                while not stop.is_set():
+                    db.find_one(id=counts[slot] % records + 1)
+                    counts[slot] += 1
+
+            def write():
+                while not stop.is_set():
+                    db.update(counts[-1] % records + 1, {"age": 1})
+                    counts[-1] += 1
+
+            threads = [threading.Thread(target=read, args=(i,)) for i in range(readers)]
+            threads.append(threading.Thread(target=write))
+            for thread in threads:
+                thread.start()
+            time.sleep(seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+            reads = sum(counts[:-1]) / seconds
+            print(f"{readers:10} {reads:10.0f} {counts[-1] / seconds:10.0f}")
+
+
+def benchmark_flush(writes: int = 2000, threads: int = 8) -> None:
+    """Compare saving after every write with durable writes and the flusher"""
+    with tempfile.TemporaryDirectory() as directory:
+
+        def run(name, write, writers=1):
+            db = fiabledb.FiableDB(os.path.join(directory, f"{name}.jsonl"))
+            db.start(journal=True)
+            workers = [
+                threading.Thread(target=write, args=(db, writes // writers))
+                for _ in range(writers)
+            ]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            db.stop_flusher()
+            print(f"{name:14} {writes / (time.perf_counter() - started):10.0f}")
+
+        def save_each(db, count):
+            for i in range(count):
+                db.add({"n": i})
+                db.save()
+
+        def durable(db, count):
+            for i in range(count):
+                db.add({"n": i}, durable=True)
+
+        def flusher(db, count):
+            db.start_flusher()
+            for i in range(count):
+                db.add({"n": i})
+
+        print(f"{writes} writes to a journal")
+        print(f"{'':14} {'writes/s':>10}")
+        run("save()", save_each)
+        run("durable", durable)
+        run(f"durable x{threads}", durable, threads)
+        run("flusher", flusher)
+
+
+def benchmark_async(records: int = 100000) -> None:
+    """Compare the event loop lag while saving from a coroutine, blocking and async"""
+    with tempfile.TemporaryDirectory() as directory:
+        db = fiabledb.FiableDB(os.path.join(directory, "db.json"))
+        db.start()
+        fill(db, records, 0)
+        async_db = fiabledb.AsyncFiableDB(db)
+
+        async def lag(save):
+            """Longest time the loop took to wake a 1 ms sleep while saving"""
+            longest = 0.0
+            saving = asyncio.ensure_future(save())
+            while not saving.done():
+                started = time.perf_counter()
+                await asyncio.sleep(0.001)
+                longest = max(longest, time.perf_counter() - started - 0.001)
+            await saving
+            return longest
+
+        async def blocking_save():
+            db.save()
+
+        print(f"Saving {records} records from a coroutine")
+        print(f"{'':10} {'max lag ms':>10}")
+        for name, save in (("blocking", blocking_save), ("async", async_db.save)):
+            print(f"{name:10} {asyncio.run(lag(save)) * 1000:10.1f}")
+
+
+def benchmark_shared(records: int = 100000, appended: int = 100) -> None:
+    """Compare catching up with another process by refresh() and by load()"""
+    with tempfile.TemporaryDirectory() as directory:
+        journal_file = os.path.join(directory, "db.jsonl")
+        reader = fiabledb.FiableDB(journal_file)
+        reader.start(shared=True)
+        writer = fiabledb.FiableDB(journal_file)
+        writer.start(shared=True)
+        writer.add([{"name": f"user{i}", "age": i % 90} for i in range(records)])
+        reader.refresh()
+
+        for i in range(appended):
+            writer.add({"name": f"new{i}"})
+        _, refresh = timed(reader.refresh)
+        _, load = timed(reader.load)
+        print(f"{records} records, {appended} appended by another process")
+        print(f"{'':10} {'catch up s':>10}")
+        print(f"{'refresh':10} {refresh:10.4f}")
+        print(f"{'load':10} {load:10.4f}")
+
+
+def benchmark_delta(records: int = 10, updates: int = 1000) -> None:
+    """Compare the memory and read time of revisions stored whole and as deltas"""
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{records} records of 5 KB, {updates} counter updates each")
+        print(f"{'keyframes':>10} {'memory MB':>10} {'latest us':>10} {'rev us':>10}")
+        for interval in (1, 10, 100):
+            tracemalloc.start()
+            db = fiabledb.FiableDB(os.path.join(directory, "db.json"), interval)
+            db.start()
+            db.add([{"bio": "x" * 5000, "count": 0} for _ in range(records)])
+            for i in range(updates):
+                for id in range(1, records + 1):
+                    db.update(id, {"count": i})
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            _, latest = timed(lambda: [db.find_one(id=1) for _ in range(1000)])
+            _, rev = timed(lambda: [db.find_one(id=1, rev=i) for i in range(1, 1001)])
+            print(
+                f"{interval:10} {memory / 2**20:10.1f} {latest * 1000:10.2f}"
+                f" {rev * 1000:10.2f}"
+            )
+
+
+def benchmark_read_only(records: int = 20000) -> None:
+    """Compare copying the results with read-only results, and copying the
+    input with trusted writes
+    """
+    rows = [
+        {"name": f"user{i}", "tags": ["a", "b"], "address": {"city": "Valencia"}}
+        for i in range(records)
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+
+        def measure(options: dict, function, filled: bool) -> tuple:
+            # Timed in one database and traced in another, tracing is slow
+            results = []
+            for traced in (False, True):
+                db = fiabledb.FiableDB(
+                    os.path.join(directory, f"db{traced}.jsonl"), **options
+                )
+                db.start(journal=True)
+                if filled:
+                    db.add(rows)
+                if traced:
+                    tracemalloc.start()
+                _, seconds = timed(function, db)
+                if traced:
+                    results.append(tracemalloc.get_traced_memory()[1] / 2**20)
+                    tracemalloc.stop()
+                else:
+                    results.append(seconds)
+            return results
+
+        def add(db):
+            db.add(rows)
+
+        def find_all(db):
+            db.find_all()
+
+        def find_all_copied(db):
+            deepcopy(db.find_all())
+
+        print(f"{records} records")
+        print(f"{'':22} {'seconds':>10} {'peak MB':>10}")
+        for name, options, function, filled in (
+            ("add, copied", {}, add, False),
+            ("add, trusted", {"trusted": True}, add, False),
+            ("find_all + deepcopy", {}, find_all_copied, True),
+            ("find_all, read-only", {"read_only": True}, find_all, True),
+        ):
+            seconds, allocated = measure(options, function, filled)
+            print(f"{name:22} {seconds:10.3f} {allocated:10.1f}")
+
+
+def benchmark_columns(revisions: int = 1000000) -> None:
+    """Compare the memory of the revisions stored by columns with a list of dicts"""
+    data = {"name": "Miguel"}
+    tracemalloc.start()
+    rows = [
+        {"id": i, "rev": 1, "table": f"table{i % 3}", "data": data}
+        for i in range(revisions)
+    ]
+    as_dicts = tracemalloc.get_traced_memory()[0]
+    del rows
+    tracemalloc.stop()
+    tracemalloc.start()
+    columns = fiabledb.Revisions()
+    for i in range(revisions):
+        columns.append_revision(i, 1, f"table{i % 3}", data)
+    as_columns = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{revisions} revisions, bytes per revision without the data")
+    print(f"{'dicts':10} {as_dicts / revisions:10.0f}")
+    print(f"{'columns':10} {as_columns / revisions:10.0f}")
+
+
+def benchmark_as_of(records: int = 20000, updates: int = 200000) -> None:
+    """Compare find_all(as_of=...) with replaying the revisions up to a point"""
+    db = fiabledb.FiableDB(os.devnull)
+    fill(db, records, updates)
+    as_of = records + updates // 2
+
+    def replay():
+        latest = {}
+        for row in db.get_database()[:as_of]:
+            latest[row["id"]] = row
+        return [latest[id] for id in sorted(latest)]
+
+    found, as_of_time = timed(db.find_all, as_of=as_of)
+    replayed, replay_time = timed(replay)
+    assert found == replayed
+    print(f"{records} records, {records + updates} revisions, as of {as_of}")
+    print(f"{'as_of':10} {as_of_time:10.3f} s")
+    print(f"{'replay':10} {replay_time:10.3f} s")
+
+
+def benchmark_history(revisions: int = 10000) -> None:
+    """Compare reading the history of a record with a find_one per revision"""
+    db = fiabledb.FiableDB(os.devnull)
+    db.add({"name": "Miguel", "visits": 0})
+    for i in range(1, revisions):
+        db.update(1, {"visits": i})
+    _, history = timed(lambda: list(db.history(1)))
+    _, one_by_one = timed(
+        lambda: [db.find_one(id=1, rev=rev) for rev in range(1, revisions + 1)]
+    )
+    _, diff = timed(db.diff, 1, 1, revisions)
+    print(f"1 record, {revisions} revisions")
+    print(f"{'history':10} {history:10.3f} s")
+    print(f"{'find_one':10} {one_by_one:10.3f} s")
+    print(f"{'diff':10} {diff * 1000:10.3f} ms")
+
+
+def benchmark_pages(records: int = 200000, page: int = 20) -> None:
+    """Compare reading the first page of a table with reading all of it"""
+    db = fiabledb.FiableDB(os.devnull)
+    fill(db, records, 0)
+    print(f"{records} records, first {page}")
+    for name, function in (
+        ("all", lambda: db.find_all()[:page]),
+        ("limit", lambda: db.find_all(limit=page)),
+        ("after_id", lambda: db.find_all(after_id=records // 2, limit=page)),
+        ("cursor", lambda: list(islice(db.find_all(cursor=True), page))),
+        ("sort all", lambda: sorted(db.find_all(), key=lambda r: r["data"]["age"])),
+        ("sort limit", lambda: db.find_all(sort="age", limit=page)),
+    ):
+        _, seconds = timed(function)
+        print(f"{name:10} {seconds * 1000:10.2f} ms")
+
+
+def benchmark_many(records: int = 100000) -> None:
+    """Compare updating the matching records one by one with update_many"""
+    print(f"{records} records, update half of them")
+    for name in ("update", "update_many"):
+        db = fiabledb.FiableDB(os.devnull)
+        fill(db, records, 0)
+        db.create_index("age", ordered=True)
+        if name == "update":
+
+            def function():
+                for row in db.find_all(data={"age": {"$lt": 45}}):
+                    db.update(row["id"], {"active": True})
+
+        else:
+
+            def function():
+                db.update_many({"age": {"$lt": 45}}, {"active": True})
+
+        _, seconds = timed(function)
+        print(f"{name:11} {seconds * 1000:10.2f} ms")
+
+
+def benchmark_batch(writes: int = 2000) -> None:
+    """Compare durable writes one by one with a durable batch"""
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{writes} durable updates, writes per second")
+        for name in ("each", "batch"):
+            db = fiabledb.FiableDB(os.path.join(directory, f"{name}.jsonl"))
+            db.start(journal=True)
+            db.add([{"n": 0} for _ in range(writes)])
+
+            def update():
+                for i in range(writes):
+                    db.update(i + 1, {"n": 1}, durable=True)
+
+            def update_batch():
+                with db.batch(durable=True):
+                    update()
+
+            _, seconds = timed(update if name == "each" else update_batch)
+            print(f"{name:6} {writes / seconds:10.0f}")
+
+
+def benchmark_archive(records: int = 10000, updates: int = 100000) -> None:
+    """Compare the memory and the reads of old revisions before and after
+    archiving them"""
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{records} records, {updates} updates")
+        tracemalloc.start()
+        db = fiabledb.FiableDB(os.path.join(directory, "memory.jsonl"))
+        db.start(journal=True)
+        fill(db, records, updates)
+        memory = tracemalloc.get_traced_memory()[0]
+        db.archive()
+        archived = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"{'memory':8} {memory / 2**20:10.1f} MB")
+        print(f"{'archived':8} {archived / 2**20:10.1f} MB")
+
+        db = fiabledb.FiableDB(os.path.join(directory, "reads.jsonl"))
+        db.start(journal=True)
+        fill(db, records, updates)
+        for name in ("memory", "archived"):
+            if name == "archived":
+                _, seconds = timed(db.archive)
+                print(f"{'archive':8} {seconds * 1000:10.2f} ms")
+            _, seconds = timed(lambda: [db.get_revision(i + 1, 2) for i in range(1000)])
+            print(f"{name:8} {seconds * 1000:10.2f} ms to read 1000 old revisions")
+
+
+def benchmark_partitioned(tables: int = 20, records: int = 20000) -> None:
+    """Compare starting and saving one file for every table with one file per
+    table, when only one table is used"""
+    with tempfile.TemporaryDirectory() as directory:
+        single = fiabledb.FiableDB(os.path.join(directory, "single.jsonl"))
+        single.start(journal=True)
+        partitioned = fiabledb.PartitionedFiableDB(os.path.join(directory, "tables"))
+        partitioned.start()
+        for table in range(tables):
+            rows = [{"name": f"user{i}", "table": table} for i in range(records)]
+            single.add(rows, table=f"table{table}")
+            partitioned.add(rows, table=f"table{table}")
+        single.save()
+        partitioned.save()
+        print(f"{tables} tables of {records} records, use one of them")
+        for name in ("single", "partitioned"):
+
+            def run():
+                if name == "single":
+                    db = fiabledb.FiableDB(single.file)
+                else:
+                    db = fiabledb.PartitionedFiableDB(partitioned.directory)
+                db.start()
+                db.update(1, {"active": True}, table="table0")
+                db.save()
+
+            _, seconds = timed(run)
+            print(f"{name:12} {seconds * 1000:10.2f} ms")
+
+
+def benchmark_cache(records: int = 100000, reads: int = 100) -> None:
+    """Compare repeating a search with and without the query cache"""
+    print(f"{records} records, {reads} repeated searches")
+    for name, cache_size in (("no cache", 0), ("cache", 100)):
+        db = fiabledb.FiableDB(os.devnull, cache_size=cache_size)
+        fill(db, records, 0)
+        db.find_all(data={"age": {"$gt": 80}})
+        _, seconds = timed(
+            lambda: [db.find_all(data={"age": {"$gt": 80}}) for _ in range(reads)]
+        )
+        print(f"{name:8} {seconds / reads * 1000000:10.1f} us per search")
+
+
+def main():
+    benchmark_snapshot()
+    benchmark_lazy()
+    benchmark_instances()
+    benchmark_threads()
+    benchmark_flush()
+    benchmark_async()
+    benchmark_shared()
+    benchmark_delta()
+    benchmark_read_only()
+    benchmark_columns()
+    benchmark_as_of()
+    benchmark_history()
+    benchmark_pages()
+    benchmark_many()
+    benchmark_batch()
+    benchmark_archive()
+    benchmark_partitioned()
+    benchmark_cache()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,67 @@
 from typing import Dict, Tuple, Union, Sequence, TypedDict, List, Optional
-from functools import reduce
+from functools import partial, reduce
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+import asyncio
+import codecs
+import gc
+import io
+import heapq
 import json
+import math
+import mmap
+import operator
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
 from os import path
 from copy import deepcopy
+from types import MappingProxyType
+from urllib.parse import quote, unquote
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, shared mode can not be used
+    fcntl = None
 
 # Variables
 FILE = "fiabledb.json"
-database = []
+
+# First line of the snapshot files written by checkpoint()
+SNAPSHOT_HEADER = b"fiabledb-snapshot 4\n"
+# Offsets file record: id, rev, offset, timestamp (0 if unknown), length of the
+# table name
+OFFSET_RECORD = struct.Struct("<qqqdH")
+# First line of an offsets file, files without it are written again
+OFFSETS_HEADER = b"fiabledb-offsets 2\n"
+# Segment index record: position, id, rev and offset of an archived revision
+SEGMENT_RECORD = struct.Struct("<qqqq")
+# First line of a segment index, segments without it are ignored
+SEGMENT_HEADER = b"fiabledb-segment 1\n"
+# Marks the keys of values that can not be hashed (lists, dicts)
+UNHASHABLE = object()
+
+# Query operators
+RANGE_OPERATORS = {
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+}
+OPERATORS = {"$in", "$ne", *RANGE_OPERATORS}
+
+# Extension of the table files of a PartitionedFiableDB
+TABLE_EXTENSION = ".jsonl"
+
+# Revisions read at once by history()
+HISTORY_PAGE_SIZE = 1000
 
 # Type aliases
 
@@ -25,264 +80,509 @@ Type_Update_Return = Union[TypeData, None]
 Type_Delete_Return = Union[TypeData, None]
 Type_Find_One_Return = Union[TypeData, None]
 Type_Find_All_Return = List[TypeData]
+Type_As_Of = Union[int, float, datetime, None]
 
 # Functions
 
 
-def get_next_id(table: str = "default") -> int:
-    """Get the next id for the table"""
-    global database
+def get_table(row: TypeData) -> str:
+    """Get the table of a row (rows saved without one are in "default")"""
+    return row.get("table", "default")
+
 
-    # Get all IDs for the table and find the maximum
-    table_ids = [row["id"] for row in database if row["table"] == table]
-    if not table_ids:
-        return 1
-    return max(table_ids) + 1
+def count_visible(positions: List[int], seq: Optional[int] = None) -> int:
+    """Count the revisions of a record a reader pinned at seq can see
+    Args:
+            positions (list[int]): The positions of the revisions, ordered by rev
+            seq (int, optional): The revisions committed when the read started.
+                Defaults to None, every revision.
+    Returns:
+            int: How many of the first positions are visible
+    """
+    count = len(positions)
+    if seq is not None and count and positions[-1] >= seq:
+        # Revisions written at seq or after it are at the end
+        count = bisect_left(positions, seq)
+    return count
 
 
-def start(file_name: str = "") -> str:
-    """Start the database
+def freeze(value):
+    """Get a read-only view of a value. Dicts are wrapped, not copied, unless
+    they hold other dicts or lists, which are frozen too
     Args:
-            file (str, optional): The file to use. Defaults to FILE.
+            value (Any): The value
     Returns:
-            str: The file used
+            Any: MappingProxyType for dicts, tuple for lists, the value otherwise
     """
-    global FILE
-    global database
-    my_file_name = file_name if file_name != "" else FILE
-    if path.exists(my_file_name):
-        # Load the database
-        try:
-            load(my_file_name)
-        except Exception as e:
-            # If loading fails, create empty database
-            database = []
-            save(my_file_name)
-    else:
-        # Create the database
-        database = []
-        save(my_file_name)
-    FILE = my_file_name
-    return my_file_name
+    if isinstance(value, dict):
+        nested = {
+            key: freeze(item)
+            for key, item in value.items()
+            if isinstance(item, (dict, list))
+        }
+        return MappingProxyType({**value, **nested} if nested else value)
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
 
 
-def save(file_name: str = "") -> bool:
-    """Save the database
+def freeze_row(row: Optional[TypeData]) -> Optional[TypeData]:
+    """Get a read-only view of a revision, its data is not copied
     Args:
-            file_name (str, optional): The file to save to. Defaults to "".
+            row (dict or None): The revision
     Returns:
-            bool: True if the data was saved, False otherwise
+            MappingProxyType or None: The revision, None if row is None
     """
-    global FILE
-    global database
-    my_file_name = file_name if file_name != "" else FILE
-    try:
-        with open(my_file_name, "w") as f:
-            json.dump(database, f, indent=2)
+    if row is None:
+        return None
+    # Rows read from a file without the table have no "table" key
+    return MappingProxyType({**row, "data": freeze(row["data"])})
+
+
+def same_value(a, b) -> bool:
+    """Check if two data values are equal and of the same type. Lists and dicts
+    are only the same if they are the same object.
+    """
+    if a is b:
         return True
-    except Exception:
+    if type(a) is not type(b) or isinstance(a, (list, dict)):
         return False
+    return a == b
 
 
-def load(file_name: Union[str, None] = None) -> bool:
-    """Load the database
+def diff_data(old: dict, new: dict) -> dict:
+    """Get the keys set and unset to go from the data of one revision to the next
     Args:
-            file_name (str, optional): The file to load from. Defaults to "".
+            old (dict): The data of the previous revision
+            new (dict): The data of the new revision
     Returns:
-            Bool - The data loaded
+            dict: {"set": changed keys and their values, "unset": removed keys}
     """
-    global database
-    my_file_name = file_name if file_name else FILE
-    is_exists = path.exists(my_file_name)
-    if is_exists:
-        try:
-            with open(my_file_name, "r") as f:
-                text = f.read()
-                if text != "":
-                    loaded_data = json.loads(text)
-                    # Validate loaded data structure
-                    if isinstance(loaded_data, list):
-                        database = loaded_data
-                    else:
-                        database = []
-                else:
-                    database = []
-        except (json.JSONDecodeError, IOError):
-            raise FileNotFoundError("File corrupted or cannot be read")
-    else:
-        raise FileNotFoundError("File not found")
-    return is_exists
+    return {
+        "set": {
+            key: value
+            for key, value in new.items()
+            if key not in old or not same_value(old[key], value)
+        },
+        "unset": [key for key in old if key not in new],
+    }
 
 
-def get_database() -> Type_Data_List:
-    """Get the data
+def compare_data(old: dict, new: dict) -> dict:
+    """Get the keys added, removed and changed between the data of two revisions
+    Args:
+            old (dict): The data of the first revision
+            new (dict): The data of the second revision
     Returns:
-            list[dict]: The data
+            dict: {"added": {key: new value}, "removed": {key: old value},
+                "changed": {key: {"old": old value, "new": new value}}}
     """
-    global database
-    return database
+    changed = {}
+    for key in old.keys() & new.keys():
+        if type(old[key]) is not type(new[key]) or old[key] != new[key]:
+            changed[key] = {"old": old[key], "new": new[key]}
+    return {
+        "added": {key: value for key, value in new.items() if key not in old},
+        "removed": {key: value for key, value in old.items() if key not in new},
+        "changed": changed,
+    }
 
 
-def get_pos_by_id(id: int, table: str = "default") -> Optional[int]:
-    """Get the position of the latest revision by id and table
+def apply_delta(data: dict, set_values: dict, unset: List[str]) -> dict:
+    """Get the data of a revision from the previous one and its delta"""
+    data = dict(data)
+    for key in unset:
+        data.pop(key, None)
+    data.update(set_values)
+    return data
+
+
+def index_key(value):
+    """Get the key of a data value in a hash index"""
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        try:
+            return (UNHASHABLE, json.dumps(value, sort_keys=True, default=repr))
+        except TypeError:
+            return (UNHASHABLE, repr(value))
+
+
+def cache_key(value) -> Optional[tuple]:
+    """Get the key of a search argument in the query cache. Unlike index_key it
+    keeps the type of every value, a list and a tuple, or 1 and True, differ.
     Args:
-            id (int): The id of the data
-            table (str, optional): The table to search in. Defaults to "default".
+            value (Any): The argument, dicts, lists, tuples and sets are nested
     Returns:
-            int: The position of the data
+            tuple or None: The key, None if a value can not be hashed
     """
-    global database
+    kind = type(value)
+    if kind is dict:
+        items = [(cache_key(key), cache_key(item)) for key, item in value.items()]
+        if any(None in pair for pair in items):
+            return None
+        return (kind, frozenset(items))
+    if kind in (list, tuple, set, frozenset):
+        items = [cache_key(item) for item in value]
+        if None in items:
+            return None
+        return (kind, frozenset(items) if kind in (set, frozenset) else tuple(items))
+    try:
+        hash(value)
+    except TypeError:
+        return None
+    return (kind, value)
+
+
+def order_class(value) -> Optional[str]:
+    """Get the group of values a value can be ordered with in a sorted index"""
+    if isinstance(value, str):
+        return "str"
+    if isinstance(value, (int, float)) and not (
+        isinstance(value, float) and math.isnan(value)
+    ):
+        return "number"
+    return None
+
 
-    # Find the latest revision for this id and table
-    latest_pos = None
-    latest_rev = 0
+def get_lock_file(file_name: str) -> str:
+    """Get the file locked by the writers of a shared journal"""
+    return file_name + ".lock"
 
-    for i, row in enumerate(database):
-        if row["id"] == id and row["table"] == table and row["rev"] > latest_rev:
-            latest_pos = i
-            latest_rev = row["rev"]
 
-    return latest_pos
+def get_offsets_file(file_name: str) -> str:
+    """Get the file with the offsets of the revisions of a journal"""
+    return file_name + ".offsets"
 
 
-def add(new_data: Type_Add_Data, table: str = "default") -> Type_Add_Return:
-    """Add data to the database
+def encode_offset(
+    id: int, rev: int, table: str, offset: int, stamp: Optional[float] = None
+) -> bytes:
+    """Encode the metadata and offset of a revision for the offsets file"""
+    name = table.encode()
+    return OFFSET_RECORD.pack(id, rev, offset, stamp or 0.0, len(name)) + name
+
+
+def read_offsets(
+    file_name: str,
+) -> Optional[List[Tuple[int, int, str, int, Optional[float]]]]:
+    """Read the offsets file of a journal
     Args:
-            new_data (dict|list): The data to add
-            table (str, optional): The table to add to. Defaults to "default".
+            file_name (str): The journal file
     Returns:
-            dict|list[dict]: The data added
+            list[tuple] or None: The id, rev, table, offset and timestamp of the
+                revisions, None if there is no offsets file in this format
     """
-    global database
+    offsets_file = get_offsets_file(file_name)
+    if not path.exists(offsets_file):
+        return None
+    with open(offsets_file, "rb") as f:
+        content = f.read()
+    if not content.startswith(OFFSETS_HEADER):
+        return None
+    tables = {}
+    entries = []
+    pos = len(OFFSETS_HEADER)
+    while pos + OFFSET_RECORD.size <= len(content):
+        id, rev, offset, stamp, length = OFFSET_RECORD.unpack_from(content, pos)
+        pos += OFFSET_RECORD.size
+        if pos + length > len(content):
+            # Interrupted write
+            break
+        table = content[pos : pos + length].decode()
+        pos += length
+        table = tables.setdefault(table, table)
+        entries.append((id, rev, table, offset, stamp or None))
+    return entries
 
-    # Input validation
-    if not isinstance(new_data, (dict, list)):
-        raise TypeError("new_data must be a dict or list")
 
-    if isinstance(new_data, dict):
-        if not new_data:  # Empty dict validation
-            raise ValueError("Cannot add empty dictionary")
-        new_row = {
-            "id": get_next_id(table),
-            "rev": 1,
-            "table": table,
-            "data": deepcopy(new_data),
-        }
-        database.append(new_row)
-        return new_row
-    elif isinstance(new_data, list):
-        if not new_data:  # Empty list validation
-            raise ValueError("Cannot add empty list")
-        added_rows = []
-        for row in new_data:
-            if not isinstance(row, dict):
-                raise TypeError("All items in list must be dictionaries")
-            if not row:  # Empty dict in list
-                raise ValueError("Cannot add empty dictionary in list")
-            new_row = {
-                "id": get_next_id(table),
-                "rev": 1,
-                "table": table,
-                "data": deepcopy(row),
-            }
-            database.append(new_row)
-            added_rows.append(new_row)
-        return added_rows
+def get_segment_file(file_name: str, number: int) -> str:
+    """Get a segment file of a database, see FiableDB.archive"""
+    return f"{file_name}.segment{number}"
 
 
-def update(
-    id: int, new_data: dict, table: str = "default", force: bool = False
-) -> Type_Update_Return:
-    """Update data in the database
+def get_segment_numbers(file_name: str) -> List[int]:
+    """Get the numbers of the segment files of a database, in order"""
+    prefix = path.basename(get_segment_file(file_name, ""))
+    return sorted(
+        int(name[len(prefix) :])
+        for name in os.listdir(path.dirname(file_name) or ".")
+        if name.startswith(prefix) and name[len(prefix) :].isdigit()
+    )
+
+
+def get_segment_index_file(segment_file: str) -> str:
+    """Get the index of a segment file"""
+    return segment_file + ".index"
+
+
+def read_segment_index(segment_file: str) -> Optional[List[Tuple[int, int, int, int]]]:
+    """Read the index of a segment file
     Args:
-            id (int): The id of the data to update.
-            new_data (dict): The data to update
-            table (str, optional): The table to update. Defaults to "default".
-            force (bool, optional): Force the update. Defaults to False.
+            segment_file (str): The segment file
     Returns:
-            dict or None: The data updated
+            list[tuple] or None: The position, id, rev and offset of the revisions,
+                None if there is no segment or index in this format
     """
-    global database
-
-    # Input validation
-    if not isinstance(id, int) or id <= 0:
-        raise ValueError("id must be a positive integer")
-    if not isinstance(new_data, dict):
-        raise TypeError("new_data must be a dictionary")
-
-    # Get the position of the latest revision
-    key = get_pos_by_id(id, table)
-    if key is not None:
-        row = deepcopy(database[key])
-        my_new_data = deepcopy(new_data)
-        if force:
-            row["data"] = my_new_data
-        else:
-            # Handle None values to delete keys
-            for k, v in my_new_data.items():
-                if v is None:
-                    if k in row["data"]:
-                        del row["data"][k]
-                else:
-                    row["data"][k] = v
-        new_rev = row["rev"] + 1
-        new_data_to_row = row["data"]
-        new_row = {"id": id, "rev": new_rev, "table": table, "data": new_data_to_row}
-        database.append(new_row)
-        return new_row
-    return None
+    index_file = get_segment_index_file(segment_file)
+    if not path.exists(segment_file) or not path.exists(index_file):
+        return None
+    with open(index_file, "rb") as f:
+        content = f.read()
+    if not content.startswith(SEGMENT_HEADER):
+        return None
+    body = memoryview(content)[len(SEGMENT_HEADER) :]
+    # An incomplete record means an interrupted write, the segment is not used
+    if len(body) % SEGMENT_RECORD.size:
+        return None
+    return list(SEGMENT_RECORD.iter_unpack(body))
+
+
+def encode_row(row: TypeData) -> bytes:
+    """Encode a revision as a journal line"""
+    return json.dumps(row, separators=(",", ":")).encode() + b"\n"
+
+
+# Journal line before the revisions of a batch, with how many there are
+BATCH_MARKER = b'{"batch":'
+
+
+def get_snapshot_file(file_name: str) -> str:
+    """Get the snapshot file of a journal"""
+    return file_name + ".snapshot"
 
 
-def delete(id: int, table: str = "default") -> Type_Delete_Return:
-    """Delete data from the database
+def is_journal(f) -> bool:
+    """Check if a file opened in binary mode is a journal, and rewind it"""
+    first = b""
+    while not first:
+        chunk = f.read(4096)
+        if not chunk:
+            break
+        first = chunk.lstrip()[:1]
+    f.seek(0)
+    return first == b"{"
+
+
+def iter_journal(f, batch_size: int = 1000):
+    """Iterate the revisions of a journal opened in binary mode. The revisions
+    of a batch are only returned once all of them are in the file.
     Args:
-            id (int): The id of the data to delete
-            table (str, optional): The table to delete from. Defaults to "default".
+            f (file): The journal
+            batch_size (int, optional): Lines to parse at a time. Defaults to 1000.
     Returns:
-            dict: The data deleted
+            Iterator[tuple]: Every revision and the bytes read up to its end
     """
-    # Input validation
-    if not isinstance(id, int) or id <= 0:
-        raise ValueError("id must be a positive integer")
+    pending = []
+    remaining = 0
+    for row, size in iter_journal_lines(f, batch_size):
+        if "batch" in row:
+            # An unfinished batch before it was dropped by the save
+            pending = []
+            remaining = row["batch"]
+        elif remaining:
+            pending.append((row, size))
+            remaining -= 1
+            if not remaining:
+                yield from pending
+                pending = []
+        else:
+            yield row, size
 
-    return update(id=id, new_data={}, table=table, force=True)
 
+def iter_journal_lines(f, batch_size: int = 1000):
+    """Iterate the lines of a journal opened in binary mode, parsed
+    Args:
+            f (file): The journal
+            batch_size (int, optional): Lines to parse at a time. Defaults to 1000.
+    Returns:
+            Iterator[tuple]: Every line and the bytes read up to its end
+    """
+    size = 0
+    lines = []
+    sizes = []
+    for line in f:
+        if not line.endswith(b"\n"):
+            # The last line of an interrupted save
+            break
+        size += len(line)
+        if line.strip():
+            lines.append(line)
+            sizes.append(size)
+        if len(lines) == batch_size:
+            # Parsed together, the revisions share the strings of their keys
+            yield from zip(json.loads(b"[" + b",".join(lines) + b"]"), sizes)
+            lines = []
+            sizes = []
+    if lines:
+        yield from zip(json.loads(b"[" + b",".join(lines) + b"]"), sizes)
 
-def get_latest_revision(id: int, table: str = "default") -> Optional[TypeData]:
-    """Get the latest revision of a record"""
-    global database
-
-    # Filter records by id and table, then get the one with highest rev
-    matching_records = [
-        row for row in database if row["id"] == id and row["table"] == table
-    ]
-    if not matching_records:
-        return None
 
-    return max(matching_records, key=lambda x: x["rev"])
+def iter_json_array(f, chunk_size: int = 65536):
+    """Iterate the items of a JSON array in a file opened in binary mode,
+    parsing a chunk at a time instead of reading the whole file
+    Args:
+            f (file): The JSON file
+            chunk_size (int, optional): Bytes to read at a time. Defaults to 65536.
+    Returns:
+            Iterator: The items of the array
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    eof = False
+    batched = False
 
+    def read_more() -> bool:
+        # Drop what was parsed and at least double what is left to parse,
+        # so an item bigger than a chunk is not parsed too many times
+        nonlocal buffer, pos, eof, batched
+        chunk = f.read(max(chunk_size, len(buffer) - pos))
+        eof = not chunk
+        buffer = buffer[pos:] + text.decode(chunk, final=eof)
+        pos = 0
+        batched = False
+        return not eof
 
-def get_revision(id: int, rev: int, table: str = "default") -> Optional[TypeData]:
-    """Get a specific revision of a record"""
-    global database
+    def next_char() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer) or not read_more():
+                return buffer[pos : pos + 1]
 
-    if rev < 0:
-        # Handle negative revision numbers
-        latest = get_latest_revision(id, table)
-        if not latest:
+    def parse_batch() -> Optional[list]:
+        # Parse together the items of the buffer up to the last "}," so they
+        # share the strings of their keys. It only parses when that "}"
+        # closes an item: anywhere else the brackets or a string are open.
+        nonlocal pos, batched
+        batched = True
+        cut = buffer.rfind("},", pos)
+        if cut <= pos:
             return None
-        target_rev = latest["rev"] + rev + 1
-        if target_rev <= 0:
+        try:
+            items = json.loads("[" + buffer[pos : cut + 1] + "]")
+        except json.JSONDecodeError:
             return None
+        pos = cut + 1
+        return items
+
+    def parse_one():
+        nonlocal pos
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # Unless a separator follows, the item may continue in
+                # the next chunk (a number cut in two)
+                follow = end
+                while follow < len(buffer) and buffer[follow] in " \t\r\n":
+                    follow += 1
+                if eof or buffer[follow : follow + 1] in (",", "]"):
+                    pos = end
+                    return item
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            read_more()
+
+    first = next_char()
+    if first == "":
+        return
+    if first != "[":
+        # Valid JSON that is not a list holds no revisions
+        while read_more():
+            pass
+        json.loads(buffer)
+        return
+    pos += 1
+    if next_char() == "]":
+        pos += 1
     else:
-        target_rev = rev
+        while True:
+            next_char()
+            items = None if batched else parse_batch()
+            if items is None:
+                items = [parse_one()]
+            yield from items
+            separator = next_char()
+            pos += 1
+            if separator == "]":
+                break
+            if separator != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos - 1)
+    if next_char() != "":
+        raise json.JSONDecodeError("Extra data", buffer, pos)
 
-    # Find the exact revision
-    for row in database:
-        if row["id"] == id and row["table"] == table and row["rev"] == target_rev:
-            return row
 
-    return None
+def is_operator_filter(value) -> bool:
+    """Check if a filter value holds query operators such as {"$gt": 40}"""
+    return isinstance(value, dict) and any(
+        isinstance(key, str) and key.startswith("$") for key in value
+    )
+
+
+def validate_filter(filter_data: dict) -> None:
+    """Check the query operators used in filter_data"""
+    for value in filter_data.values():
+        if not is_operator_filter(value):
+            continue
+        for op, operand in value.items():
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown operator {op}")
+            if op == "$in" and not isinstance(operand, (list, tuple, set)):
+                raise TypeError("$in needs a list of values")
+
+
+def validate_find_all(
+    data: dict,
+    limit: Optional[int],
+    offset: int,
+    after_id: int,
+    sort: Optional[str],
+    fields: Optional[Sequence[str]],
+) -> None:
+    """Check the arguments of find_all that do not depend on the database"""
+    if not isinstance(data, dict):
+        raise TypeError("data must be a dictionary")
+    validate_filter(data)
+    if limit is not None and (not isinstance(limit, int) or limit < 0):
+        raise ValueError("limit must be a non negative integer")
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError("offset must be a non negative integer")
+    if not isinstance(after_id, int) or after_id < 0:
+        raise ValueError("after_id must be a non negative integer")
+    if sort is not None and (not isinstance(sort, str) or sort in ("", "-")):
+        raise ValueError("sort must be the name of a data field")
+    if fields is not None and (
+        isinstance(fields, str) or not all(isinstance(f, str) for f in fields)
+    ):
+        raise TypeError("fields must be a list of strings")
+
+
+def match_operators(record_data: dict, key: str, conditions: dict) -> bool:
+    """Check if the value of key in record_data meets every operator in conditions"""
+    present = key in record_data
+    value = record_data.get(key)
+    for op, operand in conditions.items():
+        if op == "$ne":
+            if present and value == operand:
+                return False
+        elif not present:
+            return False
+        elif op == "$in":
+            if not any(value == item for item in operand):
+                return False
+        else:
+            try:
+                if not RANGE_OPERATORS[op](value, operand):
+                    return False
+            except TypeError:
+                # Values that can not be compared do not match
+                return False
+    return True
 
 
 def match_data_filter(record_data: dict, filter_data: dict) -> bool:
@@ -291,94 +591,3476 @@ def match_data_filter(record_data: dict, filter_data: dict) -> bool:
         return False
 
     for key, value in filter_data.items():
-        if key not in record_data or record_data[key] != value:
+        if is_operator_filter(value):
+            if not match_operators(record_data, key, value):
+                return False
+        elif key not in record_data or record_data[key] != value:
             return False
     return True
 
 
-def find_one(
-    id: int = 0, data: dict = {}, table: str = "default", rev: int = 0
-) -> Type_Find_One_Return:
-    """Find one data in the database
+class Descending:
+    """A value compared in reverse order, to sort by it in descending order"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value) -> None:
+        self.value = value
+
+    def __eq__(self, other: "Descending") -> bool:
+        return self.value == other.value
+
+    def __lt__(self, other: "Descending") -> bool:
+        return other.value < self.value
+
+
+def get_sort_key(field: str, descending: bool = False):
+    """Get the sort key of the records by a data field: numbers, then strings,
+    then the records without a value that can be ordered, each group by value
+    and then by id
     Args:
-            id (int, optional): The id of the data to find. Defaults to 0.
-            data (dict, optional): Filter the data to find. Defaults to {}.
-            table (str, optional): The table to find in. Defaults to "default".
-            rev (int, optional): The revision of the data to find. Defaults to 0.
+            field (str): The data field
+            descending (bool, optional): Order the values of every group from the
+                highest, the groups and the ids keep their order. Defaults to False.
     Returns:
-            dict or None: The data found
+            callable: The key of a record
     """
-    global database
 
-    # Input validation
-    if not isinstance(id, int):
-        raise TypeError("id must be an integer")
-    if not isinstance(data, dict):
-        raise TypeError("data must be a dictionary")
+    def key(record: TypeData) -> tuple:
+        value = record["data"].get(field)
+        group = order_class(value)
+        if group is None:
+            return (2, 0, record["id"])
+        if descending:
+            value = Descending(value)
+        return (0 if group == "number" else 1, value, record["id"])
 
-    # If searching by id
-    if id > 0:
-        if rev != 0:
-            # Find specific revision
-            return get_revision(id, rev, table)
+    return key
+
+
+def sort_records(records, sort: str, count: Optional[int] = None) -> Type_Data_List:
+    """Sort records by a data field, keeping only the first ones
+    Args:
+            records (Iterable[dict]): The records
+            sort (str): The data field, with a "-" before it in descending order
+            count (int, optional): Only keep the first count records, without
+                sorting the rest. Defaults to None, all of them.
+    Returns:
+            list[dict]: The records sorted
+    """
+    descending = sort.startswith("-")
+    key = get_sort_key(sort[1:] if descending else sort, descending)
+    if count is None:
+        return sorted(records, key=key)
+    return heapq.nsmallest(count, records, key=key)
+
+
+def project_row(row: TypeData, fields: Sequence[str]) -> TypeData:
+    """Get a revision with only some fields of its data"""
+    data = row["data"]
+    return {**row, "data": {field: data[field] for field in fields if field in data}}
+
+
+class Revisions:
+    """The revisions of a database in the order they were written, stored by
+    columns: ids and revs in arrays, the table of every revision as a code, and
+    the payloads apart. Indexing it returns the revisions as dicts.
+
+    A payload is the data of a revision stored whole, the (set, unset) pair of a
+    delta of the previous revision, or None when the data is in the payload file.
+
+    The position of a revision is its sequence number minus one: the first seq
+    revisions are the database as it was when seq revisions had been written.
+    """
+
+    __slots__ = ("ids", "revs", "table_codes", "payloads", "tables", "codes", "times")
+
+    def __init__(self, rows: Sequence[dict] = ()) -> None:
+        """Create the columns
+        Args:
+                rows (list[dict], optional): Revisions to append. Defaults to ().
+        """
+        self.ids = array("q")
+        self.revs = array("q")
+        self.table_codes = array("I")
+        # Appended last, so a revision is complete once it is counted
+        self.payloads = []
+        # code -> table name, and table name -> code
+        self.tables = []
+        self.codes = {}
+        # Timestamp of every revision, never decreasing. None until a revision
+        # has one, the revisions before it get 0 (unknown)
+        self.times = None
+        for row in rows:
+            self.append(row)
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def __iter__(self):
+        for pos in range(len(self)):
+            yield self[pos]
+
+    def __getitem__(self, pos: Union[int, slice]) -> Union[dict, List[dict]]:
+        """Get the revision stored at pos as a dict, with the key "data", the keys
+        "set" and "unset" of a delta, or neither when its data is not in memory
+        """
+        if isinstance(pos, slice):
+            return [self[i] for i in range(*pos.indices(len(self)))]
+        row = self.get_metadata(pos)
+        payload = self.payloads[pos]
+        if type(payload) is tuple:
+            row["set"], row["unset"] = payload
+        elif payload is not None:
+            row["data"] = payload
+        return row
+
+    def __setitem__(self, pos: int, row: dict) -> None:
+        """Replace the revision stored at pos"""
+        self.ids[pos] = row["id"]
+        self.revs[pos] = row["rev"]
+        self.table_codes[pos] = self.get_code(row.get("table"))
+        self.payloads[pos] = self.get_payload(row)
+
+    def get_payload(self, row: dict):
+        """Get the payload of a revision given as a dict"""
+        if "data" in row:
+            return row["data"]
+        if "set" in row:
+            return (row["set"], row["unset"])
+        return None
+
+    def get_code(self, table: Optional[str]) -> int:
+        """Get the code of a table name, adding it if it is new"""
+        code = self.codes.get(table)
+        if code is None:
+            code = len(self.tables)
+            self.tables.append(table)
+            self.codes[table] = code
+        return code
+
+    def get_table(self, pos: int) -> str:
+        """Get the table of the revision stored at pos"""
+        return self.tables[self.table_codes[pos]] or "default"
+
+    def get_metadata(self, pos: int) -> dict:
+        """Get the id, rev and table of the revision stored at pos"""
+        table = self.tables[self.table_codes[pos]]
+        if table is None:
+            # Read from a file without the table
+            return {"id": self.ids[pos], "rev": self.revs[pos]}
+        return {"id": self.ids[pos], "rev": self.revs[pos], "table": table}
+
+    def get_time(self, pos: int) -> Optional[float]:
+        """Get the timestamp of the revision stored at pos, None if unknown"""
+        if self.times is None:
+            return None
+        return self.times[pos] or None
+
+    def is_delta(self, pos: int) -> bool:
+        """Check if the revision stored at pos is a delta"""
+        return type(self.payloads[pos]) is tuple
+
+    def truncate(self, count: int) -> None:
+        """Drop the revisions stored from position count on"""
+        del self.ids[count:]
+        del self.revs[count:]
+        del self.table_codes[count:]
+        if self.times is not None:
+            del self.times[count:]
+        del self.payloads[count:]
+
+    def append(self, row: dict) -> None:
+        """Append a revision given as a dict"""
+        self.append_revision(
+            row["id"],
+            row["rev"],
+            row.get("table"),
+            self.get_payload(row),
+            row.get("time"),
+        )
+
+    def append_revision(
+        self,
+        id: int,
+        rev: int,
+        table: Optional[str],
+        payload,
+        stamp: Optional[float] = None,
+    ) -> None:
+        """Append a revision
+        Args:
+                id (int): The id of the record
+                rev (int): The revision
+                table (str or None): The table of the record, None if the revision
+                    had no table, which means "default"
+                payload (dict|tuple|None): Its data, delta or None if it is lazy
+                stamp (float, optional): When it was written. Defaults to None,
+                    unknown.
+        """
+        code = self.get_code(table)
+        if stamp and self.times is None:
+            self.times = array("d", [0.0]) * len(self)
+        self.ids.append(id)
+        self.revs.append(rev)
+        self.table_codes.append(code)
+        if self.times is not None:
+            # A clock going back does not make the timestamps decrease
+            last = self.times[-1] if self.times else 0.0
+            self.times.append(max(stamp or 0.0, last))
+        self.payloads.append(payload)
+
+
+class Segment:
+    """Revisions archived to a read-only file, one JSON per line, with the
+    positions they have in the database and their offsets in the file ordered by
+    position. The file is mapped in memory the first time it is read. Number 0 is
+    the snapshot of a lazy database, holding the revisions stored whole.
+    """
+
+    __slots__ = ("file_name", "number", "positions", "offsets", "map")
+
+    def __init__(
+        self, file_name: str, number: int, positions: array, offsets: array
+    ) -> None:
+        self.file_name = file_name
+        self.number = number
+        self.positions = positions
+        self.offsets = offsets
+        self.map = None
+
+    def find(self, pos: int) -> int:
+        """Get the offset of the revision stored at pos, -1 if it is not here"""
+        index = bisect_left(self.positions, pos)
+        if index < len(self.positions) and self.positions[index] == pos:
+            return self.offsets[index]
+        return -1
+
+    def read(self, offset: int) -> TypeData:
+        """Decode the revision saved at offset"""
+        segment_map = self.map
+        if segment_map is None:
+            with open(self.file_name, "rb") as f:
+                segment_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.map = segment_map
+        return json.loads(segment_map[offset : segment_map.find(b"\n", offset)])
+
+    def close(self) -> None:
+        """Unmap the file"""
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+
+class FiableDB:
+    """A database with its own file, revisions and indexes, so several of them
+    can be open in the same process
+    """
+
+    def __init__(
+        self,
+        file_name: str = FILE,
+        keyframe_interval: int = 100,
+        read_only: bool = False,
+        trusted: bool = False,
+        timestamps: bool = False,
+        cache_size: int = 0,
+    ) -> None:
+        """Create a database, start() loads or creates its file
+        Args:
+                file_name (str, optional): The file to use. Defaults to FILE.
+                keyframe_interval (int, optional): Revisions of a record between two
+                    stored whole, the others only store what changed. Defaults to 100.
+                read_only (bool, optional): Return read-only views of the revisions
+                    instead of the dicts stored. Defaults to False.
+                trusted (bool, optional): Store the data passed to add() and update()
+                    without copying it, the caller must not modify it later.
+                    Defaults to False.
+                timestamps (bool, optional): Save when every new revision is
+                    written, to search the database as it was at a time.
+                    Defaults to False.
+                cache_size (int, optional): Results of find_all and of find_one by
+                    data kept until a write to their table. Defaults to 0, no
+                    cache.
+        """
+        # Input validation
+        if not isinstance(cache_size, int) or cache_size < 0:
+            raise ValueError("cache_size must be a non negative integer")
+        self.file = file_name
+        # Returned revisions are MappingProxyType views, see freeze_row()
+        self.read_only = read_only
+        # Input data is stored as it is, not deep copied
+        self.trusted = trusted
+        # New revisions are stamped with the time, saved in the "time" key
+        self.timestamps = timestamps
+        # Revisions, in the order they were written, see Revisions. Updates are
+        # stored as deltas of the previous revision
+        self.database = Revisions()
+        self.keyframe_interval = max(1, keyframe_interval)
+        # (table, id) -> (position, revision) of the heads stored as deltas
+        self.head_rows = {}
+
+        # Writers are serialized by the lock. Readers do not take it: they pin seq,
+        # the revisions committed when they start, and ignore the ones after it
+        self.lock = threading.RLock()
+        self.seq = 0
+        # Bumped when the revisions are replaced (load, start...), readers retry
+        self.generation = 0
+        # Reloads in progress, readers wait for them
+        self.reloading = 0
+        # Odd while a write is changing the data indexes
+        self.index_version = 0
+        # Open batch(): the position of its first revision and the thread writing
+        # it. Its revisions are not saved nor seen by other readers until it ends
+        self.batch_start = None
+        self.batch_thread = None
+        # A write of the batch asked to be durable
+        self.batch_durable = False
+        # (first position, end) of the batches not saved yet, a journal frames
+        # them so a torn save does not store half of one
+        self.batches = []
+
+        # Query cache: key -> (generations when it was found, result), least
+        # recently used first, see cached()
+        self.cache_size = cache_size
+        self.query_cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+        # Bumped by every revision written to a table, and to any table
+        self.table_generations = {}
+        self.write_generation = 0
+
+        # Group commit: the first revisions saved and fsynced
+        self.durable_seq = 0
+        # Guards durable_seq and flushing, notified when a flush ends
+        self.flush_condition = threading.Condition()
+        self.flushing = False
+        # Background flusher, see start_flusher()
+        self.flusher = None
+        self.flush_interval = 0.0
+        self.flush_records = 0
+        self.stop_flushing = False
+
+        # Shared mode: several processes append to the same journal, holding an
+        # exclusive lock on its lock file
+        self.shared = False
+        self.lock_file = None
+        self.file_locks = 0
+
+        # Journal mode: save() only appends the new revisions, one JSON per line
+        self.journal = False
+        # The journal file already holds the first journal_count revisions
+        self.journal_file = ""
+        self.journal_count = 0
+        # Bytes of the journal file holding complete revisions
+        self.journal_size = 0
+
+        # Lazy mode: only the metadata of the revisions saved in the journal is
+        # kept in memory, their data is read from the journal when they are returned
+        self.lazy = False
+        # The journal the payloads are read from, mapped in memory
+        self.payload_file = ""
+        self.payload_map = None
+        # Offset of every revision in payload_file, -1 if it is held in memory
+        self.payload_offsets = array("q")
+        # Tiered storage: old revisions archived to read-only segment files, their
+        # data is dropped from memory, see archive()
+        self.segments = []
+        # The database file holds the first saved_count revisions, only those
+        # are archived
+        self.saved_count = 0
+
+        # Indexes
+        # (table, id) -> positions in database of every revision, ordered by rev
+        self.revisions_index = {}
+        # table -> highest id ever used in it
+        self.last_ids = {}
+        # table -> {id: positions of its revisions}, the newest one is the head
+        self.heads = {}
+        # Tables whose heads were registered out of id order
+        self.unsorted_tables = set()
+        # table -> {field: {value: ids whose latest revision has that value}}
+        self.data_indexes = {}
+        # table -> {field: {"number"|"str": sorted [(value, id)]}} of the latest
+        # revisions
+        self.sorted_indexes = {}
+
+    @contextmanager
+    def write_lock(self, reload: bool = False):
+        """Serialize a write, readers see its revisions once it finishes
+        Args:
+                reload (bool, optional): The write replaces the revisions or the
+                    indexes, readers wait for it and retry. Defaults to False.
+        """
+        with self.lock:
+            if reload:
+                self.reloading += 1
+                self.generation += 1
+            try:
+                yield
+            finally:
+                if self.batch_start is None:
+                    self.seq = len(self.database)
+                if reload:
+                    self.generation += 1
+                    self.reloading -= 1
+                if (
+                    self.flusher is not None
+                    and self.seq - self.durable_seq >= self.flush_records
+                ):
+                    with self.flush_condition:
+                        self.flush_condition.notify_all()
+
+    @contextmanager
+    def file_lock(self, file_name: str = ""):
+        """Hold the lock of a shared journal, the other processes wait for it
+        Args:
+                file_name (str, optional): The journal. Defaults to the database file.
+        """
+        with self.lock:
+            self.file_locks += 1
+            try:
+                if self.file_locks == 1:
+                    self.lock_file = open(get_lock_file(file_name or self.file), "ab")
+                    fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX)
+                yield
+            finally:
+                if self.file_locks == 1 and self.lock_file is not None:
+                    # Closing the file releases the lock
+                    self.lock_file.close()
+                    self.lock_file = None
+                self.file_locks -= 1
+
+    @contextmanager
+    def shared_write(self):
+        """Serialize a write. In shared mode it also holds the lock of the journal,
+        reads what the other processes appended first and appends the new
+        revisions at the end.
+        """
+        with self.write_lock():
+            if not self.shared or self.file_locks:
+                yield
+                return
+            with self.file_lock():
+                self.refresh()
+                yield
+                self.save_journal(self.file)
+
+    @contextmanager
+    def batch(self, durable: bool = False):
+        """Group writes so they are committed together. The writes in the block
+        are staged: the other threads do not see them and they are not saved
+        until the block ends, then they are appended to the file at once. If the
+        block raises an exception, its revisions are discarded.
+        Args:
+                durable (bool, optional): Wait until the batch is saved and
+                    fsynced. Defaults to False.
+        """
+        if self.batch_thread == threading.get_ident():
+            # Nested, part of the batch already open
+            yield
+            return
+        with self.shared_write():
+            first = len(self.database)
+            self.batch_start = first
+            self.batch_thread = threading.get_ident()
+            self.batch_durable = durable
+            try:
+                yield
+            except BaseException:
+                self.batch_start = self.batch_thread = None
+                self.rollback(first)
+                raise
+            finally:
+                self.batch_start = self.batch_thread = None
+            if self.journal and len(self.database) - first > 1:
+                self.batches.append((first, len(self.database)))
+        if self.batch_durable:
+            self.sync()
+
+    def rollback(self, count: int) -> None:
+        """Discard the revisions written from a position on. Only their records
+        are moved back to their previous revision in the indexes, the ids they
+        used are not given again.
+        Args:
+                count (int): The revisions kept
+        """
+        with self.write_lock():
+            database = self.database
+            for pos in reversed(range(count, len(database))):
+                self.unindex_row(pos)
+            database.truncate(count)
+            if self.payload_file:
+                del self.payload_offsets[count:]
+
+    def unindex_row(self, pos: int) -> None:
+        """Remove the latest revision of a record from the indexes, its previous
+        revision is the latest again
+        Args:
+                pos (int): The position of the revision in database
+        """
+        database = self.database
+        id = database.ids[pos]
+        table = database.get_table(pos)
+        key = (table, id)
+        self.table_generations[table] = self.table_generations.get(table, 0) + 1
+        self.write_generation += 1
+        indexed = table in self.data_indexes
+        if indexed:
+            # Readers of the sorted indexes retry while the version is odd
+            self.index_version += 1
+            self.unindex_data(id, self.get_row(pos)["data"], table)
+        self.head_rows.pop(key, None)
+        positions = self.revisions_index[key]
+        positions.remove(pos)
+        if not positions:
+            del self.revisions_index[key]
+            del self.heads[table][id]
         else:
-            # Find latest revision
-            return get_latest_revision(id, table)
+            head = positions[-1]
+            if database.is_delta(head):
+                self.head_rows[key] = (head, self.get_row(head))
+            if indexed:
+                self.index_data(id, self.get_row(head)["data"], table)
+        if indexed:
+            self.index_version += 1
+
+    def refresh(self) -> int:
+        """Read the revisions appended to the journal by other processes since it
+        was last read, instead of loading it again
+        Returns:
+                int: The revisions read
+        """
+        file_name = self.journal_file
+        try:
+            if not file_name or path.getsize(file_name) <= self.journal_size:
+                return 0
+        except OSError:
+            return 0
+        with self.write_lock():
+            start = self.journal_size
+            offset = start
+            count = 0
+            with open(file_name, "rb") as f:
+                f.seek(start)
+                for row, size in iter_journal(f):
+                    if "checkpoint" not in row:
+                        if self.payload_file == file_name:
+                            self.append_lazy(row, offset)
+                        else:
+                            self.append_row(row, stamp=row.pop("time", None))
+                        count += 1
+                    offset = start + size
+            self.journal_size = offset
+            self.journal_count = len(self.database)
+            return count
+
+    def read(self, function, *args):
+        """Run function(*args, seq) on the revisions committed so far, without
+        blocking writers
+        Args:
+                function (callable): The read, it must ignore positions >= seq
+        Returns:
+                Any: What function returns
+        """
+        if self.shared:
+            self.refresh()
+        if self.batch_thread == threading.get_ident():
+            # The batch reads its own revisions
+            return function(*args, len(self.database))
+        while True:
+            generation = self.generation
+            if self.reloading:
+                # Wait for the reload to finish
+                with self.lock:
+                    if self.reloading:
+                        # Called by the reload itself
+                        return function(*args, len(self.database))
+                continue
+            try:
+                result = function(*args, self.seq)
+            except Exception:
+                if self.generation == generation:
+                    raise
+                # Failed because of a reload
+                continue
+            if self.generation == generation:
+                return result
+
+    def index_row(
+        self,
+        pos: int,
+        full_row: Optional[TypeData] = None,
+        index_data: bool = True,
+    ) -> None:
+        """Register the row stored at pos in the indexes
+        Args:
+                pos (int): The position of the row in database
+                full_row (dict, optional): The revision with its data, when the row
+                    is a delta. Defaults to None, rebuilt if needed.
+                index_data (bool, optional): Update the data indexes, False when
+                    the caller moves many records at once. Defaults to True.
+        """
+        database = self.database
+        id = database.ids[pos]
+        rev = database.revs[pos]
+        table = database.get_table(pos)
+        # The cached results of the table are stale now
+        self.table_generations[table] = self.table_generations.get(table, 0) + 1
+        self.write_generation += 1
+        if id > self.last_ids.get(table, 0):
+            self.last_ids[table] = id
+        key = (table, id)
+        positions = self.revisions_index.get(key)
+        if positions is None:
+            positions = self.revisions_index[key] = []
+            table_heads = self.heads.setdefault(table, {})
+            if table_heads and id < next(reversed(table_heads)):
+                self.unsorted_tables.add(table)
+            table_heads[id] = positions
+        if positions and database.revs[positions[-1]] > rev:
+            # Revisions out of order (edited file): keep the list sorted by rev
+            lo, hi = 0, len(positions)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if database.revs[positions[mid]] <= rev:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo < len(positions) and database.is_delta(positions[lo]):
+                # The next revision is a delta of a different one now
+                database[positions[lo]] = self.get_row(positions[lo])
+                self.head_rows.pop(key, None)
+            positions.insert(lo, pos)
+            return
+        indexed = index_data and table in self.data_indexes
+        if indexed:
+            # Readers of the sorted indexes retry while the version is odd
+            self.index_version += 1
+            if positions:
+                self.unindex_data(id, self.get_row(positions[-1])["data"], table)
+        positions.append(pos)
+        if database.is_delta(pos):
+            # Keep the data of the new head, reading it stays O(1)
+            full_row = full_row if full_row is not None else self.get_row(pos)
+            self.head_rows[key] = (pos, full_row)
+        elif key in self.head_rows:
+            del self.head_rows[key]
+        if indexed:
+            self.index_data(id, self.get_row(pos)["data"], table)
+            self.index_version += 1
+
+    def index_data(
+        self, id: int, data: dict, table: str = "default", ordered: bool = True
+    ) -> None:
+        """Add the data of the latest revision of a record to the indexes, the
+        sorted ones too unless ordered is False
+        """
+        for field, index in self.data_indexes[table].items():
+            if field in data:
+                index.setdefault(index_key(data[field]), set()).add(id)
+        if not ordered:
+            return
+        for field, index in self.sorted_indexes.get(table, {}).items():
+            if field in data and order_class(data[field]):
+                insort(index[order_class(data[field])], (data[field], id))
+
+    def unindex_data(
+        self, id: int, data: dict, table: str = "default", ordered: bool = True
+    ) -> None:
+        """Remove the data of a revision that is no longer the latest, from the
+        sorted indexes too unless ordered is False
+        """
+        for field, index in self.data_indexes[table].items():
+            if field in data:
+                key = index_key(data[field])
+                ids = index.get(key)
+                if ids is not None:
+                    ids.discard(id)
+                    if not ids:
+                        del index[key]
+        if not ordered:
+            return
+        for field, index in self.sorted_indexes.get(table, {}).items():
+            if field in data and order_class(data[field]):
+                values = index[order_class(data[field])]
+                pos = bisect_left(values, (data[field], id))
+                if pos < len(values) and values[pos] == (data[field], id):
+                    del values[pos]
+
+    def reindex_data(self, table: str, changes: List[Tuple[int, dict, dict]]) -> None:
+        """Move many records to the data of their new revisions in the indexes.
+        Every sorted index is merged once, instead of moving each value.
+        Args:
+                table (str): The table of the records
+                changes (list[tuple]): The id, old data and new data of every record
+        """
+        if table not in self.data_indexes:
+            return
+        # Readers of the sorted indexes retry while the version is odd
+        self.index_version += 1
+        try:
+            for id, old, new in changes:
+                self.unindex_data(id, old, table, ordered=False)
+                self.index_data(id, new, table, ordered=False)
+            for field, index in self.sorted_indexes.get(table, {}).items():
+                removed = set()
+                added = []
+                for id, old, new in changes:
+                    if field in old and order_class(old[field]):
+                        removed.add((old[field], id))
+                    if field in new and order_class(new[field]):
+                        added.append((new[field], id))
+                for group, values in index.items():
+                    kept = [item for item in values if item not in removed]
+                    kept.extend(item for item in added if order_class(item[0]) == group)
+                    # Two sorted runs, merged in linear time
+                    kept.sort()
+                    values[:] = kept
+        finally:
+            self.index_version += 1
+
+    def rebuild_indexes(self) -> None:
+        """Rebuild the indexes from the current database"""
+        self.revisions_index = {}
+        self.last_ids = {}
+        self.heads = {}
+        self.unsorted_tables = set()
+        self.head_rows = {}
+        # Keep the indexed fields, their content is rebuilt
+        self.data_indexes = {
+            table: {field: {} for field in fields}
+            for table, fields in self.data_indexes.items()
+        }
+        self.sorted_indexes = {
+            table: {field: {"number": [], "str": []} for field in fields}
+            for table, fields in self.sorted_indexes.items()
+        }
+        for pos in range(len(self.database)):
+            self.index_row(pos)
+
+    def rebuild_data_indexes(self) -> None:
+        """Rebuild the hash and sorted indexes from the latest revisions"""
+        fields = {table: list(indexes) for table, indexes in self.data_indexes.items()}
+        ordered = {
+            table: set(indexes) for table, indexes in self.sorted_indexes.items()
+        }
+        self.data_indexes = {}
+        self.sorted_indexes = {}
+        for table, table_fields in fields.items():
+            for field in table_fields:
+                self.create_index(field, table, ordered=field in ordered.get(table, ()))
+
+    def append_row(
+        self,
+        row: TypeData,
+        delta: Optional[dict] = None,
+        stamp: Optional[float] = None,
+        index_data: bool = True,
+    ) -> TypeData:
+        """Append a new revision to the database and index it
+        Args:
+                row (dict): The revision to append
+                delta (dict, optional): The keys set and unset from the previous
+                    revision. Defaults to None, compared with it.
+                stamp (float, optional): When it was written. Defaults to None,
+                    unknown.
+                index_data (bool, optional): Update the data indexes. Defaults to
+                    True.
+        Returns:
+                dict: The revision appended
+        """
+        self.database.append_revision(
+            row["id"],
+            row["rev"],
+            row.get("table"),
+            self.encode_revision(row, delta),
+            stamp,
+        )
+        if self.payload_file:
+            self.payload_offsets.append(-1)
+        self.index_row(len(self.database) - 1, row, index_data)
+        return row
+
+    def encode_revision(self, row: TypeData, delta: Optional[dict] = None):
+        """Get the payload stored of a new revision: only the keys set and unset
+        from the previous revision, or the whole data every keyframe_interval
+        revisions, when there is no previous revision or when it is not smaller
+        Args:
+                row (dict): The revision
+                delta (dict, optional): The keys set and unset from the previous
+                    revision. Defaults to None, compared with it.
+        Returns:
+                dict|tuple: The data, or the (set, unset) pair of a delta
+        """
+        if (row["rev"] - 1) % self.keyframe_interval == 0:
+            return row["data"]
+        positions = self.revisions_index.get((get_table(row), row["id"]))
+        if not positions or self.database.revs[positions[-1]] != row["rev"] - 1:
+            return row["data"]
+        if delta is None:
+            delta = diff_data(self.get_row(positions[-1])["data"], row["data"])
+        if len(delta["set"]) >= len(row["data"]):
+            return row["data"]
+        return (delta["set"], delta["unset"])
+
+    def get_row(self, pos: int) -> TypeData:
+        """Get the revision stored at pos, rebuilding it if it is a delta and
+        reading its data in lazy mode
+        Args:
+                pos (int): The position of the revision in database
+        Returns:
+                dict: The revision
+        """
+        database = self.database
+        payload = database.payloads[pos]
+        if type(payload) is dict:
+            row = database.get_metadata(pos)
+            row["data"] = payload
+            return row
+        if payload is not None:
+            return self.rebuild_row(pos)
+        for segment in self.segments:
+            offset = segment.find(pos)
+            if offset != -1:
+                return segment.read(offset)
+        if pos >= len(self.payload_offsets) or self.payload_offsets[pos] == -1:
+            raise FileNotFoundError(
+                f"The data of revision {database.revs[pos]} of record "
+                f"{database.ids[pos]} is not in memory, a segment or the journal"
+            )
+        return self.read_payload(self.payload_offsets[pos])
+
+    def rebuild_row(self, pos: int) -> TypeData:
+        """Rebuild a revision stored as a delta, applying the deltas since the
+        previous keyframe (or the cached head) in order
+        Args:
+                pos (int): The position of the delta in database
+        Returns:
+                dict: The revision
+        """
+        database = self.database
+        id = database.ids[pos]
+        rev = database.revs[pos]
+        table = database.get_table(pos)
+        key = (table, id)
+        head = self.head_rows.get(key)
+        if head is not None and head[0] == pos:
+            return head[1]
+        positions = self.revisions_index[key]
+        index = rev - 1
+        if not (0 <= index < len(positions) and positions[index] == pos):
+            index = positions.index(pos)
+        deltas = [database.payloads[pos]]
+        while True:
+            index -= 1
+            previous = positions[index]
+            if head is not None and head[0] == previous:
+                data = head[1]["data"]
+                break
+            if not database.is_delta(previous):
+                data = self.get_row(previous)["data"]
+                break
+            deltas.append(database.payloads[previous])
+        for set_values, unset in reversed(deltas):
+            data = apply_delta(data, set_values, unset)
+        return {"id": id, "rev": rev, "table": table, "data": data}
+
+    def iter_rows(
+        self,
+        first: int = 0,
+        end: Optional[int] = None,
+        positions: Optional[Sequence[int]] = None,
+    ):
+        """Iterate the revisions between two positions with their data. Deltas are
+        rebuilt from the revision before them, not replayed from their keyframe.
+        Args:
+                first (int, optional): The first position. Defaults to 0.
+                end (int, optional): The position after the last one. Defaults to None,
+                    the end of the database.
+                positions (list[int], optional): Iterate these positions instead, in
+                    increasing order. Defaults to None.
+        Returns:
+                Iterator[dict]: The revisions
+        """
+        database = self.database
+        end = len(database) if end is None else end
+        if positions is None:
+            positions = range(first, end)
+        # (table, id) -> the last revision returned
+        previous = {}
+        for pos in positions:
+            id = database.ids[pos]
+            rev = database.revs[pos]
+            key = (database.get_table(pos), id)
+            base = previous.get(key)
+            if database.is_delta(pos) and base is not None and base["rev"] == rev - 1:
+                row = {
+                    "id": id,
+                    "rev": rev,
+                    "table": key[0],
+                    "data": apply_delta(base["data"], *database.payloads[pos]),
+                }
+            else:
+                row = self.get_row(pos)
+            previous[key] = row
+            yield row
+
+    def read_payload(self, offset: int) -> TypeData:
+        """Decode the revision saved at offset of the payload file"""
+        payload_map = self.payload_map
+        end = -1
+        if payload_map is not None and offset < len(payload_map):
+            end = payload_map.find(b"\n", offset)
+        if end == -1:
+            # Saved after the file was mapped
+            payload_map = self.map_payloads(offset)
+            end = payload_map.find(b"\n", offset)
+        row = json.loads(payload_map[offset:end])
+        # The timestamp is kept in memory
+        row.pop("time", None)
+        return row
+
+    def map_payloads(self, offset: int = -1) -> Optional[mmap.mmap]:
+        """Map the payload file in memory again, to see what was appended
+        Args:
+                offset (int, optional): Only map it again if offset is not mapped
+                    yet. Defaults to -1.
+        Returns:
+                mmap or None: The payload file mapped, None if it is empty
+        """
+        with self.lock:
+            if self.payload_map is None or offset >= len(self.payload_map):
+                # The old map is closed once the readers using it drop it
+                self.payload_map = None
+                if path.getsize(self.payload_file) > 0:
+                    with open(self.payload_file, "rb") as f:
+                        self.payload_map = mmap.mmap(
+                            f.fileno(), 0, access=mmap.ACCESS_READ
+                        )
+            return self.payload_map
 
-    # If searching by data filter
-    elif data:
-        # Get all latest revisions for each id in the specified table
-        latest_records = {}
-        search_table = table if table else ""
+    def close_payloads(self) -> None:
+        """Read the data of every lazy revision and leave lazy mode"""
+        with self.write_lock(reload=bool(self.payload_file)):
+            if self.payload_file:
+                # Deltas stay deltas, of revisions that are in memory now
+                payloads = self.database.payloads
+                for pos, payload in enumerate(payloads):
+                    if payload is None and not self.is_archived(pos):
+                        payloads[pos] = self.get_row(pos)["data"]
+            if self.payload_map is not None:
+                self.payload_map.close()
+            self.payload_file = ""
+            self.payload_map = None
+            self.payload_offsets = array("q")
 
-        for row in database:
-            if search_table and row["table"] != search_table:
+    def is_archived(self, pos: int) -> bool:
+        """Check if the revision stored at pos is in a segment file"""
+        return any(segment.find(pos) != -1 for segment in self.segments)
+
+    def archive(self, as_of: Type_As_Of = None) -> int:
+        """Move the data of the old revisions to a new read-only segment file, so
+        it is not kept in memory. Only the revisions already saved that are not
+        the latest of their record are archived, they are still returned by every
+        read. The segments are used again when the database is loaded.
+        Args:
+                as_of (int|float|datetime, optional): Only archive the revisions
+                    written before it, a seq, a timestamp or a datetime, like in
+                    find_all. Defaults to None, all of them.
+        Returns:
+                int: The revisions archived
+        """
+        with self.write_lock(reload=True):
+            if self.shared:
+                # The other processes would write the same segment files
+                raise ValueError("archive can not be used in shared mode")
+            if self.batch_start is not None:
+                raise ValueError("archive can not be used in a batch")
+            seq = len(self.database) if as_of is None else self.get_seq(as_of)
+            # The segments have to match the file when it is loaded again
+            seq = min(seq, self.saved_count)
+            payloads = self.database.payloads
+            positions = sorted(
+                pos
+                for revisions in self.revisions_index.values()
+                for pos in revisions[:-1]
+                if pos < seq and payloads[pos] is not None
+            )
+            if not positions:
+                return 0
+            # Segment files are never overwritten, a snapshot may use them
+            number = self.segments[-1].number + 1 if self.segments else 1
+            while os.path.exists(get_segment_file(self.file, number)):
+                number += 1
+            segment_file = get_segment_file(self.file, number)
+            offsets = array("q")
+            with open(segment_file + ".tmp", "wb") as f:
+                # Whole revisions, not deltas of the ones in memory
+                for row in self.iter_rows(positions=positions):
+                    offsets.append(f.tell())
+                    f.write(encode_row(row))
+                f.flush()
+                os.fsync(f.fileno())
+            database = self.database
+            records = [
+                SEGMENT_RECORD.pack(pos, database.ids[pos], database.revs[pos], offset)
+                for pos, offset in zip(positions, offsets)
+            ]
+            index_file = get_segment_index_file(segment_file)
+            with open(index_file + ".tmp", "wb") as f:
+                f.write(SEGMENT_HEADER + b"".join(records))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(segment_file + ".tmp", segment_file)
+            os.replace(index_file + ".tmp", index_file)
+            self.segments.append(
+                Segment(segment_file, number, array("q", positions), offsets)
+            )
+            for pos in positions:
+                payloads[pos] = None
+            return len(positions)
+
+    def open_segments(self, file_name: str) -> None:
+        """Use the segment files of a database that was just loaded, dropping the
+        data of the revisions archived in them from memory. The file also holds
+        that data, it stays in memory if a segment is incomplete or does not
+        match the revisions.
+        Args:
+                file_name (str): The database file
+        """
+        database = self.database
+        for number in get_segment_numbers(file_name):
+            segment_file = get_segment_file(file_name, number)
+            entries = read_segment_index(segment_file)
+            if entries is None or not all(
+                pos < len(database)
+                and database.ids[pos] == id
+                and database.revs[pos] == rev
+                for pos, id, rev, _ in entries
+            ):
+                continue
+            self.segments.append(
+                Segment(
+                    segment_file,
+                    number,
+                    array("q", [entry[0] for entry in entries]),
+                    array("q", [entry[3] for entry in entries]),
+                )
+            )
+            for pos, _, _, _ in entries:
+                database.payloads[pos] = None
+
+    def use_snapshot(self, segment: Segment) -> None:
+        """Read the data of the revisions stored whole in a snapshot that was just
+        written from it, instead of from memory or the journal
+        Args:
+                segment (Segment): The revisions of the snapshot, number 0
+        """
+        with self.write_lock(reload=True):
+            with open(segment.file_name, "rb") as f:
+                segment.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            segments = self.segments
+            self.segments = [segment] + [item for item in segments if item.number]
+            self.close_segments(segments)
+            payloads = self.database.payloads
+            for pos in segment.positions:
+                payloads[pos] = None
+            # The journal only holds the revisions saved after the snapshot
+            if self.payload_map is not None:
+                self.payload_map.close()
+            self.payload_map = None
+            if self.payload_file:
+                self.payload_offsets = array("q", [-1]) * len(self.database)
+
+    def remove_segments(self, file_name: str) -> None:
+        """Delete the segment files left by a previous database with this file"""
+        for number in get_segment_numbers(file_name):
+            segment_file = get_segment_file(file_name, number)
+            for name in (segment_file, get_segment_index_file(segment_file)):
+                if path.exists(name):
+                    os.remove(name)
+
+    def close_segments(self, segments: list) -> None:
+        """Unmap segment files that are no longer used"""
+        for segment in segments:
+            if segment not in self.segments:
+                segment.close()
+
+    def make_lazy(self, pos: int, offset: int) -> None:
+        """Drop the data of a revision saved at offset of the payload file"""
+        # Set the offset first, readers may get the row at any moment
+        self.payload_offsets[pos] = offset
+        key = (self.database.get_table(pos), self.database.ids[pos])
+        if self.head_rows.get(key, (None,))[0] == pos:
+            del self.head_rows[key]
+        self.database.payloads[pos] = None
+
+    def append_lazy(self, row: TypeData, offset: int) -> None:
+        """Append the metadata of a revision saved at offset of the payload file"""
+        self.database.append_revision(
+            row["id"], row["rev"], row.get("table"), None, row.get("time")
+        )
+        self.payload_offsets.append(offset)
+        self.index_row(len(self.database) - 1)
+
+    def load_lazy(self, file_name: str, f) -> int:
+        """Load the metadata of the revisions of a journal, their data stays in it.
+        The offsets file lets it skip the revisions read by a previous load.
+        Args:
+                file_name (str): The journal file
+                f (file): The journal opened in binary mode
+        Returns:
+                int: The bytes of the journal holding complete revisions
+        """
+        restored = self.read_snapshot(file_name, lazy=True)
+        self.payload_file = file_name
+        self.payload_offsets = array("q", [-1]) * len(self.database)
+        self.map_payloads()
+        # Journal position of the next revision
+        seq = 0
+        size = 0
+
+        def skip_checkpoint(row: dict) -> None:
+            nonlocal seq
+            # Revisions before it are in the snapshot
+            seq = row["checkpoint"]
+            if seq > restored:
+                raise ValueError("Snapshot missing or outdated")
+
+        first_line = f.readline()
+        if first_line.endswith(b"\n") and b'"checkpoint"' in first_line:
+            row = json.loads(first_line)
+            if "checkpoint" in row:
+                skip_checkpoint(row)
+                size = len(first_line)
+        # Revisions in the offsets file, as long as they follow each other
+        entries = read_offsets(file_name)
+        append = entries is not None
+        entries = entries or []
+        used = 0
+        while self.payload_map is not None and used < len(entries):
+            # A revision, or the revisions of a batch once all of them are whole
+            count = 1
+            end = size
+            if self.payload_map[size : size + len(BATCH_MARKER)] == BATCH_MARKER:
+                end = self.payload_map.find(b"\n", size) + 1
+                if not end:
+                    break
+                count = json.loads(self.payload_map[size:end])["batch"]
+            group = entries[used : used + count]
+            if len(group) < count:
+                break
+            for entry in group:
+                if entry[3] != end:
+                    break
+                end = self.payload_map.find(b"\n", end) + 1
+                if not end:
+                    break
+            else:
+                for id, rev, table, offset, stamp in group:
+                    seq += 1
+                    if seq > restored:
+                        self.append_lazy(
+                            {"id": id, "rev": rev, "table": table, "time": stamp},
+                            offset,
+                        )
+                size = end
+                used += count
+                continue
+            break
+        # Revisions saved after the offsets file was written
+        records = []
+        f.seek(size)
+        end = size
+        # The revisions of the batch being read, they are used once it is whole
+        pending = []
+        remaining = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                # The last line of an interrupted save
+                break
+            offset = end
+            end += len(line)
+            if not line.strip():
+                if not remaining:
+                    size = end
+                continue
+            row = json.loads(line)
+            if "batch" in row:
+                pending = []
+                remaining = row["batch"]
                 continue
+            pending.append((row, offset))
+            if remaining:
+                remaining -= 1
+                if remaining:
+                    continue
+            size = end
+            for row, offset in pending:
+                if "checkpoint" in row:
+                    skip_checkpoint(row)
+                    continue
+                seq += 1
+                records.append(
+                    encode_offset(
+                        row["id"], row["rev"], get_table(row), offset, row.get("time")
+                    )
+                )
+                if seq > restored:
+                    self.append_lazy(row, offset)
+            pending = []
+        if records:
+            try:
+                offsets_file = get_offsets_file(file_name)
+                if append and used == len(entries):
+                    with open(offsets_file, "ab") as offsets:
+                        offsets.write(b"".join(records))
+                else:
+                    kept = [encode_offset(*entry) for entry in entries[:used]]
+                    with open(offsets_file, "wb") as offsets:
+                        offsets.write(OFFSETS_HEADER + b"".join(kept + records))
+            except OSError:
+                # The offsets file only makes the next load faster
+                pass
+        return size
+
+    def get_revision_positions(self, id: int, table: str = "default") -> List[int]:
+        """Get the positions of every revision of a record, ordered by rev"""
+        return self.revisions_index.get((table, id), [])
+
+    def iter_latest(
+        self, table: str = "default", seq: Optional[int] = None, after_id: int = 0
+    ):
+        """Iterate the latest revision of every record, ordered by table and id
+        Args:
+                table (str, optional): The table to read, "" for every table. Defaults to "default".
+                seq (int, optional): Only see the revisions before seq. Defaults to None.
+                after_id (int, optional): Only the records with a greater id.
+                    Defaults to 0.
+        Returns:
+                Iterator[dict]: The latest revisions
+        """
+        tables = [table] if table else sorted(self.heads)
+        for name in tables:
+            table_heads = self.heads.get(name, {})
+            last_id = self.last_ids.get(name, 0)
+            if last_id <= 2 * len(table_heads):
+                # Few ids are missing: look them up in order, nothing is copied and
+                # the first records are returned at once
+                heads = (table_heads.get(id) for id in range(after_id + 1, last_id + 1))
+            else:
+                if name in self.unsorted_tables:
+                    with self.lock:
+                        if name in self.unsorted_tables:
+                            self.heads[name] = dict(sorted(table_heads.items()))
+                            self.unsorted_tables.discard(name)
+                # Copy the heads, writers may add records meanwhile
+                heads = [
+                    positions
+                    for id, positions in list(self.heads[name].items())
+                    if id > after_id
+                ]
+            for positions in heads:
+                count = count_visible(positions, seq) if positions else 0
+                if count:
+                    yield self.get_row(positions[count - 1])
+
+    def create_index(
+        self, field: str, table: str = "default", ordered: bool = False
+    ) -> bool:
+        """Create an index over a data field of the latest revisions
+        Args:
+                field (str): The data field to index
+                table (str, optional): The table to index. Defaults to "default".
+                ordered (bool, optional): Also keep the values sorted for range queries. Defaults to False.
+        Returns:
+                bool: True if the index was created, False if it already existed
+        """
+        if not isinstance(field, str):
+            raise TypeError("field must be a string")
+        with self.write_lock(reload=True):
+            created = False
+            fields = self.data_indexes.setdefault(table, {})
+            if field not in fields:
+                index = {}
+                for record in self.iter_latest(table):
+                    if field in record["data"]:
+                        key = index_key(record["data"][field])
+                        index.setdefault(key, set()).add(record["id"])
+                fields[field] = index
+                created = True
+            if ordered and field not in self.sorted_indexes.get(table, {}):
+                values = {"number": [], "str": []}
+                for record in self.iter_latest(table):
+                    value = record["data"].get(field)
+                    if field in record["data"] and order_class(value):
+                        values[order_class(value)].append((value, record["id"]))
+                for group in values.values():
+                    group.sort()
+                self.sorted_indexes.setdefault(table, {})[field] = values
+                created = True
+            return created
+
+    def drop_index(self, field: str, table: str = "default") -> bool:
+        """Drop an index
+        Args:
+                field (str): The indexed data field
+                table (str, optional): The table of the index. Defaults to "default".
+        Returns:
+                bool: True if the index was dropped, False if it did not exist
+        """
+        with self.write_lock(reload=True):
+            fields = self.data_indexes.get(table, {})
+            if field not in fields:
+                return False
+            del fields[field]
+            if not fields:
+                del self.data_indexes[table]
+            sorted_fields = self.sorted_indexes.get(table, {})
+            if field in sorted_fields:
+                del sorted_fields[field]
+                if not sorted_fields:
+                    del self.sorted_indexes[table]
+            return True
+
+    def get_next_id(self, table: str = "default") -> int:
+        """Get the next id for the table"""
+        return self.last_ids.get(table, 0) + 1
+
+    def reserve_ids(self, count: int, table: str = "default") -> int:
+        """Reserve a block of consecutive ids in the table
+        Args:
+                count (int): How many ids to reserve
+                table (str, optional): The table of the ids. Defaults to "default".
+        Returns:
+                int: The first id of the block
+        """
+        # Input validation
+        if not isinstance(count, int) or count < 1:
+            raise ValueError("count must be a positive integer")
+        with self.write_lock():
+            first_id = self.get_next_id(table)
+            self.last_ids[table] = first_id + count - 1
+            return first_id
+
+    def start(
+        self,
+        file_name: str = "",
+        journal: Optional[bool] = None,
+        lazy: bool = False,
+        shared: bool = False,
+    ) -> str:
+        """Start the database
+        Args:
+                file (str, optional): The file to use. Defaults to FILE.
+                journal (bool, optional): Save as an append-only journal. Defaults to None,
+                    which keeps the format of the existing file.
+                lazy (bool, optional): Keep the data of the revisions saved in a journal
+                    in the file, and read it only when they are returned. Defaults to False.
+                shared (bool, optional): Share the journal with other processes, every
+                    write is appended to it at once. Defaults to False.
+        Returns:
+                str: The file used
+        """
+        if shared and fcntl is None:
+            raise OSError("shared mode needs fcntl")
+        with self.write_lock(reload=True):
+            my_file_name = file_name if file_name != "" else self.file
+            self.journal = bool(journal) or shared
+            self.lazy = lazy
+            self.shared = False
+            with self.file_lock(my_file_name) if shared else nullcontext():
+                if path.exists(my_file_name):
+                    # Load the database
+                    try:
+                        self.load(my_file_name)
+                        if journal is None:
+                            self.journal = shared or self.journal_file == my_file_name
+                    except Exception as e:
+                        # If loading fails, create empty database
+                        self.database = Revisions()
+                        self.close_payloads()
+                        self.rebuild_indexes()
+                        self.save(my_file_name)
+                else:
+                    # Create the database
+                    self.database = Revisions()
+                    self.close_payloads()
+                    segments, self.segments = self.segments, []
+                    self.close_segments(segments)
+                    # They belong to a database that no longer exists
+                    self.remove_segments(my_file_name)
+                    self.batches = []
+                    self.rebuild_indexes()
+                    self.save(my_file_name)
+                if shared and self.journal_file != my_file_name:
+                    # Written as a journal while the other processes wait
+                    self.save(my_file_name)
+            self.file = my_file_name
+            self.shared = shared
+            self.durable_seq = len(self.database)
+            self.saved_count = len(self.database)
+            return my_file_name
+
+    def save(self, file_name: str = "") -> bool:
+        """Save the database
+        Args:
+                file_name (str, optional): The file to save to. Defaults to "".
+        Returns:
+                bool: True if the data was saved, False otherwise
+        """
+        with self.shared_write():
+            my_file_name = file_name if file_name != "" else self.file
+            try:
+                end = self.get_saved_end()
+                if self.journal:
+                    self.save_journal(my_file_name)
+                else:
+                    # Written apart and then renamed, a failed save keeps the
+                    # previous file whole
+                    with open(my_file_name + ".tmp", "w") as f:
+                        rows = self.iter_saved(0, end)
+                        json.dump(list(rows), f, indent=2)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(my_file_name + ".tmp", my_file_name)
+                    if self.journal_file == my_file_name:
+                        self.journal_file = ""
+                if my_file_name == self.file:
+                    self.saved_count = end
+                return True
+            except Exception:
+                if path.exists(my_file_name + ".tmp"):
+                    os.remove(my_file_name + ".tmp")
+                return False
+
+    def save_journal(self, file_name: str) -> None:
+        """Append to the journal the revisions it does not hold yet
+        Args:
+                file_name (str): The journal file
+        """
+        append = file_name == self.journal_file and path.exists(file_name)
+        first = self.journal_count if append else 0
+        end = self.get_saved_end()
+        lines = [encode_row(row) for row in self.iter_saved(first, end)]
+        # Written before the first revision of every batch
+        markers = {
+            start: encode_row({"batch": stop - start})
+            for start, stop in self.batches
+            if start >= first and stop <= end
+        }
+        self.batches = [batch for batch in self.batches if batch[1] > end]
+        if not append and file_name == self.payload_file:
+            # Everything was read above, the file can be overwritten
+            self.close_payloads()
+        with open(file_name, "r+b" if append else "wb") as f:
+            if append:
+                # Drop anything after the last complete revision (interrupted save)
+                f.seek(self.journal_size)
+                f.truncate()
+            start = f.tell()
+            f.write(
+                b"".join(
+                    markers.get(pos, b"") + line
+                    for pos, line in zip(range(first, end), lines)
+                )
+            )
+            self.journal_size = f.tell()
+        self.journal_file = file_name
+        self.journal_count = end
 
-            key = (row["id"], row["table"])
-            if key not in latest_records or row["rev"] > latest_records[key]["rev"]:
-                latest_records[key] = row
+        offsets_file = get_offsets_file(file_name)
+        if not self.lazy:
+            if not append and path.exists(offsets_file):
+                os.remove(offsets_file)
+            return
+        # The saved revisions are read from the file from now on
+        if self.payload_file != file_name:
+            self.close_payloads()
+            self.payload_file = file_name
+            self.payload_offsets = array("q", [-1]) * len(self.database)
+        records = []
+        database = self.database
+        for pos, line in zip(range(first, end), lines):
+            start += len(markers.get(pos, b""))
+            records.append(
+                encode_offset(
+                    database.ids[pos],
+                    database.revs[pos],
+                    database.get_table(pos),
+                    start,
+                    database.get_time(pos),
+                )
+            )
+            self.make_lazy(pos, start)
+            start += len(line)
+        with open(offsets_file, "ab" if append else "wb") as f:
+            f.write((b"" if append else OFFSETS_HEADER) + b"".join(records))
 
-        # Search through latest records
-        for record in latest_records.values():
+    def flush(self) -> int:
+        """Save the revisions committed so far and fsync the file. The fsync runs
+        outside the write lock, writers are only blocked while saving.
+        Returns:
+                int: The revisions saved
+        """
+        with self.write_lock():
+            seq = self.seq
+            file_name = self.file
+            if not self.save():
+                raise IOError("Cannot save the database")
+        with open(file_name, "rb") as f:
+            os.fsync(f.fileno())
+        return seq
+
+    def sync(self) -> None:
+        """Wait until the revisions committed so far are saved and fsynced. Writers
+        calling it at the same time share one flush: the first one saves for all
+        of them, the others wait for it.
+        """
+        if self.batch_thread == threading.get_ident():
+            # Synced when the batch ends
+            self.batch_durable = True
+            return
+        target = self.seq
+        with self.flush_condition:
+            while self.durable_seq < target:
+                if self.flushing:
+                    self.flush_condition.wait()
+                    continue
+                self.flushing = True
+                break
+            else:
+                return
+        durable_seq = 0
+        try:
+            durable_seq = self.flush()
+        finally:
+            with self.flush_condition:
+                self.durable_seq = max(self.durable_seq, durable_seq)
+                self.flushing = False
+                self.flush_condition.notify_all()
+
+    def start_flusher(self, interval: int = 50, records: int = 1000) -> None:
+        """Save and fsync the new revisions from a background thread
+        Args:
+                interval (int, optional): Milliseconds between flushes. Defaults to 50.
+                records (int, optional): Flush early when this many revisions are
+                    pending. Defaults to 1000.
+        """
+        self.stop_flusher()
+        self.flush_interval = interval / 1000
+        self.flush_records = max(1, records)
+        self.stop_flushing = False
+        self.flusher = threading.Thread(
+            target=self.run_flusher, name="fiabledb-flusher", daemon=True
+        )
+        self.flusher.start()
+
+    def stop_flusher(self) -> None:
+        """Stop the background flusher, flushing the pending revisions first"""
+        flusher = self.flusher
+        if flusher is None:
+            return
+        with self.flush_condition:
+            self.stop_flushing = True
+            self.flush_condition.notify_all()
+        flusher.join()
+        self.flusher = None
+
+    def run_flusher(self) -> None:
+        """Flush every interval, or earlier when enough revisions are pending"""
+        while True:
+            with self.flush_condition:
+                self.flush_condition.wait_for(
+                    lambda: self.stop_flushing
+                    or self.seq - self.durable_seq >= self.flush_records,
+                    timeout=self.flush_interval,
+                )
+                stopping = self.stop_flushing
+            if self.seq > self.durable_seq:
+                try:
+                    self.sync()
+                except (IOError, OSError):
+                    # Retried on the next interval, durable writers get the error
+                    pass
+            if stopping:
+                return
+
+    def checkpoint(self, file_name: str = "") -> bool:
+        """Write a snapshot of the database and its indexes, then empty the journal
+        so loading only has to replay the revisions saved after it
+        Args:
+                file_name (str, optional): The journal file. Defaults to FILE.
+        Returns:
+                bool: True if the checkpoint was written, False otherwise
+        """
+        with self.write_lock():
+            if not self.journal:
+                raise ValueError("checkpoint needs journal mode")
+            if self.shared:
+                # The other processes would keep reading at their old offsets
+                raise ValueError("checkpoint can not be used in shared mode")
+            if self.batch_start is not None:
+                raise ValueError("checkpoint can not be used in a batch")
+            my_file_name = file_name if file_name != "" else self.file
+            snapshot_file = get_snapshot_file(my_file_name)
+            try:
+                with open(snapshot_file + ".tmp", "wb") as f:
+                    positions, offsets = self.write_snapshot(f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(snapshot_file + ".tmp", snapshot_file)
+                if self.lazy and my_file_name == self.file:
+                    # The data of the journal is read from the snapshot now
+                    self.use_snapshot(Segment(snapshot_file, 0, positions, offsets))
+                elif self.payload_file == my_file_name:
+                    self.close_payloads()
+                # The journal starts again after the revisions of the snapshot. If this
+                # is interrupted, the old journal is replayed skipping those revisions.
+                with open(my_file_name, "wb") as f:
+                    f.write(
+                        json.dumps({"checkpoint": len(self.database)}).encode() + b"\n"
+                    )
+                    self.journal_size = f.tell()
+                if path.exists(get_offsets_file(my_file_name)):
+                    os.remove(get_offsets_file(my_file_name))
+                self.journal_file = my_file_name
+                self.journal_count = len(self.database)
+                if my_file_name == self.file:
+                    self.saved_count = len(self.database)
+                return True
+            except Exception:
+                return False
+
+    def write_snapshot(self, f) -> Tuple[array, array]:
+        """Write the revisions and the indexes to a snapshot file. It only holds
+        data: the revisions as journal lines, their columns and the records of
+        every table as arrays, and a JSON header describing them at the end.
+        Args:
+                f (file): The snapshot file opened in binary mode
+        Returns:
+                tuple: The positions of the revisions written whole and their
+                    offsets in the file
+        """
+        database = self.database
+        count = len(database)
+        f.write(SNAPSHOT_HEADER)
+        # Deltas stay deltas. The revisions whose data is not in memory are
+        # written whole, the snapshot does not depend on the segments.
+        offsets = array("q")
+        kinds = array("b")
+        whole = array("q")
+        for pos in range(count):
+            row = database[pos]
+            if "data" not in row and "set" not in row:
+                row = self.get_row(pos)
+            offsets.append(f.tell())
+            kinds.append(1 if "set" in row else 0)
+            if "set" not in row:
+                whole.append(pos)
+            f.write(encode_row(row))
+        # The rebuilt data of the records whose head is a delta
+        head_positions = array("q")
+        for pos, row in self.head_rows.values():
+            head_positions.append(pos)
+            f.write(encode_row(row))
+        lines_end = f.tell()
+        heads = []
+        record_ids = array("q")
+        record_counts = array("q")
+        record_positions = array("q")
+        for table, table_heads in self.heads.items():
+            heads.append([table, len(table_heads)])
+            for id, positions in table_heads.items():
+                record_ids.append(id)
+                record_counts.append(len(positions))
+                record_positions.extend(positions)
+        columns = {
+            "ids": database.ids,
+            "revs": database.revs,
+            "table_codes": database.table_codes,
+            "offsets": offsets,
+            "kinds": kinds,
+            "head_positions": head_positions,
+            "record_ids": record_ids,
+            "record_counts": record_counts,
+            "record_positions": record_positions,
+        }
+        if database.times is not None:
+            columns["times"] = database.times
+        arrays = {}
+        for name, values in columns.items():
+            arrays[name] = [values.typecode, f.tell(), len(values) * values.itemsize]
+            f.write(values.tobytes())
+        header = {
+            "count": count,
+            "lines_end": lines_end,
+            "byteorder": sys.byteorder,
+            "arrays": arrays,
+            "tables": database.tables,
+            "heads": heads,
+            "last_ids": self.last_ids,
+            "unsorted_tables": sorted(self.unsorted_tables),
+        }
+        header_offset = f.tell()
+        f.write(json.dumps(header, separators=(",", ":")).encode() + b"\n")
+        f.write(header_offset.to_bytes(8, "little"))
+        return whole, array("q", (offsets[pos] for pos in whole))
+
+    def read_snapshot(self, file_name: str, lazy: bool = False) -> int:
+        """Restore the database and its indexes from the snapshot of a journal
+        Args:
+                file_name (str): The journal file
+                lazy (bool, optional): Leave the data of the revisions stored whole
+                    in the snapshot, it is read from there. Defaults to False.
+        Returns:
+                int: The revisions restored, 0 if there is no snapshot
+        """
+        snapshot_file = get_snapshot_file(file_name)
+        if not path.exists(snapshot_file):
+            return 0
+        database = Revisions()
+        with open(snapshot_file, "rb") as f:
+            if f.read(len(SNAPSHOT_HEADER)) != SNAPSHOT_HEADER:
+                # Older snapshots were pickles, they are never loaded
+                raise ValueError("Unknown snapshot format")
+            f.seek(-8, os.SEEK_END)
+            f.seek(int.from_bytes(f.read(8), "little"))
+            header = json.loads(f.readline())
+            arrays = {}
+            for name, (typecode, offset, size) in header["arrays"].items():
+                f.seek(offset)
+                values = array(typecode)
+                values.frombytes(f.read(size))
+                if header["byteorder"] != sys.byteorder:
+                    values.byteswap()
+                arrays[name] = values
+            count = header["count"]
+            offsets = arrays["offsets"]
+            kinds = arrays["kinds"]
+            if any(
+                len(arrays[name]) != count
+                for name in ("ids", "revs", "table_codes", "offsets", "kinds")
+            ):
+                raise ValueError("Snapshot incomplete")
+            lines_start = len(SNAPSHOT_HEADER)
+            if lazy:
+                # Only the deltas and the heads are decoded
+                snapshot_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                payloads = [None] * count
+                for pos in range(count):
+                    if kinds[pos]:
+                        line = snapshot_map[
+                            offsets[pos] : snapshot_map.find(b"\n", offsets[pos])
+                        ]
+                        payloads[pos] = database.get_payload(json.loads(line))
+                if count:
+                    lines_start = snapshot_map.find(b"\n", offsets[-1]) + 1
+                lines = snapshot_map[lines_start : header["lines_end"]]
+            else:
+                f.seek(lines_start)
+                lines = f.read(header["lines_end"] - lines_start)
+            rows = [row for row, _ in iter_journal_lines(io.BytesIO(lines))]
+        if not lazy:
+            payloads = [database.get_payload(row) for row in rows[:count]]
+            rows = rows[count:]
+        head_positions = arrays["head_positions"]
+        if len(rows) != len(head_positions):
+            raise ValueError("Snapshot incomplete")
+        database.ids = arrays["ids"]
+        database.revs = arrays["revs"]
+        database.table_codes = arrays["table_codes"]
+        database.times = arrays.get("times")
+        database.tables = header["tables"]
+        database.codes = {table: code for code, table in enumerate(database.tables)}
+        database.payloads = payloads
+        self.database = database
+        # The position lists are shared by revisions_index and heads
+        self.revisions_index = {}
+        self.heads = {}
+        record_ids = arrays["record_ids"]
+        record_counts = arrays["record_counts"]
+        record_positions = arrays["record_positions"]
+        index = 0
+        start = 0
+        for table, records in header["heads"]:
+            table_heads = self.heads[table] = {}
+            end = index + records
+            for id, size in zip(record_ids[index:end], record_counts[index:end]):
+                positions = record_positions[start : start + size].tolist()
+                table_heads[id] = self.revisions_index[(table, id)] = positions
+                start += size
+            index = end
+        if index != len(record_ids) or start != len(record_positions):
+            raise ValueError("Snapshot incomplete")
+        self.last_ids = header["last_ids"]
+        self.unsorted_tables = set(header["unsorted_tables"])
+        self.head_rows = {
+            (database.get_table(pos), database.ids[pos]): (pos, row)
+            for pos, row in zip(head_positions, rows)
+        }
+        if lazy:
+            positions = array("q", (pos for pos in range(count) if not kinds[pos]))
+            segment = Segment(
+                snapshot_file,
+                0,
+                positions,
+                array("q", (offsets[pos] for pos in positions)),
+            )
+            # Mapped now, a later checkpoint replaces the file
+            segment.map = snapshot_map
+            self.segments.insert(0, segment)
+        self.rebuild_data_indexes()
+        return count
+
+    def load(self, file_name: Union[str, None] = None) -> bool:
+        """Load the database
+        Args:
+                file_name (str, optional): The file to load from. Defaults to "".
+        Returns:
+                Bool - The data loaded
+        """
+        with self.write_lock(reload=True):
+            my_file_name = file_name if file_name else self.file
+            is_exists = path.exists(my_file_name)
+            if is_exists:
+                previous = (
+                    self.database,
+                    self.payload_file,
+                    self.payload_map,
+                    self.payload_offsets,
+                    self.segments,
+                )
+                # Index every revision as it is parsed, in a single pass
+                self.database = Revisions()
+                self.payload_file = ""
+                self.payload_map = None
+                self.payload_offsets = array("q")
+                # Opened once the revisions are loaded
+                self.segments = []
+                batches = self.batches
+                self.batches = []
+                self.rebuild_indexes()
+                # Loading only creates objects, there are no cycles to collect
+                gc_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    with open(my_file_name, "rb") as f:
+                        journal = is_journal(f)
+                        if journal and self.lazy:
+                            self.journal_size = self.load_lazy(my_file_name, f)
+                            self.journal_file = my_file_name
+                            self.journal_count = len(self.database)
+                        elif journal:
+                            size = 0
+                            restored = self.read_snapshot(my_file_name)
+                            # Journal position of the next revision
+                            seq = 0
+                            for row, size in iter_journal(f):
+                                if "checkpoint" in row:
+                                    # Revisions before it are in the snapshot
+                                    seq = row["checkpoint"]
+                                    if seq > restored:
+                                        raise ValueError("Snapshot missing or outdated")
+                                    continue
+                                seq += 1
+                                if seq > restored:
+                                    self.append_row(row, stamp=row.pop("time", None))
+                            self.journal_file = my_file_name
+                            self.journal_count = len(self.database)
+                            self.journal_size = size
+                        else:
+                            for row in iter_json_array(f):
+                                self.append_row(row, stamp=row.pop("time", None))
+                            if self.journal_file == my_file_name:
+                                self.journal_file = ""
+                    self.open_segments(my_file_name)
+                except (
+                    json.JSONDecodeError,
+                    UnicodeDecodeError,
+                    IOError,
+                    EOFError,
+                    KeyError,
+                    TypeError,
+                    ValueError,
+                    OverflowError,
+                ):
+                    if self.payload_map is not None:
+                        self.payload_map.close()
+                    (
+                        self.database,
+                        self.payload_file,
+                        self.payload_map,
+                        self.payload_offsets,
+                        self.segments,
+                    ) = previous
+                    self.batches = batches
+                    self.rebuild_indexes()
+                    raise FileNotFoundError("File corrupted or cannot be read")
+                finally:
+                    if gc_enabled:
+                        gc.enable()
+                if previous[2] is not None:
+                    previous[2].close()
+                self.close_segments(previous[4])
+                self.durable_seq = len(self.database)
+                self.saved_count = len(self.database)
+            else:
+                raise FileNotFoundError("File not found")
+            return is_exists
+
+    def get_saved_end(self) -> int:
+        """Get the position after the last revision to save, the revisions of an
+        open batch are not saved
+        """
+        return len(self.database) if self.batch_start is None else self.batch_start
+
+    def iter_saved(self, first: int = 0, end: Optional[int] = None):
+        """Iterate the revisions to save between two positions, with their
+        timestamp in the key "time" when it is known
+        Args:
+                first (int, optional): The first position. Defaults to 0.
+                end (int, optional): The position after the last one. Defaults to
+                    None, the end of the database.
+        Returns:
+                Iterator[dict]: The revisions
+        """
+        database = self.database
+        for pos, row in enumerate(self.iter_rows(first, end), first):
+            stamp = database.get_time(pos)
+            yield {**row, "time": stamp} if stamp else row
+
+    def get_stamp(self) -> Optional[float]:
+        """Get the timestamp of a new revision, None without timestamps. A
+        database with timestamped revisions keeps stamping them, the time of a
+        revision without one would be the time of the revision before it.
+        """
+        if self.timestamps or self.database.times is not None:
+            return time.time()
+        return None
+
+    def get_seq(self, as_of: Type_As_Of) -> int:
+        """Get how many revisions had been written at a point of the history
+        Args:
+                as_of (int|float|datetime): A sequence number, the revisions written
+                    so far are returned by len(database). Or a time, as a datetime
+                    or a float timestamp, which needs timestamps.
+        Returns:
+                int: The revisions written, revisions at positions below it
+        """
+        if isinstance(as_of, bool) or not isinstance(as_of, (int, float, datetime)):
+            raise TypeError("as_of must be an integer, a float or a datetime")
+        if isinstance(as_of, int):
+            if as_of < 0:
+                raise ValueError("as_of must not be negative")
+            return as_of
+        times = self.database.times
+        if times is None:
+            raise ValueError("as_of a time needs revisions with timestamps")
+        if isinstance(as_of, datetime):
+            as_of = as_of.timestamp()
+        return bisect_right(times, as_of)
+
+    def get_cache_generation(self, table: str) -> Tuple[int, int]:
+        """Get what a cached result of a table depends on: the reloads and the
+        revisions written to the table, or to any table when it is ""
+        """
+        if table:
+            return (self.generation, self.table_generations.get(table, 0))
+        return (self.generation, self.write_generation)
+
+    def cached(self, key: tuple, table: str, function):
+        """Run a search, or return its result if it is in the query cache and
+        nothing was written to its table since it was found
+        Args:
+                key (tuple): Identifies the search, with its table and options
+                table (str): The table searched, "" for every table
+                function (callable): The search
+        Returns:
+                Any: What function returns
+        """
+        if not self.cache_size:
+            return function()
+        if self.shared:
+            self.refresh()
+        generation = self.get_cache_generation(table)
+        # Revisions being written, or staged by a batch, are not committed yet
+        committed = self.seq == len(self.database)
+        with self.cache_lock:
+            entry = self.query_cache.get(key)
+            if committed and entry is not None and entry[0] == generation:
+                self.query_cache.move_to_end(key)
+                self.cache_hits += 1
+                return entry[1]
+            self.cache_misses += 1
+        result = function()
+        if committed and self.get_cache_generation(table) == generation:
+            with self.cache_lock:
+                self.query_cache[key] = (generation, result)
+                self.query_cache.move_to_end(key)
+                while len(self.query_cache) > self.cache_size:
+                    self.query_cache.popitem(last=False)
+                    self.cache_evictions += 1
+        return result
+
+    def cache_info(self) -> dict:
+        """Get the counters of the query cache
+        Returns:
+                dict: The hits, misses, evictions, size and max_size
+        """
+        with self.cache_lock:
+            return {
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "evictions": self.cache_evictions,
+                "size": len(self.query_cache),
+                "max_size": self.cache_size,
+            }
+
+    def clear_cache(self) -> None:
+        """Empty the query cache and reset its counters"""
+        with self.cache_lock:
+            self.query_cache.clear()
+            self.cache_hits = self.cache_misses = self.cache_evictions = 0
+
+    def copy_input(self, data: dict) -> dict:
+        """Copy the data of a write, unless the database trusts its callers
+        Args:
+                data (dict): The data passed to add() or update()
+        Returns:
+                dict: The data to store
+        """
+        return data if self.trusted else deepcopy(data)
+
+    def output(self, found):
+        """Prepare the revisions returned to the caller, read-only views when
+        read_only is set
+        Args:
+                found (dict|list[dict]|None): The revisions
+        Returns:
+                dict|list[dict]|None: The revisions to return
+        """
+        if not self.read_only:
+            return found
+        if isinstance(found, list):
+            return [freeze_row(row) for row in found]
+        return freeze_row(found)
+
+    def get_database(self) -> Type_Data_List:
+        """Get the data
+        Returns:
+                list[dict]: The data
+        """
+        return self.output(self.read(self.get_revisions))
+
+    def get_revisions(self, seq: Optional[int] = None) -> Type_Data_List:
+        """Get every revision before seq
+        Args:
+                seq (int, optional): The revisions to get. Defaults to None, all.
+        Returns:
+                list[dict]: The revisions
+        """
+        return list(self.iter_rows(0, seq))
+
+    def get_pos_by_id(
+        self, id: int, table: str = "default", seq: Optional[int] = None
+    ) -> Optional[int]:
+        """Get the position of the latest revision by id and table
+        Args:
+                id (int): The id of the data
+                table (str, optional): The table to search in. Defaults to "default".
+                seq (int, optional): Only see the revisions before seq. Defaults to None.
+        Returns:
+                int: The position of the data
+        """
+        positions = self.get_revision_positions(id, table)
+        count = count_visible(positions, seq)
+        return positions[count - 1] if count else None
+
+    def add(
+        self, new_data: Type_Add_Data, table: str = "default", durable: bool = False
+    ) -> Type_Add_Return:
+        """Add data to the database
+        Args:
+                new_data (dict|list): The data to add
+                table (str, optional): The table to add to. Defaults to "default".
+                durable (bool, optional): Wait until the data is saved and fsynced.
+                    Defaults to False.
+        Returns:
+                dict|list[dict]: The data added
+        """
+        with self.shared_write():
+            # Input validation
+            if not isinstance(new_data, (dict, list)):
+                raise TypeError("new_data must be a dict or list")
+
+            if isinstance(new_data, dict):
+                if not new_data:  # Empty dict validation
+                    raise ValueError("Cannot add empty dictionary")
+                new_row = {
+                    "id": self.reserve_ids(1, table),
+                    "rev": 1,
+                    "table": table,
+                    "data": self.copy_input(new_data),
+                }
+                added = self.append_row(new_row, stamp=self.get_stamp())
+            elif isinstance(new_data, list):
+                if not new_data:  # Empty list validation
+                    raise ValueError("Cannot add empty list")
+                for row in new_data:
+                    if not isinstance(row, dict):
+                        raise TypeError("All items in list must be dictionaries")
+                    if not row:  # Empty dict in list
+                        raise ValueError("Cannot add empty dictionary in list")
+                # Reserve all the ids in one step
+                first_id = self.reserve_ids(len(new_data), table)
+                stamp = self.get_stamp()
+                added_rows = []
+                for offset, row in enumerate(new_data):
+                    new_row = {
+                        "id": first_id + offset,
+                        "rev": 1,
+                        "table": table,
+                        "data": self.copy_input(row),
+                    }
+                    added_rows.append(self.append_row(new_row, stamp=stamp))
+                added = added_rows
+        if durable:
+            self.sync()
+        return self.output(added)
+
+    def update(
+        self,
+        id: int,
+        new_data: dict,
+        table: str = "default",
+        force: bool = False,
+        durable: bool = False,
+    ) -> Type_Update_Return:
+        """Update data in the database
+        Args:
+                id (int): The id of the data to update.
+                new_data (dict): The data to update
+                table (str, optional): The table to update. Defaults to "default".
+                force (bool, optional): Force the update. Defaults to False.
+                durable (bool, optional): Wait until the update is saved and fsynced.
+                    Defaults to False.
+        Returns:
+                dict or None: The data updated
+        """
+        with self.shared_write():
+            # Input validation
+            if not isinstance(id, int) or id <= 0:
+                raise ValueError("id must be a positive integer")
+            if not isinstance(new_data, dict):
+                raise TypeError("new_data must be a dictionary")
+
+            # Get the position of the latest revision
+            key = self.get_pos_by_id(id, table)
+            if key is not None:
+                new_row, delta = self.build_update(self.get_row(key), new_data, force)
+                updated = self.append_row(new_row, delta, self.get_stamp())
+            else:
+                return None
+        if durable:
+            self.sync()
+        return self.output(updated)
+
+    def build_update(
+        self, row: TypeData, new_data: dict, force: bool = False
+    ) -> Tuple[TypeData, Optional[dict]]:
+        """Get the next revision of a record
+        Args:
+                row (dict): The latest revision
+                new_data (dict): The data to update, None values delete their keys
+                force (bool, optional): Replace the data. Defaults to False.
+        Returns:
+                tuple: The new revision and its delta, None when forced
+        """
+        my_new_data = self.copy_input(new_data)
+        delta = None
+        if force:
+            new_data_to_row = my_new_data
+        else:
+            # Handle None values to delete keys, the other values are set
+            delta = {
+                "set": {k: v for k, v in my_new_data.items() if v is not None},
+                "unset": [
+                    k for k, v in my_new_data.items() if v is None and k in row["data"]
+                ],
+            }
+            # The values that did not change are shared with the previous
+            # revision, revisions are never modified
+            new_data_to_row = apply_delta(row["data"], delta["set"], delta["unset"])
+        new_row = {
+            "id": row["id"],
+            "rev": row["rev"] + 1,
+            "table": get_table(row),
+            "data": new_data_to_row,
+        }
+        return new_row, delta
+
+    def update_many(
+        self,
+        data_filter: dict,
+        new_data: dict,
+        table: str = "default",
+        force: bool = False,
+        durable: bool = False,
+    ) -> Type_Data_List:
+        """Update every record matching a filter. They are found in one pass and
+        the indexes are updated once for all of them.
+        Args:
+                data_filter (dict): The filter of the records, like data in find_all
+                new_data (dict): The data to update, like in update
+                table (str, optional): The table to update. Defaults to "default".
+                force (bool, optional): Replace the data. Defaults to False.
+                durable (bool, optional): Wait until the updates are saved and
+                    fsynced. Defaults to False.
+        Returns:
+                list[dict]: The data updated
+        """
+        # Input validation
+        if not isinstance(data_filter, dict):
+            raise TypeError("data_filter must be a dictionary")
+        validate_filter(data_filter)
+        if not isinstance(new_data, dict):
+            raise TypeError("new_data must be a dictionary")
+
+        with self.shared_write():
+            # Found before writing, the new revisions could match again
+            found = list(self.iter_matches(data_filter, table))
+            stamp = self.get_stamp()
+            updated = []
+            # table -> the records moved, several tables when table is ""
+            changes = {}
+            for row in found:
+                new_row, delta = self.build_update(row, new_data, force)
+                updated.append(self.append_row(new_row, delta, stamp, False))
+                changes.setdefault(get_table(row), []).append(
+                    (row["id"], row["data"], new_row["data"])
+                )
+            for changed_table, table_changes in changes.items():
+                self.reindex_data(changed_table, table_changes)
+        if durable and updated:
+            self.sync()
+        return self.output(updated)
+
+    def delete_many(
+        self, data_filter: dict, table: str = "default", durable: bool = False
+    ) -> Type_Data_List:
+        """Delete every record matching a filter, see update_many
+        Args:
+                data_filter (dict): The filter of the records, like data in find_all
+                table (str, optional): The table to delete from. Defaults to "default".
+                durable (bool, optional): Wait until the deletions are saved and
+                    fsynced. Defaults to False.
+        Returns:
+                list[dict]: The data deleted
+        """
+        return self.update_many(data_filter, {}, table, force=True, durable=durable)
+
+    def delete(
+        self, id: int, table: str = "default", durable: bool = False
+    ) -> Type_Delete_Return:
+        """Delete data from the database
+        Args:
+                id (int): The id of the data to delete
+                table (str, optional): The table to delete from. Defaults to "default".
+                durable (bool, optional): Wait until the deletion is saved and fsynced.
+                    Defaults to False.
+        Returns:
+                dict: The data deleted
+        """
+        # Input validation
+        if not isinstance(id, int) or id <= 0:
+            raise ValueError("id must be a positive integer")
+
+        return self.update(id=id, new_data={}, table=table, force=True, durable=durable)
+
+    def get_latest_revision(
+        self, id: int, table: str = "default", seq: Optional[int] = None
+    ) -> Optional[TypeData]:
+        """Get the latest revision of a record"""
+        pos = self.get_pos_by_id(id, table, seq)
+        return self.get_row(pos) if pos is not None else None
+
+    def get_revision(
+        self, id: int, rev: int, table: str = "default", seq: Optional[int] = None
+    ) -> Optional[TypeData]:
+        """Get a specific revision of a record"""
+        positions = self.get_revision_positions(id, table)
+        # Only the first count revisions are visible
+        count = count_visible(positions, seq)
+        if not count:
+            return None
+
+        if rev < 0:
+            # Handle negative revision numbers
+            target_rev = self.database.revs[positions[count - 1]] + rev + 1
+            if target_rev <= 0:
+                return None
+        else:
+            target_rev = rev
+
+        index = self.bisect_revision(positions, target_rev, count)
+        if index < count and self.database.revs[positions[index]] == target_rev:
+            return self.get_row(positions[index])
+
+        return None
+
+    def bisect_revision(self, positions: List[int], rev: int, count: int) -> int:
+        """Find where a revision is in the positions of the revisions of a record
+        Args:
+                positions (list[int]): The positions of the revisions, ordered by rev
+                rev (int): The revision
+                count (int): Only search the first count positions
+        Returns:
+                int: The index of the first revision not below rev
+        """
+        # Revisions are usually 1..n, so rev n lives at index n - 1
+        if 0 < rev <= count and self.database.revs[positions[rev - 1]] == rev:
+            return rev - 1
+
+        # Otherwise binary search the revisions, they are ordered by rev
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.database.revs[positions[mid]] < rev:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get_history(
+        self,
+        id: int,
+        table: str = "default",
+        start: int = 1,
+        limit: Optional[int] = None,
+        seq: Optional[int] = None,
+    ) -> Type_Data_List:
+        """Get the revisions of a record from one on. Each delta is applied to the
+        revision before it, they are not rebuilt from their keyframes.
+        Args:
+                id (int): The id of the record
+                table (str, optional): The table of the record. Defaults to "default".
+                start (int, optional): The first revision, negative counts from the
+                    latest one. Defaults to 1.
+                limit (int, optional): The most revisions to get. Defaults to None, all.
+                seq (int, optional): Only see the revisions before seq. Defaults to None.
+        Returns:
+                list[dict]: The revisions, ordered by rev
+        """
+        database = self.database
+        positions = self.get_revision_positions(id, table)
+        count = count_visible(positions, seq)
+        if not count:
+            return []
+        if start < 0:
+            start = database.revs[positions[count - 1]] + start + 1
+        index = self.bisect_revision(positions, start, count)
+        end = count if limit is None else min(count, index + limit)
+        rows = []
+        previous = None
+        for pos in positions[index:end]:
+            payload = database.payloads[pos]
+            rev = database.revs[pos]
+            if type(payload) is tuple and previous and previous["rev"] == rev - 1:
+                row = {
+                    "id": id,
+                    "rev": rev,
+                    "table": database.get_table(pos),
+                    "data": apply_delta(previous["data"], *payload),
+                }
+            else:
+                row = self.get_row(pos)
+            rows.append(row)
+            previous = row
+        return rows
+
+    def history(
+        self,
+        id: int,
+        table: str = "default",
+        start: int = 1,
+        limit: Optional[int] = None,
+    ):
+        """Iterate the revisions of a record, reading them in pages
+        Args:
+                id (int): The id of the record
+                table (str, optional): The table of the record. Defaults to "default".
+                start (int, optional): The first revision, negative counts from the
+                    latest one like rev in find_one. Defaults to 1.
+                limit (int, optional): The most revisions to return. Defaults to
+                    None, all of them.
+        Returns:
+                Iterator[dict]: The revisions, ordered by rev
+        """
+        # Input validation
+        if not isinstance(id, int) or id <= 0:
+            raise ValueError("id must be a positive integer")
+        if not isinstance(start, int):
+            raise TypeError("start must be an integer")
+        if limit is not None and (not isinstance(limit, int) or limit < 0):
+            raise ValueError("limit must be a non negative integer")
+        return self.iter_history(id, table, start, limit)
+
+    def iter_history(self, id: int, table: str, start: int, limit: Optional[int]):
+        """Iterate the revisions of a record, see history"""
+        while limit is None or limit > 0:
+            size = HISTORY_PAGE_SIZE if limit is None else min(limit, HISTORY_PAGE_SIZE)
+            page = self.read(self.get_history, id, table, start, size)
+            yield from self.output(page)
+            if len(page) < size:
+                return
+            start = page[-1]["rev"] + 1
+            if limit is not None:
+                limit -= len(page)
+
+    def diff(
+        self, id: int, rev_a: int, rev_b: int, table: str = "default"
+    ) -> Optional[dict]:
+        """Compare the data of two revisions of a record
+        Args:
+                id (int): The id of the record
+                rev_a (int): The first revision, negative counts from the latest one
+                rev_b (int): The second revision, negative counts from the latest one
+                table (str, optional): The table of the record. Defaults to "default".
+        Returns:
+                dict or None: The keys "added", "removed" and "changed" going from
+                    rev_a to rev_b (see compare_data), None if a revision does not
+                    exist
+        """
+        # Input validation
+        if not isinstance(id, int) or id <= 0:
+            raise ValueError("id must be a positive integer")
+        if not isinstance(rev_a, int) or not isinstance(rev_b, int):
+            raise TypeError("revisions must be integers")
+
+        def compare(seq: int) -> Optional[dict]:
+            old = self.get_revision(id, rev_a, table, seq)
+            new = self.get_revision(id, rev_b, table, seq)
+            if old is None or new is None:
+                return None
+            return compare_data(old["data"], new["data"])
+
+        return self.read(compare)
+
+    def range_candidates(
+        self, field: str, conditions: dict, table: str = "default"
+    ) -> Optional[set]:
+        """Get the ids whose value of field is inside the range operators
+        Args:
+                field (str): The data field, it must have a sorted index
+                conditions (dict): The operators of the field
+                table (str, optional): The table to search in. Defaults to "default".
+        Returns:
+                set or None: The ids found, None if the bounds can not use the index
+        """
+        bounds = {
+            op: value for op, value in conditions.items() if op in RANGE_OPERATORS
+        }
+        groups = {order_class(value) for value in bounds.values()}
+        if None in groups:
+            return None
+        if len(groups) > 1:
+            # Numbers and strings can not be compared, nothing is in both ranges
+            return set()
+        values = self.sorted_indexes[table][field][groups.pop()]
+        while True:
+            # A write moving the values between the bisects would skip some
+            version = self.index_version
+            if version % 2:
+                with self.lock:
+                    pass
+                continue
+            lo, hi = 0, len(values)
+            for op, value in bounds.items():
+                if op == "$gt":
+                    lo = max(lo, bisect_right(values, (value, math.inf)))
+                elif op == "$gte":
+                    lo = max(lo, bisect_left(values, (value,)))
+                elif op == "$lt":
+                    hi = min(hi, bisect_left(values, (value,)))
+                else:
+                    hi = min(hi, bisect_right(values, (value, math.inf)))
+            found = values[lo:hi]
+            if self.index_version == version:
+                return {id for _, id in found}
+
+    def find_candidates(
+        self, data: dict, table: str = "default", seq: Optional[int] = None
+    ) -> Optional[List[int]]:
+        """Get the ids whose latest revision may match data using the indexes
+        Args:
+                data (dict): The data filter
+                table (str, optional): The table to search in. Defaults to "default".
+                seq (int, optional): Only see the revisions before seq. Defaults to None.
+        Returns:
+                list[int] or None: The candidate ids in order, None if no index applies
+        """
+        indexes = self.data_indexes.get(table, {})
+        ordered = self.sorted_indexes.get(table, {})
+        found = []
+        for field, value in data.items():
+            if not is_operator_filter(value):
+                if field in indexes:
+                    found.append(indexes[field].get(index_key(value), set()))
+                continue
+            if "$in" in value and field in indexes:
+                found.append(
+                    set().union(
+                        *(
+                            indexes[field].get(index_key(item), set())
+                            for item in value["$in"]
+                        )
+                    )
+                )
+            if field in ordered and any(op in RANGE_OPERATORS for op in value):
+                ids = self.range_candidates(field, value, table)
+                if ids is not None:
+                    found.append(ids)
+        if not found:
+            return None
+        # Intersect from the smallest set of ids
+        found.sort(key=len)
+        candidates = set(found[0])
+        for ids in found[1:]:
+            if not candidates:
+                break
+            candidates &= ids
+        if seq is not None:
+            # The indexes already follow the revisions written after seq, their
+            # records are checked against the revisions before it
+            database = self.database
+            for pos in range(seq, len(database)):
+                if database.get_table(pos) == table:
+                    candidates.add(database.ids[pos])
+        return sorted(candidates)
+
+    def iter_matches(
+        self,
+        data: dict,
+        table: str = "default",
+        seq: Optional[int] = None,
+        indexed: bool = True,
+        after_id: int = 0,
+    ):
+        """Iterate the latest revisions matching data, ordered by table and id
+        Args:
+                data (dict): The data filter
+                table (str, optional): The table to search in, "" for every table. Defaults to "default".
+                seq (int, optional): Only see the revisions before seq. Defaults to None.
+                indexed (bool, optional): Use the data indexes, they hold the
+                    latest revisions so they only help when seq is recent.
+                    Defaults to True.
+                after_id (int, optional): Only the records with a greater id.
+                    Defaults to 0.
+        Returns:
+                Iterator[dict]: The latest revisions found
+        """
+        use_indexes = indexed and table
+        candidates = self.find_candidates(data, table, seq) if use_indexes else None
+        if candidates is None:
+            records = self.iter_latest(table, seq, after_id)
+        else:
+            first = bisect_right(candidates, after_id)
+            records = (
+                self.get_latest_revision(id, table, seq) for id in candidates[first:]
+            )
+        for record in records:
+            if record is None:
+                # Added after seq
+                continue
             if match_data_filter(record["data"], data):
-                return record
+                yield record
 
-    return None
+    def find_one(
+        self,
+        id: int = 0,
+        data: dict = {},
+        table: str = "default",
+        rev: int = 0,
+        as_of: Type_As_Of = None,
+    ) -> Type_Find_One_Return:
+        """Find one data in the database
+        Args:
+                id (int, optional): The id of the data to find. Defaults to 0.
+                data (dict, optional): Filter the data to find, values may use the
+                    operators $gt, $gte, $lt, $lte, $in and $ne. Defaults to {}.
+                table (str, optional): The table to find in. Defaults to "default".
+                rev (int, optional): The revision of the data to find. Defaults to 0.
+                as_of (int|float|datetime, optional): Search the database as it
+                    was at a sequence number or a time, see get_seq. Defaults to
+                    None, now.
+        Returns:
+                dict or None: The data found
+        """
+        # Input validation
+        if not isinstance(id, int):
+            raise TypeError("id must be an integer")
+        if not isinstance(data, dict):
+            raise TypeError("data must be a dictionary")
+        validate_filter(data)
+        if as_of is not None:
+            # Raises if as_of is not valid
+            self.get_seq(as_of)
 
+        def search(seq: int) -> Type_Find_One_Return:
+            if as_of is not None:
+                seq = min(seq, self.get_seq(as_of))
+            # If searching by id
+            if id > 0:
+                if rev != 0:
+                    # Find specific revision
+                    return self.get_revision(id, rev, table, seq)
+                else:
+                    # Find latest revision
+                    return self.get_latest_revision(id, table, seq)
 
-def find_all(data: dict = {}, table: str = "default") -> Type_Find_All_Return:
-    """Find all data in the database
-    Args:
-            data (dict, optional): Filter the data to find. Defaults to {}.
-            table (str, optional): The table to find in. Defaults to "default".
-    Returns:
-            list[dict]: The data found
+            # If searching by data filter
+            elif data:
+                # Search through latest records
+                for record in self.iter_matches(data, table, seq, as_of is None):
+                    return record
+
+            return None
+
+        key = ("find_one", table, cache_key(data), cache_key(as_of))
+        if id > 0 or not data or None in key:
+            return self.output(self.read(search))
+        return self.cached(key, table, lambda: self.output(self.read(search)))
+
+    def find_all(
+        self,
+        data: dict = {},
+        table: str = "default",
+        as_of: Type_As_Of = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        after_id: int = 0,
+        sort: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+        cursor: bool = False,
+    ):
+        """Find all data in the database
+        Args:
+                data (dict, optional): Filter the data to find, values may use the
+                    operators $gt, $gte, $lt, $lte, $in and $ne. Defaults to {}.
+                table (str, optional): The table to find in. Defaults to "default".
+                as_of (int|float|datetime, optional): Search the database as it
+                    was at a sequence number or a time, see get_seq. Defaults to
+                    None, now.
+                limit (int, optional): The most records to return. Defaults to
+                    None, all of them.
+                offset (int, optional): Records to skip first. Defaults to 0.
+                after_id (int, optional): Only the records with a greater id, to
+                    read the next page after the last id. Defaults to 0.
+                sort (str, optional): Sort by a data field instead of the id, "-"
+                    before it in descending order. Defaults to None.
+                fields (list[str], optional): Only return these fields of the data.
+                    Defaults to None, all of them.
+                cursor (bool, optional): Return an iterator that finds the records
+                    as they are read, instead of a list. Defaults to False.
+        Returns:
+                list[dict] or Iterator[dict]: The data found
+        """
+        # Input validation
+        validate_find_all(data, limit, offset, after_id, sort, fields)
+        if as_of is not None:
+            # Raises if as_of is not valid
+            self.get_seq(as_of)
+        options = (data, table, as_of, limit, offset, after_id, sort, fields)
+        if cursor:
+            return self.start_cursor(*options)
+
+        def search() -> Type_Data_List:
+            found = self.read(lambda seq: list(self.find_records(*options, seq)))
+            return self.output(found)
+
+        if not self.cache_size:
+            return search()
+        key = (
+            "find_all",
+            table,
+            cache_key(data),
+            cache_key(as_of),
+            limit,
+            offset,
+            after_id,
+            sort,
+            None if fields is None else tuple(fields),
+        )
+        if None in key[2:4]:
+            # Filters that can not be told apart are not cached
+            return search()
+        # A new list, the one cached is not modified by the caller
+        return list(self.cached(key, table, search))
+
+    def find_records(
+        self,
+        data: dict,
+        table: str,
+        as_of: Type_As_Of,
+        limit: Optional[int],
+        offset: int,
+        after_id: int,
+        sort: Optional[str],
+        fields: Optional[Sequence[str]],
+        seq: int,
+    ):
+        """Iterate the records found by find_all, see its arguments
+        Returns:
+                Iterator[dict]: The records found
+        """
+        if as_of is not None:
+            seq = min(seq, self.get_seq(as_of))
+        # Latest revisions are already ordered by table and id
+        if not data:
+            records = self.iter_latest(table, seq, after_id)
+        else:
+            records = self.iter_matches(data, table, seq, as_of is None, after_id)
+        end = None if limit is None else offset + limit
+        if sort is not None:
+            # Every record is read, only the first end are kept
+            records = sort_records(records, sort, end)
+        records = islice(records, offset, end)
+        if fields is not None:
+            records = (project_row(row, fields) for row in records)
+        return records
+
+    def start_cursor(self, *options):
+        """Start a cursor of find_all. It sees the revisions committed when it is
+        started, not when it is first read, and a reload makes it fail.
+        Returns:
+                Iterator[dict]: The records found
+        """
+        if self.shared:
+            self.refresh()
+        while self.reloading:
+            # Wait for the reload to finish
+            with self.lock:
+                pass
+        return self.iter_cursor(options, self.seq, self.generation)
+
+    def iter_cursor(self, options: tuple, seq: int, generation: int):
+        """Iterate the records found by find_all as they are read
+        Args:
+                options (tuple): The arguments of find_records
+                seq (int): Only see the revisions before seq
+                generation (int): The generation when the cursor started
+        Returns:
+                Iterator[dict]: The records found
+        """
+        records = self.find_records(*options, seq)
+        while True:
+            try:
+                record = next(records)
+            except StopIteration:
+                return
+            except Exception:
+                if self.generation == generation:
+                    raise
+                record = None
+            if self.generation != generation:
+                raise RuntimeError("The database was reloaded while reading a cursor")
+            yield self.output(record)
+
+
+class AsyncFiableDB:
+    """Asyncio interface of a FiableDB. File I/O and scans run in the default
+    executor, so the event loop is never blocked by them.
     """
-    global database
 
-    # Input validation
-    if not isinstance(data, dict):
-        raise TypeError("data must be a dictionary")
+    def __init__(self, db: Optional[FiableDB] = None, file_name: str = FILE) -> None:
+        """Wrap a database
+        Args:
+                db (FiableDB, optional): The database. Defaults to a new one using
+                    file_name.
+                file_name (str, optional): The file of the new database. Defaults to FILE.
+        """
+        self.db = db if db is not None else FiableDB(file_name)
+        # name -> (seq when it started, task) of the save or sync running
+        self.runs = {}
 
-    # Get all latest revisions for each id in the specified table
-    latest_records = {}
-    search_table = table if table else ""
+    async def run_in_thread(self, function, *args, **kwargs):
+        """Run a function in the default executor and wait for it"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(function, *args, **kwargs))
 
-    for row in database:
-        if search_table and row["table"] != search_table:
-            continue
+    async def run_shared(self, name: str, function):
+        """Run function in a thread, sharing the run with the coroutines waiting
+        for it. A run started after the writes of a caller covers them, so the
+        caller joins it. Otherwise it waits for the run and starts another one.
+        Args:
+                name (str): Identifies the runs that can be shared
+                function (callable): Saves what was committed when it starts
+        Returns:
+                Any: What function returns
+        """
+        target = self.db.seq
+        while True:
+            run = self.runs.get(name)
+            if run is None or run[1].done():
+                task = asyncio.ensure_future(self.run_in_thread(function))
+                self.runs[name] = (self.db.seq, task)
+                return await asyncio.shield(task)
+            if run[0] >= target:
+                return await asyncio.shield(run[1])
+            # Started before the writes of this caller
+            try:
+                await asyncio.shield(run[1])
+            except Exception:
+                pass
+
+    async def run_write(self, function, *args, **kwargs):
+        """Run a write in the loop when the write lock is free, in a thread
+        when it is held by a save or another thread, or in shared mode, where
+        it waits for the other processes
+        """
+        if not self.db.shared and self.db.lock.acquire(blocking=False):
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.db.lock.release()
+        return await self.run_in_thread(function, *args, **kwargs)
+
+    async def start(
+        self,
+        file_name: str = "",
+        journal: Optional[bool] = None,
+        lazy: bool = False,
+        shared: bool = False,
+    ) -> str:
+        """Start the database, see FiableDB.start"""
+        return await self.run_in_thread(self.db.start, file_name, journal, lazy, shared)
+
+    async def load(self, file_name: Union[str, None] = None) -> bool:
+        """Load the database, see FiableDB.load"""
+        return await self.run_in_thread(self.db.load, file_name)
+
+    async def save(self, file_name: str = "") -> bool:
+        """Save the database, see FiableDB.save. Concurrent saves to the
+        database file are shared.
+        """
+        if file_name:
+            return await self.run_in_thread(self.db.save, file_name)
+        return await self.run_shared("save", self.db.save)
+
+    async def sync(self) -> None:
+        """Wait until the revisions committed so far are saved and fsynced,
+        see FiableDB.sync
+        """
+        await self.run_shared("sync", self.db.sync)
+
+    async def checkpoint(self, file_name: str = "") -> bool:
+        """Write a snapshot of the database, see FiableDB.checkpoint"""
+        return await self.run_in_thread(self.db.checkpoint, file_name)
+
+    async def archive(self, as_of: Type_As_Of = None) -> int:
+        """Archive the old revisions to a segment file, see FiableDB.archive"""
+        return await self.run_in_thread(self.db.archive, as_of)
+
+    async def add(
+        self, new_data: Type_Add_Data, table: str = "default", durable: bool = False
+    ) -> Type_Add_Return:
+        """Add data to the database, see FiableDB.add"""
+        added = await self.run_write(self.db.add, new_data, table)
+        if durable:
+            await self.sync()
+        return added
+
+    async def update(
+        self,
+        id: int,
+        new_data: dict,
+        table: str = "default",
+        force: bool = False,
+        durable: bool = False,
+    ) -> Type_Update_Return:
+        """Update data in the database, see FiableDB.update"""
+        updated = await self.run_write(self.db.update, id, new_data, table, force)
+        if durable and updated is not None:
+            await self.sync()
+        return updated
+
+    async def delete(
+        self, id: int, table: str = "default", durable: bool = False
+    ) -> Type_Delete_Return:
+        """Delete data from the database, see FiableDB.delete"""
+        deleted = await self.run_write(self.db.delete, id, table)
+        if durable and deleted is not None:
+            await self.sync()
+        return deleted
+
+    async def update_many(
+        self,
+        data_filter: dict,
+        new_data: dict,
+        table: str = "default",
+        force: bool = False,
+        durable: bool = False,
+    ) -> Type_Data_List:
+        """Update every record matching a filter, see FiableDB.update_many. It
+        runs in a thread, it reads the whole table.
+        """
+        updated = await self.run_in_thread(
+            self.db.update_many, data_filter, new_data, table, force
+        )
+        if durable and updated:
+            await self.sync()
+        return updated
+
+    async def delete_many(
+        self, data_filter: dict, table: str = "default", durable: bool = False
+    ) -> Type_Data_List:
+        """Delete every record matching a filter, see FiableDB.delete_many"""
+        deleted = await self.run_in_thread(self.db.delete_many, data_filter, table)
+        if durable and deleted:
+            await self.sync()
+        return deleted
+
+    async def find_one(
+        self,
+        id: int = 0,
+        data: dict = {},
+        table: str = "default",
+        rev: int = 0,
+        as_of: Type_As_Of = None,
+    ) -> Type_Find_One_Return:
+        """Find one data in the database, see FiableDB.find_one. Searches by id
+        run in the loop, searches by data in a thread.
+        """
+        if data or self.db.reloading or self.db.shared:
+            return await self.run_in_thread(
+                self.db.find_one, id, data, table, rev, as_of
+            )
+        return self.db.find_one(id, data, table, rev, as_of)
+
+    async def find_all(
+        self,
+        data: dict = {},
+        table: str = "default",
+        as_of: Type_As_Of = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        after_id: int = 0,
+        sort: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Type_Find_All_Return:
+        """Find all data in the database, see FiableDB.find_all. The records are
+        returned as a list, use limit and after_id to read them in pages.
+        """
+        return await self.run_in_thread(
+            self.db.find_all, data, table, as_of, limit, offset, after_id, sort, fields
+        )
+
+    async def history(
+        self,
+        id: int,
+        table: str = "default",
+        start: int = 1,
+        limit: Optional[int] = None,
+    ) -> Type_Data_List:
+        """Get the revisions of a record, see FiableDB.history. They are read in a
+        thread and returned as a list, use limit to read them in pages.
+        """
+        return await self.run_in_thread(
+            lambda: list(self.db.history(id, table, start, limit))
+        )
+
+    async def diff(
+        self, id: int, rev_a: int, rev_b: int, table: str = "default"
+    ) -> Optional[dict]:
+        """Compare two revisions of a record, see FiableDB.diff"""
+        if self.db.reloading or self.db.shared:
+            return await self.run_in_thread(self.db.diff, id, rev_a, rev_b, table)
+        return self.db.diff(id, rev_a, rev_b, table)
 
-        key = (row["id"], row["table"])
-        if key not in latest_records or row["rev"] > latest_records[key]["rev"]:
-            latest_records[key] = row
 
-    # Filter records based on data criteria
-    results = []
-    for record in latest_records.values():
-        if not data or match_data_filter(record["data"], data):
-            results.append(record)
+class PartitionedFiableDB:
+    """A database with one journal file per table in a directory. A table is only
+    loaded the first time it is used, and saving only appends to the tables
+    with new revisions. Every table is a FiableDB, with its own revisions, so
+    sequence numbers are counted per table.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        keyframe_interval: int = 100,
+        read_only: bool = False,
+        trusted: bool = False,
+        timestamps: bool = False,
+        lazy: bool = False,
+        cache_size: int = 0,
+    ) -> None:
+        """Create a database, start() finds its tables
+        Args:
+                directory (str): The directory of the table files
+                keyframe_interval (int, optional): See FiableDB. Defaults to 100.
+                read_only (bool, optional): See FiableDB. Defaults to False.
+                trusted (bool, optional): See FiableDB. Defaults to False.
+                timestamps (bool, optional): See FiableDB. Defaults to False.
+                lazy (bool, optional): Load the tables in lazy mode, see
+                    FiableDB.start. Defaults to False.
+                cache_size (int, optional): The query cache of every table, see
+                    FiableDB. Defaults to 0.
+        """
+        self.directory = directory
+        self.options = {
+            "keyframe_interval": keyframe_interval,
+            "read_only": read_only,
+            "trusted": trusted,
+            "timestamps": timestamps,
+            "cache_size": cache_size,
+        }
+        self.lazy = lazy
+        # Guards tables and table_names while a table is loaded
+        self.lock = threading.RLock()
+        # table -> FiableDB of the tables loaded
+        self.tables = {}
+        # Every table, loaded or not
+        self.table_names = set()
+        # Answers the reads of tables that do not exist, it is never started
+        self.empty = FiableDB(os.devnull, **self.options)
+
+    def start(self) -> str:
+        """Start the database, creating its directory. No table is loaded yet.
+        Returns:
+                str: The directory used
+        """
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            self.tables = {}
+            self.table_names = {
+                unquote(name[: -len(TABLE_EXTENSION)])
+                for name in os.listdir(self.directory)
+                if name.endswith(TABLE_EXTENSION)
+            }
+            return self.directory
+
+    def get_table_file(self, table: str) -> str:
+        """Get the journal file of a table"""
+        return path.join(self.directory, quote(table, safe="") + TABLE_EXTENSION)
+
+    def get_tables(self) -> List[str]:
+        """Get the name of every table, sorted"""
+        return sorted(self.table_names)
+
+    def open_table(self, table: str) -> FiableDB:
+        """Get the database of a table, loading it the first time
+        Args:
+                table (str): The table
+        Returns:
+                FiableDB: Its database
+        """
+        db = self.tables.get(table)
+        if db is not None:
+            return db
+        if not isinstance(table, str) or not table:
+            raise ValueError("table must be a non empty string")
+        with self.lock:
+            db = self.tables.get(table)
+            if db is None:
+                db = FiableDB(self.get_table_file(table), **self.options)
+                db.start(journal=True, lazy=self.lazy)
+                self.tables[table] = db
+                self.table_names.add(table)
+            return db
+
+    def read_table(self, table: str) -> FiableDB:
+        """Get the database of a table to read it. A table that does not exist is
+        not created, an empty database is returned instead.
+        Args:
+                table (str): The table
+        Returns:
+                FiableDB: Its database
+        """
+        if table not in self.tables and table not in self.table_names:
+            return self.empty
+        return self.open_table(table)
+
+    def iter_tables(self, table: str):
+        """Iterate the databases of a table to read it, or of every table when it
+        is ""
+        """
+        if table:
+            yield self.read_table(table)
+            return
+        for name in self.get_tables():
+            yield self.open_table(name)
+
+    def is_dirty(self, db: FiableDB) -> bool:
+        """Check if a table has revisions its file does not hold yet"""
+        return db.journal_count < db.get_saved_end()
+
+    def save(self) -> bool:
+        """Append the new revisions of every table that has them
+        Returns:
+                bool: True if they were saved, False otherwise
+        """
+        with self.lock:
+            dirty = [db for db in self.tables.values() if self.is_dirty(db)]
+        return all([db.save() for db in dirty])
+
+    def sync(self) -> None:
+        """Wait until the revisions of every table are saved and fsynced"""
+        with self.lock:
+            dirty = [db for db in self.tables.values() if self.is_dirty(db)]
+        for db in dirty:
+            db.sync()
+
+    def checkpoint(self) -> bool:
+        """Write a snapshot of every table loaded, see FiableDB.checkpoint"""
+        with self.lock:
+            loaded = list(self.tables.values())
+        return all([db.checkpoint() for db in loaded])
+
+    def archive(self, as_of: Type_As_Of = None) -> int:
+        """Archive the old revisions of every table loaded, see FiableDB.archive"""
+        with self.lock:
+            loaded = list(self.tables.values())
+        return sum(db.archive(as_of) for db in loaded)
+
+    def create_index(
+        self, field: str, table: str = "default", ordered: bool = False
+    ) -> bool:
+        """Index a field of a table, see FiableDB.create_index"""
+        return self.open_table(table).create_index(field, table, ordered)
+
+    def drop_index(self, field: str, table: str = "default") -> bool:
+        """Drop an index of a table, see FiableDB.drop_index"""
+        return self.open_table(table).drop_index(field, table)
+
+    def add(
+        self, new_data: Type_Add_Data, table: str = "default", durable: bool = False
+    ) -> Type_Add_Return:
+        """Add data to a table, see FiableDB.add"""
+        return self.open_table(table).add(new_data, table, durable)
+
+    def update(
+        self,
+        id: int,
+        new_data: dict,
+        table: str = "default",
+        force: bool = False,
+        durable: bool = False,
+    ) -> Type_Update_Return:
+        """Update data of a table, see FiableDB.update"""
+        return self.open_table(table).update(id, new_data, table, force, durable)
+
+    def delete(
+        self, id: int, table: str = "default", durable: bool = False
+    ) -> Type_Delete_Return:
+        """Delete data of a table, see FiableDB.delete"""
+        return self.open_table(table).delete(id, table, durable)
+
+    def update_many(
+        self,
+        data_filter: dict,
+        new_data: dict,
+        table: str = "default",
+        force: bool = False,
+        durable: bool = False,
+    ) -> Type_Data_List:
+        """Update every record of a table matching a filter, see
+        FiableDB.update_many
+        """
+        return self.open_table(table).update_many(
+            data_filter, new_data, table, force, durable
+        )
+
+    def delete_many(
+        self, data_filter: dict, table: str = "default", durable: bool = False
+    ) -> Type_Data_List:
+        """Delete every record of a table matching a filter, see
+        FiableDB.delete_many
+        """
+        return self.open_table(table).delete_many(data_filter, table, durable)
+
+    def get_latest_revision(
+        self, id: int, table: str = "default"
+    ) -> Optional[TypeData]:
+        """Get the latest revision of a record, see FiableDB.get_latest_revision"""
+        return self.read_table(table).get_latest_revision(id, table)
+
+    def get_revision(
+        self, id: int, rev: int, table: str = "default"
+    ) -> Optional[TypeData]:
+        """Get a revision of a record, see FiableDB.get_revision"""
+        return self.read_table(table).get_revision(id, rev, table)
+
+    def history(
+        self,
+        id: int,
+        table: str = "default",
+        start: int = 1,
+        limit: Optional[int] = None,
+    ):
+        """Iterate the revisions of a record, see FiableDB.history"""
+        return self.read_table(table).history(id, table, start, limit)
+
+    def diff(
+        self, id: int, rev_a: int, rev_b: int, table: str = "default"
+    ) -> Optional[dict]:
+        """Compare two revisions of a record, see FiableDB.diff"""
+        return self.read_table(table).diff(id, rev_a, rev_b, table)
+
+    def find_one(
+        self,
+        id: int = 0,
+        data: dict = {},
+        table: str = "default",
+        rev: int = 0,
+        as_of: Type_As_Of = None,
+    ) -> Type_Find_One_Return:
+        """Find one data, see FiableDB.find_one. With table "" the tables are
+        searched in order, loading them.
+        """
+        for db in self.iter_tables(table):
+            found = db.find_one(id, data, table, rev, as_of)
+            if found is not None:
+                return found
+        return None
+
+    def find_all(
+        self,
+        data: dict = {},
+        table: str = "default",
+        as_of: Type_As_Of = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        after_id: int = 0,
+        sort: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+        cursor: bool = False,
+    ):
+        """Find all data, see FiableDB.find_all. With table "" every table is
+        loaded, and the records are ordered by table and id.
+        """
+        if table:
+            return self.read_table(table).find_all(
+                data, table, as_of, limit, offset, after_id, sort, fields, cursor
+            )
+        validate_find_all(data, limit, offset, after_id, sort, fields)
+        # Every table is read from the start, as one cursor
+        cursors = [
+            db.find_all(data, "", as_of, None, 0, after_id, None, None, True)
+            for db in self.iter_tables("")
+        ]
+        records = (record for found in cursors for record in found)
+        end = None if limit is None else offset + limit
+        if sort is not None:
+            records = sort_records(records, sort, end)
+        records = islice(records, offset, end)
+        # After sorting, the field sorted by may not be returned
+        if fields is not None:
+            records = (project_row(row, fields) for row in records)
+        return records if cursor else list(records)
+
+
+# The database used by the module functions
+default_db = FiableDB()
+
+
+def start(
+    file_name: str = "",
+    journal: Optional[bool] = None,
+    lazy: bool = False,
+    shared: bool = False,
+) -> str:
+    """Start the default database, see FiableDB.start"""
+    return default_db.start(file_name, journal, lazy, shared)
+
+
+def refresh() -> int:
+    """Read what other processes appended to the default database, see
+    FiableDB.refresh
+    """
+    return default_db.refresh()
+
+
+def save(file_name: str = "") -> bool:
+    """Save the default database, see FiableDB.save"""
+    return default_db.save(file_name)
+
+
+def checkpoint(file_name: str = "") -> bool:
+    """Write a snapshot of the default database, see FiableDB.checkpoint"""
+    return default_db.checkpoint(file_name)
+
+
+def cache_info() -> dict:
+    """Get the counters of the query cache of the default database, see
+    FiableDB.cache_info
+    """
+    return default_db.cache_info()
+
+
+def archive(as_of: Type_As_Of = None) -> int:
+    """Archive the old revisions of the default database, see FiableDB.archive"""
+    return default_db.archive(as_of)
+
+
+def load(file_name: Union[str, None] = None) -> bool:
+    """Load the default database, see FiableDB.load"""
+    return default_db.load(file_name)
+
+
+def get_database() -> Type_Data_List:
+    """Get the data of the default database, see FiableDB.get_database"""
+    return default_db.get_database()
+
+
+def get_pos_by_id(id: int, table: str = "default") -> Optional[int]:
+    """Get the position of the latest revision by id, see FiableDB.get_pos_by_id"""
+    return default_db.get_pos_by_id(id, table)
+
+
+def get_next_id(table: str = "default") -> int:
+    """Get the next id of a table, see FiableDB.get_next_id"""
+    return default_db.get_next_id(table)
+
+
+def reserve_ids(count: int, table: str = "default") -> int:
+    """Reserve consecutive ids in a table, see FiableDB.reserve_ids"""
+    return default_db.reserve_ids(count, table)
+
+
+def create_index(field: str, table: str = "default", ordered: bool = False) -> bool:
+    """Index a field of a table, see FiableDB.create_index"""
+    return default_db.create_index(field, table, ordered)
+
+
+def drop_index(field: str, table: str = "default") -> bool:
+    """Drop the index of a field of a table, see FiableDB.drop_index"""
+    return default_db.drop_index(field, table)
+
+
+def sync() -> None:
+    """Wait until the default database is saved and fsynced, see FiableDB.sync"""
+    default_db.sync()
+
+
+def start_flusher(interval: int = 50, records: int = 1000) -> None:
+    """Flush the default database in the background, see FiableDB.start_flusher"""
+    default_db.start_flusher(interval, records)
+
+
+def stop_flusher() -> None:
+    """Stop the flusher of the default database, see FiableDB.stop_flusher"""
+    default_db.stop_flusher()
+
+
+def add(
+    new_data: Type_Add_Data, table: str = "default", durable: bool = False
+) -> Type_Add_Return:
+    """Add data to the default database, see FiableDB.add"""
+    return default_db.add(new_data, table, durable)
+
+
+def update(
+    id: int,
+    new_data: dict,
+    table: str = "default",
+    force: bool = False,
+    durable: bool = False,
+) -> Type_Update_Return:
+    """Update data in the default database, see FiableDB.update"""
+    return default_db.update(id, new_data, table, force, durable)
+
+
+def delete(
+    id: int, table: str = "default", durable: bool = False
+) -> Type_Delete_Return:
+    """Delete data from the default database, see FiableDB.delete"""
+    return default_db.delete(id, table, durable)
+
+
+def batch(durable: bool = False):
+    """Group writes to the default database, see FiableDB.batch"""
+    return default_db.batch(durable)
+
+
+def update_many(
+    data_filter: dict,
+    new_data: dict,
+    table: str = "default",
+    force: bool = False,
+    durable: bool = False,
+) -> Type_Data_List:
+    """Update every record of the default database matching a filter, see
+    FiableDB.update_many
+    """
+    return default_db.update_many(data_filter, new_data, table, force, durable)
+
+
+def delete_many(
+    data_filter: dict, table: str = "default", durable: bool = False
+) -> Type_Data_List:
+    """Delete every record of the default database matching a filter, see
+    FiableDB.delete_many
+    """
+    return default_db.delete_many(data_filter, table, durable)
+
+
+def get_latest_revision(id: int, table: str = "default") -> Optional[TypeData]:
+    """Get the latest revision of a record, see FiableDB.get_latest_revision"""
+    return default_db.get_latest_revision(id, table)
+
+
+def get_revision(id: int, rev: int, table: str = "default") -> Optional[TypeData]:
+    """Get a revision of a record, see FiableDB.get_revision"""
+    return default_db.get_revision(id, rev, table)
+
+
+def find_candidates(data: dict, table: str = "default") -> Optional[List[int]]:
+    """Get the ids that can match a filter, see FiableDB.find_candidates"""
+    return default_db.find_candidates(data, table)
+
+
+def find_one(
+    id: int = 0,
+    data: dict = {},
+    table: str = "default",
+    rev: int = 0,
+    as_of: Type_As_Of = None,
+) -> Type_Find_One_Return:
+    """Find one data in the default database, see FiableDB.find_one"""
+    return default_db.find_one(id, data, table, rev, as_of)
+
+
+def find_all(
+    data: dict = {},
+    table: str = "default",
+    as_of: Type_As_Of = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    after_id: int = 0,
+    sort: Optional[str] = None,
+    fields: Optional[Sequence[str]] = None,
+    cursor: bool = False,
+):
+    """Find all data in the default database, see FiableDB.find_all"""
+    return default_db.find_all(
+        data, table, as_of, limit, offset, after_id, sort, fields, cursor
+    )
+
+
+def history(
+    id: int, table: str = "default", start: int = 1, limit: Optional[int] = None
+):
+    """Iterate the revisions of a record of the default database, see
+    FiableDB.history
+    """
+    return default_db.history(id, table, start, limit)
+
 
-    # Sort by id for consistent ordering
-    results.sort(key=lambda x: (x["table"], x["id"]))
-    return results
+def diff(id: int, rev_a: int, rev_b: int, table: str = "default") -> Optional[dict]:
+    """Compare two revisions of a record of the default database, see FiableDB.diff"""
+    return default_db.diff(id, rev_a, rev_b, table)
@@ -0,0 +1,27 @@
+import glob
+import json
+import os
+import shutil
+from fiabledb import start
+
+
+def remove_files(file_name: str) -> None:
+    """Delete a database file, or directory, and the files kept next to it."""
+    if os.path.isdir(file_name):
+        shutil.rmtree(file_name)
+    # Snapshot, offsets, lock...
+    for name in [file_name] + glob.glob(glob.escape(file_name) + ".*"):
+        if os.path.isfile(name):
+            os.remove(name)
+
+
+def reset(file_name: str, **options) -> None:
+    """Start the default database from an empty file."""
+    remove_files(file_name)
+    start(file_name, **options)
+
+
+def read_lines(file_name: str) -> list:
+    """Read the revisions saved in a journal, without the lines framing batches."""
+    with open(file_name) as f:
+        return [row for row in map(json.loads, f) if "batch" not in row]
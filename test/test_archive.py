@@ -0,0 +1,122 @@
+import os
+import pytest
+from fiabledb import FiableDB, get_segment_file, get_segment_index_file
+from .helpers import remove_files
+
+filename = "archive.jsonl"
+
+
+def reset() -> FiableDB:
+    """Start an empty database with some revisions."""
+    remove_files(filename)
+    db = FiableDB(filename, keyframe_interval=3)
+    db.start(journal=True)
+    db.add([{"name": "Noelia", "visits": 0}, {"name": "Juan", "visits": 0}])
+    for visits in range(1, 6):
+        db.update(1, {"visits": visits})
+    db.update(2, {"visits": 1})
+    db.save()
+    return db
+
+
+def test_archive_old_revisions():
+    """The data of the old revisions leaves memory, reads still find it."""
+    db = reset()
+    expected = [row["data"] for row in db.get_database()]
+    assert db.archive(as_of=4) == 4
+    assert db.database.payloads[:4] == [None] * 4
+    # A keyframe, the delta after it is rebuilt from the data in memory
+    assert db.database.payloads[4] == {"name": "Noelia", "visits": 3}
+    assert db.archive() == 2
+    assert db.archive() == 0
+    assert len(db.segments) == 2
+    # Only the latest revisions are kept in memory
+    assert [pos for pos in range(len(db.database)) if not db.is_archived(pos)] == [6, 7]
+    assert [row["data"] for row in db.get_database()] == expected
+    assert db.find_one(id=1, rev=2)["data"] == {"name": "Noelia", "visits": 1}
+    assert db.get_revision(2, 1)["data"] == {"name": "Juan", "visits": 0}
+    assert [row["data"]["visits"] for row in db.history(1)] == [0, 1, 2, 3, 4, 5]
+    db.update(1, {"visits": 6})
+    assert db.find_one(id=1, rev=6)["data"]["visits"] == 5
+    db.update(1, {"visits": 7})
+    # Only the saved revisions are archived
+    assert db.archive() == 1
+    db.save()
+    assert db.archive() == 1
+    with pytest.raises(ValueError):
+        with db.batch():
+            db.archive()
+    remove_files(filename)
+
+
+def test_segments_after_load():
+    """A loaded database uses its segments, the file still has every revision."""
+    db = reset()
+    expected = [row["data"] for row in db.get_database()]
+    db.archive()
+    assert db.save()
+    assert db.checkpoint()
+    db = FiableDB(filename, keyframe_interval=3)
+    db.start()
+    assert len(db.segments) == 1
+    assert db.database.payloads[:6] == [None] * 6
+    assert [row["data"] for row in db.get_database()] == expected
+    db.close_payloads()
+    assert db.database.payloads[0] is None
+    remove_files(filename)
+
+
+def test_segments_of_another_database():
+    """A new database with the same file removes the old segments."""
+    db = reset()
+    db.archive()
+    os.remove(filename)
+    db = FiableDB(filename)
+    db.start(journal=True)
+    assert db.segments == []
+    assert not os.path.exists(get_segment_file(filename, 1))
+    db.add({"name": "Noelia"})
+    db.update(1, {"name": "Juan"})
+    db.save()
+    assert db.archive() == 1
+    assert db.segments[0].file_name == get_segment_file(filename, 1)
+    remove_files(filename)
+
+
+def test_segments_after_restart():
+    """A plain restart keeps the revisions archived, archiving again adds nothing."""
+    for journal in (True, False):
+        remove_files(filename)
+        db = FiableDB(filename, keyframe_interval=3)
+        db.start(journal=journal)
+        db.add([{"name": "Noelia", "visits": 0}, {"name": "Juan", "visits": 0}])
+        for visits in range(1, 6):
+            db.update(1, {"visits": visits})
+        db.save()
+        expected = [row["data"] for row in db.get_database()]
+        assert db.archive() == 5
+        db = FiableDB(filename, keyframe_interval=3)
+        db.start(journal=journal)
+        assert [segment.number for segment in db.segments] == [1]
+        positions = [pos for pos in range(len(db.database)) if not db.is_archived(pos)]
+        assert positions == [1, 6]
+        assert db.archive() == 0
+        assert not os.path.exists(get_segment_file(filename, 2))
+        assert [row["data"] for row in db.get_database()] == expected
+    remove_files(filename)
+
+
+def test_snapshot_without_segments():
+    """The snapshot keeps the archived revisions, a missing segment loses nothing."""
+    db = reset()
+    expected = [row["data"] for row in db.get_database()]
+    db.archive()
+    assert db.checkpoint()
+    segment_file = get_segment_file(filename, 1)
+    os.remove(get_segment_index_file(segment_file))
+    db = FiableDB(filename, keyframe_interval=3)
+    db.start()
+    assert db.segments == []
+    assert [row["data"] for row in db.get_database()] == expected
+    assert os.path.exists(segment_file)
+    remove_files(filename)
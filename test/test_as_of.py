@@ -0,0 +1,112 @@
+import json
+import os
+from datetime import datetime
+import pytest
+import fiabledb
+from fiabledb import FiableDB, get_offsets_file
+
+filename = "as_of.jsonl"
+
+
+def remove_files():
+    """Delete the journal and its offsets file."""
+    for name in (filename, get_offsets_file(filename)):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def fill(db: FiableDB) -> list:
+    """Write some revisions and return db.seq after each one."""
+    seqs = []
+    db.add({"name": "Juan", "age": 41})
+    seqs.append(db.seq)
+    db.add({"name": "Noelia", "age": 34}, table="users")
+    seqs.append(db.seq)
+    db.update(1, {"age": 42})
+    seqs.append(db.seq)
+    db.add({"name": "Sara", "age": 12})
+    seqs.append(db.seq)
+    db.delete(1)
+    seqs.append(db.seq)
+    return seqs
+
+
+def test_as_of_sequence():
+    """Searches see the revisions written before a sequence number."""
+    remove_files()
+    db = FiableDB(filename)
+    db.start(journal=True)
+    db.create_index("age", ordered=True)
+    seqs = fill(db)
+    assert db.find_all(as_of=0) == []
+    assert db.find_one(id=1, as_of=seqs[0])["data"] == {"name": "Juan", "age": 41}
+    assert db.find_one(id=1, as_of=seqs[2])["rev"] == 2
+    assert db.find_one(id=1, rev=-2, as_of=seqs[2])["rev"] == 1
+    assert db.find_one(id=1, rev=3, as_of=seqs[3]) is None
+    assert [row["id"] for row in db.find_all(as_of=seqs[3])] == [1, 2]
+    assert [row["id"] for row in db.find_all(table="users", as_of=seqs[0])] == []
+    # The indexes hold the latest revisions, they are not used
+    assert db.find_one(data={"age": 42}, as_of=seqs[3])["id"] == 1
+    assert db.find_all(data={"age": {"$gt": 40}}, as_of=seqs[1])[0]["rev"] == 1
+    assert db.find_all(data={"age": {"$gt": 40}}) == []
+    assert db.find_all(as_of=10**6) == db.find_all()
+    with pytest.raises(ValueError):
+        db.find_all(as_of=-1)
+    with pytest.raises(ValueError):
+        db.find_all(as_of=datetime.now())
+    with pytest.raises(TypeError):
+        db.find_one(id=1, as_of="yesterday")
+    remove_files()
+
+
+def test_as_of_time(monkeypatch):
+    """With timestamps, searches see the revisions written before a time."""
+    remove_files()
+    clock = iter([100.0, 200.0, 300.0, 250.0, 400.0])
+    monkeypatch.setattr(fiabledb.time, "time", lambda: next(clock))
+    db = FiableDB(filename, timestamps=True)
+    db.start(journal=True)
+    fill(db)
+    # The clock went back, the timestamps do not
+    assert list(db.database.times) == [100.0, 200.0, 300.0, 300.0, 400.0]
+    assert db.find_all(as_of=99.0) == []
+    assert db.find_one(id=1, as_of=250.0)["rev"] == 1
+    assert [row["id"] for row in db.find_all(as_of=300.0)] == [1, 2]
+    assert db.find_one(id=1, as_of=datetime.fromtimestamp(300))["rev"] == 2
+    # The results keep their four keys
+    assert set(db.find_one(id=1)) == {"id", "rev", "table", "data"}
+    remove_files()
+
+
+def test_timestamps_are_saved(monkeypatch):
+    """The timestamps are saved in the files and read back, also in lazy mode."""
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(fiabledb.time, "time", lambda: float(next(clock)))
+    for journal, lazy in ((False, False), (True, False), (True, True)):
+        remove_files()
+        db = FiableDB(filename, timestamps=True)
+        db.start(journal=journal, lazy=lazy)
+        fill(db)
+        db.save()
+        with open(filename) as f:
+            text = f.read()
+        if journal:
+            rows = [json.loads(line) for line in text.splitlines()]
+        else:
+            rows = json.loads(text)
+        assert all("time" in row for row in rows)
+        for _ in range(2):
+            # The second time the offsets file is used in lazy mode
+            db = FiableDB(filename)
+            db.start(journal=journal, lazy=lazy)
+            assert db.database.get_time(0) == rows[0]["time"]
+            as_of = rows[2]["time"]
+            assert db.find_one(id=1, as_of=as_of)["rev"] == 2
+            assert [set(row) for row in db.get_database()] == [
+                {"id", "rev", "table", "data"}
+            ] * 5
+        # Opened without timestamps=True, the new revisions are still stamped
+        db.add({"name": "Sara"})
+        assert db.database.get_time(5) > rows[-1]["time"]
+        assert db.find_all(as_of=rows[-1]["time"]) == db.find_all(as_of=5)
+    remove_files()
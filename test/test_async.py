@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from fiabledb import AsyncFiableDB, FiableDB
+from .helpers import read_lines, remove_files
+
+filename = "async.jsonl"
+
+
+def test_async_api():
+    """The coroutines mirror the database functions."""
+    remove_files(filename)
+
+    async def main():
+        db = AsyncFiableDB(file_name=filename)
+        assert await db.start(journal=True) == filename
+        await db.add([{"name": "Noelia", "age": 34}, {"name": "Juan", "age": 41}])
+        await db.update(2, {"age": 42})
+        await db.delete(1)
+        assert (await db.find_one(id=2))["data"] == {"name": "Juan", "age": 42}
+        assert (await db.find_one(data={"age": 42}))["id"] == 2
+        assert [row["rev"] for row in await db.find_all(table="")] == [2, 2]
+        assert await db.save()
+        assert await db.load()
+        found = await db.find_all(data={"age": {"$gt": 40}})
+        assert [(row["id"], row["rev"]) for row in found] == [(2, 2)]
+
+    asyncio.run(main())
+    assert len(read_lines(filename)) == 4
+    remove_files(filename)
+
+
+def test_async_durable_writes_share_flushes():
+    """Coroutines waiting at the same time are saved by the same flush."""
+    remove_files(filename)
+    db = FiableDB(filename)
+    db.start(journal=True)
+    flushes = []
+    flush = db.flush
+
+    def counted_flush():
+        flushes.append(db.seq)
+        return flush()
+
+    db.flush = counted_flush
+
+    async def main():
+        async_db = AsyncFiableDB(db)
+        await asyncio.gather(*(async_db.add({"n": n}, durable=True) for n in range(50)))
+
+    asyncio.run(main())
+    assert len(read_lines(filename)) == 50
+    assert len(flushes) < 50
+    remove_files(filename)
+
+
+def test_async_write_while_locked():
+    """A write waits in a thread while another thread holds the lock."""
+    remove_files(filename)
+    db = FiableDB(filename)
+    db.start(journal=True)
+    locked = threading.Event()
+    release = threading.Event()
+
+    def hold_lock():
+        with db.lock:
+            locked.set()
+            release.wait()
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    locked.wait()
+
+    async def main():
+        async_db = AsyncFiableDB(db)
+        added = asyncio.ensure_future(async_db.add({"name": "Juan"}))
+        await asyncio.sleep(0.01)
+        # The loop is not blocked meanwhile
+        assert not added.done()
+        release.set()
+        assert (await added)["id"] == 1
+
+    asyncio.run(main())
+    holder.join()
+    remove_files(filename)
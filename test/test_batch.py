@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+import pytest
+from fiabledb import FiableDB
+from .helpers import read_lines, remove_files
+
+filename = "batch.jsonl"
+
+
+def reset() -> FiableDB:
+    """Start an empty database in journal mode."""
+    remove_files(filename)
+    db = FiableDB(filename)
+    db.start(journal=True)
+    return db
+
+
+def test_batch_is_committed_at_once():
+    """Other threads see the writes of a batch when it ends."""
+    db = reset()
+    db.add({"name": "Noelia", "balance": 10})
+    seen = []
+
+    def read():
+        seen.append([row["data"] for row in db.find_all()])
+
+    with db.batch():
+        db.add({"name": "Juan", "balance": 0})
+        db.update(1, {"balance": 5})
+        db.update(2, {"balance": 5})
+        # The batch reads its own writes
+        assert db.find_one(id=2)["data"]["balance"] == 5
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join()
+        # Saving in the batch keeps its writes out of the file
+        assert db.save()
+        assert len(read_lines(filename)) == 1
+    assert seen == [[{"name": "Noelia", "balance": 10}]]
+    assert [row["data"]["balance"] for row in db.find_all()] == [5, 5]
+    assert db.seq == 4
+    remove_files(filename)
+
+
+def test_durable_batch():
+    """A durable batch is saved with one flush when it ends."""
+    db = reset()
+    flushes = []
+    flush = db.flush
+
+    def counted_flush():
+        flushes.append(db.seq)
+        return flush()
+
+    db.flush = counted_flush
+    with db.batch():
+        db.add([{"n": n} for n in range(3)], durable=True)
+        db.delete(1, durable=True)
+        assert flushes == []
+    assert flushes == [4]
+    assert [row["rev"] for row in read_lines(filename)] == [1, 1, 1, 2]
+    assert db.durable_seq == 4
+    remove_files(filename)
+
+
+def test_batch_rollback():
+    """An exception discards the revisions of the batch."""
+    db = reset()
+    db.create_index("name", ordered=True)
+    db.add({"name": "Noelia"})
+    with pytest.raises(KeyError):
+        with db.batch():
+            db.update(1, {"name": "Sara"})
+            db.add({"name": "Juan"})
+            raise KeyError("name")
+    assert len(db.database) == 1
+    assert db.find_one(id=1)["data"] == {"name": "Noelia"}
+    assert db.find_one(data={"name": "Sara"}) is None
+    assert db.find_all(sort="name") == [db.find_one(id=1)]
+    # The ids used are not given again
+    assert db.add({"name": "Luciano"})["id"] == 3
+    assert db.save()
+    assert [row["id"] for row in read_lines(filename)] == [1, 3]
+    remove_files(filename)
+
+
+def test_rollback_only_moves_its_records():
+    """A rollback moves the records of the batch back, without a reload."""
+    db = reset()
+    db.create_index("name", ordered=True)
+    db.add([{"name": "Noelia", "bio": "x" * 100}, {"name": "Juan"}])
+    db.update(1, {"name": "Sara"})
+    assert db.database.is_delta(2)
+    generation = db.generation
+    with pytest.raises(KeyError):
+        with db.batch():
+            db.update(1, {"name": "Luciano"})
+            db.update(1, {"name": "Miguel"})
+            db.delete(2)
+            db.add({"name": "Ana"}, table="users")
+            raise KeyError("name")
+    assert db.generation == generation
+    assert [row["data"]["name"] for row in db.find_all(sort="name")] == [
+        "Juan",
+        "Sara",
+    ]
+    assert db.find_one(data={"name": "Miguel"}) is None
+    assert db.find_one(data={"name": "Sara"})["rev"] == 2
+    assert db.find_all(table="users") == []
+    # The delta at the head is rebuilt from its cached row again
+    assert db.head_rows[("default", 1)][0] == 2
+    assert db.update(1, {"age": 34})["data"]["name"] == "Sara"
+    remove_files(filename)
+
+
+def test_shared_batch():
+    """In shared mode the batch is appended with one write when it ends."""
+    remove_files(filename)
+    first = FiableDB(filename)
+    first.start(shared=True)
+    second = FiableDB(filename)
+    second.start(shared=True)
+    with first.batch():
+        first.add({"name": "Noelia"})
+        first.add({"name": "Juan"})
+        assert not os.path.getsize(filename)
+    assert len(read_lines(filename)) == 2
+    assert [row["id"] for row in second.find_all()] == [1, 2]
+    remove_files(filename)
+
+
+def test_torn_batch():
+    """A batch saved in part is dropped when the journal is read."""
+    for lazy in (False, True):
+        remove_files(filename)
+        # In lazy mode the offsets file has the whole batch
+        db = FiableDB(filename)
+        db.start(journal=True, lazy=lazy)
+        db.add({"name": "Noelia"})
+        with db.batch():
+            db.add([{"name": "Juan"}, {"name": "Sara"}])
+            db.update(1, {"name": "Luciano"})
+        assert db.save()
+        with open(filename, "rb") as f:
+            lines = f.readlines()
+        assert json.loads(lines[1]) == {"batch": 3}
+        # The save was interrupted before the last revision of the batch
+        with open(filename, "wb") as f:
+            f.write(b"".join(lines[:-1]))
+        db = FiableDB(filename)
+        db.start(journal=True, lazy=lazy)
+        assert [row["data"] for row in db.get_database()] == [{"name": "Noelia"}]
+        # The next save overwrites it
+        db.add({"name": "Juan"})
+        assert db.save()
+        db = FiableDB(filename)
+        db.start(journal=True, lazy=lazy)
+        assert [row["id"] for row in db.get_database()] == [1, 2]
+        remove_files(filename)
+
+
+def test_refresh_waits_for_the_batch():
+    """A shared database does not read a batch while it is being appended."""
+    remove_files(filename)
+    first = FiableDB(filename)
+    first.start(shared=True)
+    second = FiableDB(filename)
+    second.start(shared=True)
+    with first.batch():
+        first.add([{"name": "Noelia"}, {"name": "Juan"}])
+    with open(filename, "rb") as f:
+        lines = f.readlines()
+    with open(filename, "wb") as f:
+        f.write(b"".join(lines[:-1]))
+    assert second.refresh() == 0
+    with open(filename, "ab") as f:
+        f.write(lines[-1])
+    assert second.refresh() == 2
+    assert [row["id"] for row in second.find_all()] == [1, 2]
+    remove_files(filename)
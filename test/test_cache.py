@@ -0,0 +1,115 @@
+import threading
+import pytest
+from fiabledb import FiableDB
+
+
+def add_people(db: FiableDB) -> FiableDB:
+    """Add people to two tables of a database that is never saved."""
+    db.add([{"name": "Noelia", "age": 34}, {"name": "Juan", "age": 41}])
+    db.add({"name": "Luciano"}, table="users")
+    return db
+
+
+def test_repeated_searches_are_cached():
+    """The same search returns the cached result until its table is written."""
+    db = add_people(FiableDB("cache.json", cache_size=10))
+    found = db.find_all(data={"age": {"$gt": 30}})
+    assert [row["id"] for row in found] == [1, 2]
+    found.clear()
+    assert [row["id"] for row in db.find_all(data={"age": {"$gt": 30}})] == [1, 2]
+    assert db.find_one(data={"name": "Juan"})["id"] == 2
+    assert db.find_one(data={"name": "Juan"})["id"] == 2
+    assert db.cache_info() == {
+        "hits": 2,
+        "misses": 2,
+        "evictions": 0,
+        "size": 2,
+        "max_size": 10,
+    }
+    # Other options are other searches
+    assert len(db.find_all(data={"age": {"$gt": 30}}, limit=1)) == 1
+    assert db.cache_info()["misses"] == 3
+
+
+def test_writes_invalidate_their_table():
+    """A write to a table makes its cached results stale, not the others."""
+    db = add_people(FiableDB("cache.json", cache_size=10))
+    db.find_all()
+    db.find_all(table="users")
+    db.find_all(table="")
+    db.update(1, {"age": 35})
+    assert db.find_all()[0]["data"]["age"] == 35
+    assert [row["id"] for row in db.find_all(table="users")] == [1]
+    assert len(db.find_all(table="")) == 3
+    info = db.cache_info()
+    assert (info["hits"], info["misses"]) == (1, 5)
+    db.delete(1, table="users")
+    assert db.find_all(table="users")[0]["data"] == {}
+    db.update_many({"age": {"$gt": 30}}, {"active": True})
+    assert db.find_one(data={"active": True})["id"] == 1
+
+
+def test_cache_evictions():
+    """The least recently used results are evicted first."""
+    db = add_people(FiableDB("cache.json", cache_size=2))
+    db.find_all(data={"age": 34})
+    db.find_all(data={"age": 41})
+    db.find_all(data={"age": 34})
+    db.find_all(data={"name": "Juan"})
+    assert db.cache_info()["evictions"] == 1
+    db.find_all(data={"age": 34})
+    assert db.cache_info()["hits"] == 2
+    db.find_all(data={"age": 41})
+    assert db.cache_info()["hits"] == 2
+    db.clear_cache()
+    assert db.cache_info()["size"] == 0
+
+
+def test_cache_keys_keep_types():
+    """Filters that are equal only once encoded do not share a cached result."""
+    db = FiableDB("cache.json", cache_size=10)
+    db.add([{"tags": [1, 2]}, {"tags": (1, 2)}])
+    assert [row["id"] for row in db.find_all(data={"tags": [1, 2]})] == [1]
+    assert [row["id"] for row in db.find_all(data={"tags": (1, 2)})] == [2]
+    assert db.find_one(data={"tags": [1, 2]})["id"] == 1
+    assert db.find_one(data={"tags": (1, 2)})["id"] == 2
+    assert db.cache_info()["hits"] == 0
+    assert db.find_all(data={"tags": [1, 2]})[0]["id"] == 1
+    assert db.cache_info()["hits"] == 1
+    # Filters with values that can not be hashed are not cached
+    db.find_all(data={"tags": [bytearray(b"a")]})
+    db.find_all(data={"tags": [bytearray(b"a")]})
+    assert db.cache_info()["hits"] == 1
+
+
+def test_batch_is_not_cached():
+    """Results seen before a batch commits are not served after it."""
+    db = add_people(FiableDB("cache.json", cache_size=10))
+    seen = []
+
+    def read():
+        seen.append(len(db.find_all()))
+
+    with db.batch():
+        db.add({"name": "Sara"})
+        assert len(db.find_all()) == 3
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join()
+    assert seen == [2]
+    assert len(db.find_all()) == 3
+
+
+def test_no_cache_by_default():
+    """Without cache_size nothing is cached."""
+    db = add_people(FiableDB("cache.json"))
+    db.find_all()
+    db.find_all()
+    assert db.cache_info()["size"] == 0
+    assert db.cache_info()["hits"] == 0
+
+
+def test_invalid_cache_size():
+    """A negative cache size is rejected."""
+    with pytest.raises(ValueError):
+        FiableDB("cache.json", cache_size=-1)
@@ -0,0 +1,71 @@
+import os
+from array import array
+from fiabledb import FiableDB, Revisions, get_snapshot_file
+
+filename = "columns.jsonl"
+
+
+def remove_files():
+    """Delete the journal and its snapshot."""
+    for name in (filename, get_snapshot_file(filename)):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def test_revisions_columns():
+    """Revisions are stored by columns and returned as dicts."""
+    revisions = Revisions(
+        [
+            {"id": 1, "rev": 1, "table": "users", "data": {"name": "Juan"}},
+            {"id": 1, "rev": 2, "table": "users", "set": {"age": 41}, "unset": []},
+            {"id": 1, "rev": 1, "table": "default"},
+            {"id": 2, "rev": 1, "data": {"name": "Noelia"}},
+        ]
+    )
+    assert len(revisions) == 4
+    assert revisions.ids == array("q", [1, 1, 1, 2])
+    assert revisions.revs == array("q", [1, 2, 1, 1])
+    assert revisions.tables == ["users", "default", None]
+    assert list(revisions.table_codes) == [0, 0, 1, 2]
+    assert revisions[0] == {
+        "id": 1,
+        "rev": 1,
+        "table": "users",
+        "data": {"name": "Juan"},
+    }
+    assert revisions[1]["set"] == {"age": 41}
+    assert revisions.is_delta(1)
+    assert revisions[2] == {"id": 1, "rev": 1, "table": "default"}
+    # A revision read without table keeps it that way
+    assert revisions[-1] == {"id": 2, "rev": 1, "data": {"name": "Noelia"}}
+    assert revisions.get_table(3) == "default"
+    assert revisions[1:3] == [revisions[1], revisions[2]]
+    revisions[2] = {"id": 3, "rev": 1, "table": "orders", "data": {"total": 3}}
+    assert list(revisions)[2]["table"] == "orders"
+
+
+def test_database_is_stored_by_columns():
+    """The database keeps its revisions by columns, the API returns dicts."""
+    remove_files()
+    db = FiableDB(filename)
+    db.start(journal=True)
+    db.add([{"name": "Juan"}, {"name": "Noelia"}])
+    db.add({"name": "Sara"}, table="users")
+    db.update(1, {"age": 41})
+    assert isinstance(db.database, Revisions)
+    assert list(db.database.ids) == [1, 2, 1, 1]
+    assert db.database.tables == ["default", "users"]
+    assert db.find_one(id=1) == {
+        "id": 1,
+        "rev": 2,
+        "table": "default",
+        "data": {"name": "Juan", "age": 41},
+    }
+    assert db.get_database()[2]["table"] == "users"
+    assert db.save()
+    assert db.checkpoint()
+    db = FiableDB(filename)
+    db.start()
+    assert isinstance(db.database, Revisions)
+    assert db.find_one(id=1, table="users")["data"] == {"name": "Sara"}
+    remove_files()
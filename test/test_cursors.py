@@ -0,0 +1,96 @@
+import pytest
+from fiabledb import FiableDB
+
+
+def add_users(db: FiableDB) -> FiableDB:
+    """Add 10 users to a database that is never saved."""
+    db.add([{"name": f"user{i}", "age": (i * 7) % 10} for i in range(1, 11)])
+    db.add({"name": "no age"})
+    db.update(3, {"age": "unknown"})
+    return db
+
+
+def ids(records) -> list:
+    """The ids of some records."""
+    return [row["id"] for row in records]
+
+
+def test_limit_offset_after_id():
+    """Pages of the records in id order."""
+    db = add_users(FiableDB("cursors.json"))
+    assert ids(db.find_all(limit=3)) == [1, 2, 3]
+    assert ids(db.find_all(limit=3, offset=3)) == [4, 5, 6]
+    assert ids(db.find_all(after_id=9)) == [10, 11]
+    assert ids(db.find_all(after_id=4, limit=2)) == [5, 6]
+    assert ids(db.find_all(data={"age": {"$gte": 5}}, after_id=5)) == [7, 8]
+    assert db.find_all(limit=0) == []
+    db.create_index("age")
+    assert ids(db.find_all(data={"age": {"$in": [1, 4, 8]}}, after_id=1)) == [2, 4]
+    assert ids(db.find_all(table="", after_id=10)) == [11]
+    with pytest.raises(ValueError):
+        db.find_all(limit=-1)
+    with pytest.raises(ValueError):
+        db.find_all(after_id=-1)
+
+
+def test_sort_and_fields():
+    """Sorted by a data field, numbers first, then strings, then the rest."""
+    db = add_users(FiableDB("cursors.json"))
+    assert ids(db.find_all(sort="age")) == [10, 6, 9, 2, 5, 8, 1, 4, 7, 3, 11]
+    assert ids(db.find_all(sort="-age", limit=3)) == [7, 4, 1]
+    # Only the values are reversed, the groups and the ids keep their order
+    assert ids(db.find_all(sort="-age")) == [7, 4, 1, 8, 5, 2, 9, 6, 10, 3, 11]
+    assert ids(db.find_all(sort="age", offset=2, limit=2)) == [9, 2]
+    assert ids(db.find_all(data={"age": {"$lt": 3}}, sort="-age")) == [6, 10]
+    assert db.find_all(fields=["name"], limit=1) == [
+        {"id": 1, "rev": 1, "table": "default", "data": {"name": "user1"}}
+    ]
+    assert db.find_all(fields=["age"], after_id=10) == [
+        {"id": 11, "rev": 1, "table": "default", "data": {}}
+    ]
+    with pytest.raises(ValueError):
+        db.find_all(sort="-")
+
+
+def test_sort_descending_ties():
+    """Records with the same value stay in id order in descending order."""
+    db = FiableDB("cursors.json")
+    db.add([{"age": 3}, {"name": "b"}, {"age": "x"}, {"age": 3}, {"age": 5}])
+    assert ids(db.find_all(sort="-age")) == [5, 1, 4, 3, 2]
+    assert ids(db.find_all(sort="-age", limit=2)) == [5, 1]
+    assert ids(db.find_all(sort="age")) == [1, 4, 5, 3, 2]
+    with pytest.raises(TypeError):
+        db.find_all(fields="name")
+
+
+def test_cursor():
+    """A cursor reads the records as they are needed."""
+    db = add_users(FiableDB("cursors.json", read_only=True))
+    cursor = db.find_all(cursor=True, fields=["name"])
+    assert next(cursor)["data"] == {"name": "user1"}
+    # Written after the cursor started, it is not seen
+    db.add({"name": "late"})
+    db.update(2, {"name": "changed"})
+    assert [row["data"]["name"] for row in cursor][:2] == ["user2", "user3"]
+    with pytest.raises(TypeError):
+        next(db.find_all(cursor=True))["rev"] = 3
+    assert len(list(db.find_all(cursor=True, data={"age": 0}))) == 1
+
+
+def test_cursor_starts_when_it_is_returned():
+    """A record added before the first read of a cursor is not seen."""
+    db = add_users(FiableDB("cursors.json"))
+    cursor = db.find_all(cursor=True)
+    db.add({"name": "late"})
+    assert len(list(cursor)) == 11
+
+
+def test_cursor_fails_after_a_reload():
+    """Reloading the database while reading a cursor raises an error."""
+    db = add_users(FiableDB("cursors.json"))
+    cursor = db.find_all(cursor=True)
+    next(cursor)
+    # Creating an index makes the readers wait, like load()
+    db.create_index("age")
+    with pytest.raises(RuntimeError):
+        next(cursor)
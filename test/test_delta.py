@@ -0,0 +1,99 @@
+import os
+from fiabledb import FiableDB
+from .helpers import remove_files
+
+filename = "delta.jsonl"
+
+
+def reset(keyframe_interval: int = 10, journal: bool = True) -> FiableDB:
+    """Start an empty database."""
+    remove_files(filename)
+    db = FiableDB(filename, keyframe_interval=keyframe_interval)
+    db.start(journal=journal)
+    return db
+
+
+def fill(db: FiableDB) -> list:
+    """Update a record many times and return the data of every revision."""
+    data = {"name": "Juan", "bio": "x" * 1000, "visits": 0}
+    db.add(data)
+    expected = [dict(data)]
+    for visits in range(1, 35):
+        db.update(1, {"visits": visits})
+        data["visits"] = visits
+        expected.append(dict(data))
+    return expected
+
+
+def test_updates_are_stored_as_deltas():
+    """Only every keyframe_interval revisions is stored whole."""
+    db = reset()
+    expected = fill(db)
+    keyframes = [pos for pos, row in enumerate(db.database) if "data" in row]
+    assert keyframes == [0, 10, 20, 30]
+    assert db.database[1] == {
+        "id": 1,
+        "rev": 2,
+        "table": "default",
+        "set": {"visits": 1},
+        "unset": [],
+    }
+    for rev, data in enumerate(expected, 1):
+        assert db.find_one(id=1, rev=rev)["data"] == data
+    latest = db.find_one(id=1)
+    assert latest == {"id": 1, "rev": 35, "table": "default", "data": expected[-1]}
+    assert [row["data"] for row in db.get_database()] == expected
+    os.remove(filename)
+
+
+def test_deltas_unset_keys():
+    """Keys set to None are unset, forced updates are stored whole."""
+    db = reset()
+    db.add({"name": "Juan", "age": 41})
+    db.update(1, {"age": None, "email": "juan@example.com"})
+    assert db.database[1]["unset"] == ["age"]
+    expected = {"name": "Juan", "email": "juan@example.com"}
+    assert db.find_one(id=1)["data"] == expected
+    db.delete(1)
+    assert db.database[2]["data"] == {}
+    assert db.find_one(id=1, rev=2)["data"] == expected
+    os.remove(filename)
+
+
+def test_deltas_after_load():
+    """The file keeps whole revisions, deltas are computed again when loading."""
+    for journal in (True, False):
+        db = reset(journal=journal)
+        expected = fill(db)
+        db.update(1, {"visits": True})
+        expected.append({**expected[-1], "visits": True})
+        db.save()
+        db = FiableDB(filename, keyframe_interval=10)
+        db.start()
+        assert sum("set" in row for row in db.database) == 32
+        assert [row["data"] for row in db.get_database()] == expected
+        assert db.find_one(id=1)["data"]["visits"] is True
+    os.remove(filename)
+
+
+def test_deltas_in_checkpoint():
+    """Deltas and the cached heads are restored from a snapshot."""
+    db = reset()
+    expected = fill(db)
+    db.save()
+    assert db.checkpoint()
+    db = FiableDB(filename, keyframe_interval=10)
+    db.start()
+    assert db.find_one(id=1)["data"] == expected[-1]
+    assert db.find_one(id=1, rev=15)["data"] == expected[14]
+    db.update(1, {"visits": 99})
+    assert db.find_one(id=1)["data"]["visits"] == 99
+    remove_files(filename)
+
+
+def test_keyframe_interval_one():
+    """With an interval of 1 every revision is stored whole."""
+    db = reset(keyframe_interval=1)
+    fill(db)
+    assert all("data" in row for row in db.database)
+    os.remove(filename)
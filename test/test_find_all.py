@@ -0,0 +1,56 @@
+import os
+from fiabledb import add, update, delete, load, save, find_all, find_one
+from .helpers import reset
+
+filename = "fiabledb.json"
+
+
+def test_find_all_latest():
+    """Only the latest revision of every record is returned, ordered by id."""
+    reset(filename)
+    add([{"name": "Noelia", "age": 34}, {"name": "Juan", "age": 41}])
+    update(1, {"age": 35})
+    delete(2)
+    assert find_all() == [
+        {"id": 1, "rev": 2, "table": "default", "data": {"name": "Noelia", "age": 35}},
+        {"id": 2, "rev": 2, "table": "default", "data": {}},
+    ]
+
+
+def test_find_all_filter():
+    """Filter the latest revisions by their data."""
+    reset(filename)
+    add(
+        [
+            {"name": "Noelia", "age": 34},
+            {"name": "Juan", "age": 41},
+            {"name": "Valentina", "age": 34},
+        ]
+    )
+    update(3, {"age": 12})
+    assert [row["id"] for row in find_all(data={"age": 34})] == [1]
+    assert find_one(data={"age": 12})["id"] == 3
+    assert find_one(data={"age": 99}) is None
+
+
+def test_find_all_tables():
+    """Search one table or every table."""
+    reset(filename)
+    add({"name": "Juan"})
+    add({"name": "Simone"}, table="foo")
+    assert [row["data"]["name"] for row in find_all(table="foo")] == ["Simone"]
+    assert [(row["table"], row["id"]) for row in find_all(table="")] == [
+        ("default", 1),
+        ("foo", 1),
+    ]
+
+
+def test_find_all_after_load():
+    """The latest revisions are rebuilt when the database is loaded."""
+    reset(filename)
+    add([{"name": "Noelia"}, {"name": "Juan"}])
+    update(2, {"name": "Sara"})
+    save()
+    load()
+    assert [row["data"]["name"] for row in find_all()] == ["Noelia", "Sara"]
+    os.remove(filename)
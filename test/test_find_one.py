@@ -0,0 +1,57 @@
+import os
+from fiabledb import add, update, load, save, find_one
+from .helpers import reset
+
+filename = "fiabledb.json"
+
+
+def test_find_one_latest():
+    """Find the latest revision of a record by id."""
+    reset(filename)
+    add([{"name": "Noelia", "age": 34}, {"name": "Juan", "age": 41}])
+    update(2, {"age": 42})
+    update(2, {"age": 43})
+    assert find_one(id=2) == {
+        "id": 2,
+        "rev": 3,
+        "table": "default",
+        "data": {"name": "Juan", "age": 43},
+    }
+    assert find_one(id=3) is None
+
+
+def test_find_one_revision():
+    """Find a specific revision, also counting from the end."""
+    reset(filename)
+    add({"name": "Juan", "age": 41})
+    update(1, {"age": 42})
+    update(1, {"age": 43})
+    assert find_one(id=1, rev=1)["data"] == {"name": "Juan", "age": 41}
+    assert find_one(id=1, rev=2)["data"] == {"name": "Juan", "age": 42}
+    assert find_one(id=1, rev=-1)["data"] == {"name": "Juan", "age": 43}
+    assert find_one(id=1, rev=-3)["data"] == {"name": "Juan", "age": 41}
+    assert find_one(id=1, rev=4) is None
+    assert find_one(id=1, rev=-4) is None
+
+
+def test_find_one_table():
+    """The same id in another table is a different record."""
+    reset(filename)
+    add({"name": "Juan"})
+    add({"name": "Simone"}, table="foo")
+    update(1, {"name": "Sara"}, table="foo")
+    assert find_one(id=1)["data"] == {"name": "Juan"}
+    assert find_one(id=1, table="foo")["data"] == {"name": "Sara"}
+    assert find_one(id=1, rev=1, table="foo")["data"] == {"name": "Simone"}
+
+
+def test_find_one_after_load():
+    """The index is rebuilt when the database is loaded."""
+    reset(filename)
+    add({"name": "Juan", "age": 41})
+    update(1, {"age": 42})
+    save()
+    load()
+    assert find_one(id=1)["rev"] == 2
+    assert find_one(id=1, rev=1)["data"] == {"name": "Juan", "age": 41}
+    os.remove(filename)
@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+import time
+import pytest
+from fiabledb import FiableDB
+from .helpers import read_lines, remove_files
+
+filename = "flush.jsonl"
+
+
+def reset() -> FiableDB:
+    """Start an empty database in journal mode."""
+    remove_files(filename)
+    db = FiableDB(filename)
+    db.start(journal=True)
+    return db
+
+
+def test_durable_write_is_saved():
+    """A durable write is in the file when it returns."""
+    db = reset()
+    db.add({"name": "Noelia"})
+    assert read_lines(filename) == []
+    db.update(1, {"age": 34}, durable=True)
+    assert [row["rev"] for row in read_lines(filename)] == [1, 2]
+    db.delete(1, durable=True)
+    assert read_lines(filename)[-1]["data"] == {}
+    assert db.durable_seq == 3
+    os.remove(filename)
+
+
+def test_flusher_saves_pending_revisions():
+    """The flusher saves after the interval, or earlier with enough revisions."""
+    db = reset()
+    db.start_flusher(interval=10000, records=5)
+    db.add([{"n": n} for n in range(5)])
+    for _ in range(100):
+        if len(read_lines(filename)) == 5:
+            break
+        time.sleep(0.01)
+    assert len(read_lines(filename)) == 5
+    db.add({"n": 5})
+    db.stop_flusher()
+    assert len(read_lines(filename)) == 6
+    assert db.flusher is None
+
+    db.start_flusher(interval=10)
+    db.update(6, {"n": 6})
+    for _ in range(100):
+        if len(read_lines(filename)) == 7:
+            break
+        time.sleep(0.01)
+    db.stop_flusher()
+    assert len(read_lines(filename)) == 7
+    os.remove(filename)
+
+
+def test_durable_writers_share_flushes():
+    """Writers waiting at the same time are saved by the same flush."""
+    db = reset()
+    flushes = []
+    flush = db.flush
+
+    def slow_flush():
+        flushes.append(db.seq)
+        time.sleep(0.01)
+        return flush()
+
+    db.flush = slow_flush
+
+    def writer():
+        for i in range(10):
+            db.add({"n": i}, durable=True)
+
+    threads = [threading.Thread(target=writer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(read_lines(filename)) == 80
+    assert len(flushes) < 80
+    os.remove(filename)
+
+
+def test_durable_write_failure():
+    """A durable writer gets an error when the database can not be saved."""
+    db = reset()
+    db.save = lambda file_name="": False
+    with pytest.raises(IOError):
+        db.add({"name": "Juan"}, durable=True)
+    assert db.durable_seq == 0
+    assert not db.flushing
+    os.remove(filename)
+
+
+def test_durable_write_failure_keeps_the_file(monkeypatch):
+    """A save failing in the middle does not destroy what was saved before."""
+    filename = "flush.json"
+    db = FiableDB(filename)
+    db.start()
+    db.add({"name": "Noelia"}, durable=True)
+
+    def broken_dump(rows, f, **options):
+        f.write("[")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(json, "dump", broken_dump)
+    with pytest.raises(IOError):
+        db.add({"name": "Juan"}, durable=True)
+    monkeypatch.undo()
+    with open(filename) as f:
+        assert [row["data"] for row in json.load(f)] == [{"name": "Noelia"}]
+    assert not os.path.exists(filename + ".tmp")
+    os.remove(filename)
@@ -0,0 +1,75 @@
+import pytest
+import fiabledb
+from fiabledb import FiableDB, compare_data
+
+
+def add_visits(db: FiableDB) -> FiableDB:
+    """Add a record of 35 revisions and a user to a database that is never saved."""
+    db.add({"name": "Juan", "visits": 0})
+    for visits in range(1, 35):
+        db.update(1, {"visits": visits})
+    db.add({"name": "Noelia"}, table="users")
+    return db
+
+
+def test_history():
+    """The revisions of a record are returned in order, from start on."""
+    db = add_visits(FiableDB("history.json", keyframe_interval=10))
+    revisions = list(db.history(1))
+    assert [row["rev"] for row in revisions] == list(range(1, 36))
+    assert [row["data"]["visits"] for row in revisions] == list(range(35))
+    assert revisions == [db.find_one(id=1, rev=rev) for rev in range(1, 36)]
+    assert [row["rev"] for row in db.history(1, start=30)] == list(range(30, 36))
+    assert [row["rev"] for row in db.history(1, start=-3)] == [33, 34, 35]
+    assert [row["rev"] for row in db.history(1, start=5, limit=3)] == [5, 6, 7]
+    assert list(db.history(1, limit=0)) == []
+    assert list(db.history(1, start=99)) == []
+    assert list(db.history(2)) == []
+    assert [row["data"] for row in db.history(1, table="users")] == [{"name": "Noelia"}]
+    with pytest.raises(ValueError):
+        db.history(0)
+    with pytest.raises(ValueError):
+        db.history(1, limit=-1)
+
+
+def test_history_pages(monkeypatch):
+    """The revisions are read in pages, revisions written meanwhile are seen."""
+    monkeypatch.setattr(fiabledb, "HISTORY_PAGE_SIZE", 4)
+    db = add_visits(FiableDB("history.json", keyframe_interval=10))
+    history = db.history(1, start=20)
+    assert next(history)["rev"] == 20
+    db.update(1, {"visits": 35})
+    assert [row["rev"] for row in history] == list(range(21, 37))
+    assert [row["rev"] for row in db.history(1, limit=6)] == list(range(1, 7))
+
+
+def test_history_read_only():
+    """The revisions are read-only views with read_only."""
+    db = add_visits(FiableDB("history.json", keyframe_interval=10, read_only=True))
+    row = next(db.history(1))
+    with pytest.raises(TypeError):
+        row["data"]["visits"] = 10
+
+
+def test_diff():
+    """Keys added, removed and changed between two revisions."""
+    db = add_visits(FiableDB("history.json", keyframe_interval=10))
+    db.update(1, {"name": None, "email": "juan@example.com", "visits": 35.0})
+    assert db.diff(1, 1, 36) == {
+        "added": {"email": "juan@example.com"},
+        "removed": {"name": "Juan"},
+        "changed": {"visits": {"old": 0, "new": 35.0}},
+    }
+    # 34 and 35.0 are equal, but not the same type
+    assert db.diff(1, -2, -1)["changed"] == {"visits": {"old": 34, "new": 35.0}}
+    assert db.diff(1, 2, 2) == {"added": {}, "removed": {}, "changed": {}}
+    assert db.diff(1, 1, 99) is None
+    assert db.diff(5, 1, 2) is None
+
+
+def test_compare_data():
+    """Lists and dicts are compared by value."""
+    assert compare_data({"tags": ["a"]}, {"tags": ["a"]})["changed"] == {}
+    assert compare_data({"a": 1}, {"a": True})["changed"] == {
+        "a": {"old": 1, "new": True}
+    }
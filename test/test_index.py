@@ -0,0 +1,76 @@
+import os
+from fiabledb import (
+    add,
+    update,
+    delete,
+    load,
+    save,
+    find_all,
+    find_one,
+    create_index,
+    drop_index,
+    find_candidates,
+)
+from .helpers import reset
+
+filename = "fiabledb.json"
+
+
+def test_create_index():
+    """An index only holds the latest value of every record."""
+    reset(filename)
+    add(
+        [
+            {"name": "Noelia", "email": "noelia@example.com"},
+            {"name": "Juan", "email": "juan@example.com"},
+        ]
+    )
+    assert create_index("email")
+    assert not create_index("email")
+    update(2, {"email": "juan@example.org"})
+    assert find_candidates({"email": "juan@example.com"}) == []
+    assert find_candidates({"email": "juan@example.org"}) == [2]
+    assert find_one(data={"email": "juan@example.org"})["data"]["name"] == "Juan"
+    assert find_one(data={"email": "juan@example.com"}) is None
+    delete(1)
+    assert find_all(data={"email": "noelia@example.com"}) == []
+
+
+def test_index_several_fields():
+    """Filters on several indexed fields intersect their candidates."""
+    reset(filename)
+    add(
+        [
+            {"name": "Noelia", "age": 34, "city": "Valencia"},
+            {"name": "Juan", "age": 41, "city": "Valencia"},
+            {"name": "Valentina", "age": 34, "city": "Madrid"},
+        ]
+    )
+    create_index("age")
+    create_index("city")
+    assert find_candidates({"age": 34, "city": "Valencia"}) == [1]
+    assert find_candidates({"name": "Juan"}) is None
+    assert [row["id"] for row in find_all(data={"age": 34})] == [1, 3]
+    assert find_all(data={"age": 34, "name": "Juan"}) == []
+
+
+def test_index_unhashable():
+    """Lists and dicts can be indexed too."""
+    reset(filename)
+    add([{"tags": ["a", "b"]}, {"tags": {"x": 1, "y": 2}}])
+    create_index("tags")
+    assert find_one(data={"tags": ["a", "b"]})["id"] == 1
+    assert find_one(data={"tags": {"y": 2, "x": 1}})["id"] == 2
+
+
+def test_index_after_load():
+    """Indexes are rebuilt when the database is loaded."""
+    reset(filename)
+    create_index("name")
+    add([{"name": "Noelia"}, {"name": "Juan"}])
+    save()
+    load()
+    assert find_candidates({"name": "Juan"}) == [2]
+    assert drop_index("name")
+    assert find_candidates({"name": "Juan"}) is None
+    os.remove(filename)
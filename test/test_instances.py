@@ -0,0 +1,69 @@
+import os
+import fiabledb
+from fiabledb import FiableDB
+
+first_file = "first.json"
+second_file = "second.jsonl"
+
+
+def remove_files():
+    """Delete the files of both databases."""
+    for file_name in (first_file, second_file):
+        if os.path.exists(file_name):
+            os.remove(file_name)
+
+
+def test_instances_are_independent():
+    """Every instance keeps its own revisions, ids and indexes."""
+    remove_files()
+    first = FiableDB(first_file)
+    first.start()
+    second = FiableDB()
+    second.start(second_file, journal=True)
+    first.add([{"name": "Noelia"}, {"name": "Juan"}])
+    second.add({"name": "Simone"})
+    second.create_index("name")
+    assert first.find_one(id=2)["data"] == {"name": "Juan"}
+    assert second.find_one(id=2) is None
+    assert second.find_one(data={"name": "Simone"})["id"] == 1
+    assert first.find_all(data={"name": "Simone"}) == []
+    assert first.data_indexes == {}
+    remove_files()
+
+
+def test_instances_save_and_load():
+    """Every instance saves to and loads from its own file."""
+    remove_files()
+    first = FiableDB(first_file)
+    first.start()
+    second = FiableDB(second_file)
+    second.start(journal=True)
+    first.add({"name": "Noelia"})
+    first.update(1, {"age": 34})
+    second.add({"name": "Juan"})
+    assert first.save() and second.save()
+    first = FiableDB(first_file)
+    first.start()
+    second = FiableDB(second_file)
+    second.start()
+    assert first.find_one(id=1) == {
+        "id": 1,
+        "rev": 2,
+        "table": "default",
+        "data": {"name": "Noelia", "age": 34},
+    }
+    assert second.journal
+    assert [row["data"] for row in second.get_database()] == [{"name": "Juan"}]
+    remove_files()
+
+
+def test_module_functions_use_default_db():
+    """The module functions do not touch other instances."""
+    remove_files()
+    other = FiableDB(first_file)
+    other.start()
+    fiabledb.start(second_file)
+    fiabledb.add({"name": "Valentina"})
+    assert fiabledb.default_db.find_one(id=1)["data"] == {"name": "Valentina"}
+    assert other.get_database() == []
+    remove_files()
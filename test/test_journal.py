@@ -0,0 +1,73 @@
+import json
+import os
+from fiabledb import start, add, update, save, load, get_database, find_one
+from .helpers import read_lines, reset
+
+filename = "fiabledb.jsonl"
+
+
+def test_journal_append():
+    """save() only appends the new revisions."""
+    reset(filename, journal=True)
+    add([{"name": "Noelia", "age": 34}, {"name": "Juan", "age": 41}])
+    save()
+    assert read_lines(filename) == get_database()
+    size = os.path.getsize(filename)
+    update(2, {"age": 42})
+    save()
+    with open(filename, "rb") as f:
+        f.seek(size)
+        assert json.loads(f.read()) == {
+            "id": 2,
+            "rev": 2,
+            "table": "default",
+            "data": {"name": "Juan", "age": 42},
+        }
+    save()
+    assert len(read_lines(filename)) == 3
+
+
+def test_journal_load():
+    """load() replays the journal and start() keeps its format."""
+    reset(filename, journal=True)
+    add({"name": "Noelia", "age": 34})
+    update(1, {"age": 35})
+    save()
+    expected = get_database()
+    start(filename)
+    assert get_database() == expected
+    add({"name": "Juan"})
+    save()
+    load()
+    assert find_one(id=2)["data"] == {"name": "Juan"}
+    assert len(read_lines(filename)) == 3
+    os.remove(filename)
+
+
+def test_journal_interrupted_save():
+    """An incomplete last line is ignored and overwritten by the next save."""
+    reset(filename, journal=True)
+    add({"name": "Noelia"})
+    save()
+    with open(filename, "a") as f:
+        f.write('{"id": 2, "rev": 1, "tab')
+    load()
+    assert len(get_database()) == 1
+    add({"name": "Juan"})
+    save()
+    assert [row["id"] for row in read_lines(filename)] == [1, 2]
+    os.remove(filename)
+
+
+def test_convert_to_journal():
+    """A JSON file is rewritten as a journal on the first save."""
+    reset(filename, journal=False)
+    add({"name": "Noelia"})
+    save()
+    with open(filename) as f:
+        assert json.load(f) == get_database()
+    start(filename, journal=True)
+    add({"name": "Juan"})
+    save()
+    assert read_lines(filename) == get_database()
+    os.remove(filename)
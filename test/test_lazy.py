@@ -0,0 +1,141 @@
+import os
+import fiabledb
+from fiabledb import (
+    start,
+    add,
+    update,
+    save,
+    load,
+    checkpoint,
+    create_index,
+    drop_index,
+    get_database,
+    get_offsets_file,
+    get_snapshot_file,
+    find_one,
+    find_all,
+)
+
+filename = "fiabledb.jsonl"
+
+
+def reset():
+    """Start from an empty lazy journal."""
+    for name in (filename, get_snapshot_file(filename), get_offsets_file(filename)):
+        if os.path.exists(name):
+            os.remove(name)
+    start(filename, journal=True, lazy=True)
+
+
+def test_lazy_save():
+    """Saved revisions only keep their metadata in memory."""
+    reset()
+    add([{"name": "Noelia", "age": 34}, {"name": "Juan", "age": 41}])
+    save()
+    update(2, {"age": 42})
+    assert fiabledb.default_db.database[0] == {"id": 1, "rev": 1, "table": "default"}
+    # Only the change is kept in memory until it is saved
+    assert fiabledb.default_db.database[2] == {
+        "id": 2,
+        "rev": 2,
+        "table": "default",
+        "set": {"age": 42},
+        "unset": [],
+    }
+    assert find_one(id=2, rev=1)["data"] == {"name": "Juan", "age": 41}
+    assert find_one(id=2)["data"] == {"name": "Juan", "age": 42}
+    save()
+    assert "data" not in fiabledb.default_db.database[2]
+    assert find_one(id=2)["data"] == {"name": "Juan", "age": 42}
+    assert [row["data"]["age"] for row in find_all()] == [34, 42]
+
+
+def test_lazy_load():
+    """Loading reads the offsets file and the revisions saved after it."""
+    reset()
+    add([{"name": "Noelia"}, {"name": "Juan"}])
+    save()
+    expected = get_database()
+    start(filename, lazy=True)
+    assert all("data" not in row for row in fiabledb.default_db.database)
+    assert get_database() == expected
+    # Saved without updating the offsets file
+    start(filename, lazy=False)
+    add({"name": "Valentina"})
+    save()
+    start(filename, lazy=True)
+    assert find_one(id=3)["data"] == {"name": "Valentina"}
+    assert os.path.getsize(get_offsets_file(filename)) > 0
+    load()
+    assert len(get_database()) == 3
+
+
+def test_lazy_stale_offsets():
+    """An offsets file that does not match the journal is not used."""
+    reset()
+    add([{"name": "Noelia"}, {"name": "Juan"}])
+    save()
+    with open(filename, "wb") as f:
+        f.write(b'{"id":1,"rev":1,"table":"default","data":{"name":"Sara"}}\n')
+    load()
+    assert get_database() == [
+        {"id": 1, "rev": 1, "table": "default", "data": {"name": "Sara"}}
+    ]
+
+
+def test_lazy_index():
+    """Indexes read the data of the latest revisions."""
+    reset()
+    add([{"name": "Noelia"}, {"name": "Juan"}])
+    save()
+    create_index("name")
+    update(2, {"name": "Sara"})
+    save()
+    load()
+    assert find_one(data={"name": "Sara"})["id"] == 2
+    assert find_one(data={"name": "Juan"}) is None
+    drop_index("name")
+
+
+def test_lazy_checkpoint():
+    """A checkpoint keeps every revision."""
+    reset()
+    add([{"name": "Noelia"}, {"name": "Juan"}])
+    save()
+    expected = get_database()
+    assert checkpoint()
+    assert get_database() == expected
+    add({"name": "Valentina"})
+    save()
+    load()
+    assert find_one(id=1)["data"] == {"name": "Noelia"}
+    assert find_one(id=3)["data"] == {"name": "Valentina"}
+    assert "data" not in fiabledb.default_db.database[2]
+
+
+def test_lazy_checkpoint_stays_lazy():
+    """The revisions of a checkpoint are read from the snapshot, not memory."""
+    reset()
+    add([{"name": f"User {index}"} for index in range(1000)])
+    save()
+    assert checkpoint()
+
+    def in_memory():
+        return sum(
+            payload is not None for payload in fiabledb.default_db.database.payloads
+        )
+
+    assert in_memory() == 0
+    update(5, {"name": "Sara"})
+    save()
+    assert checkpoint()
+    assert in_memory() == 0
+    start(filename, lazy=True)
+    assert in_memory() == 0
+    assert find_one(id=5)["data"] == {"name": "Sara"}
+    assert find_one(id=5, rev=1)["data"] == {"name": "User 4"}
+    assert len(find_all()) == 1000
+    add({"name": "Valentina"})
+    save()
+    load()
+    assert find_one(id=1001)["data"] == {"name": "Valentina"}
@@ -0,0 +1,60 @@
+import io
+import json
+import os
+import pytest
+from fiabledb import start, add, save, load, get_database, find_one, iter_json_array
+
+filename = "fiabledb.json"
+
+
+def test_iter_json_array():
+    """Items are parsed the same whatever the size of the chunks."""
+    items = [
+        {"id": 1, "rev": 1, "table": "default", "data": {"text": '}, {"a": ['}},
+        {"id": 2, "rev": 1, "table": "default", "data": {"list": [{"a": 1}, {}]}},
+        {"id": 3, "rev": 1, "table": "default", "data": {"number": -12.5e3}},
+    ]
+    for indent in (None, 2):
+        text = json.dumps(items, indent=indent).encode()
+        for chunk_size in (1, 3, 16, 65536):
+            f = io.BytesIO(text)
+            assert list(iter_json_array(f, chunk_size=chunk_size)) == items
+
+
+def test_iter_json_array_corrupted():
+    """Incomplete or malformed arrays are rejected."""
+    for text in (b"[", b'[{"id": 1}', b"[1 2]", b"[1,]", b"[1] 2"):
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_json_array(io.BytesIO(text), chunk_size=2))
+    assert list(iter_json_array(io.BytesIO(b""))) == []
+    assert list(iter_json_array(io.BytesIO(b" [ ] "))) == []
+
+
+def test_load_indexes():
+    """The revisions are indexed while they are loaded."""
+    if os.path.exists(filename):
+        os.remove(filename)
+    start(filename, journal=False)
+    add([{"name": "Noelia"}, {"name": "Juan"}])
+    save()
+    load()
+    assert len(get_database()) == 2
+    assert find_one(id=2)["data"] == {"name": "Juan"}
+    add({"name": "Valentina"})
+    assert find_one(id=3)["rev"] == 1
+    os.remove(filename)
+
+
+def test_load_corrupted():
+    """A corrupted file does not replace the loaded database."""
+    if os.path.exists(filename):
+        os.remove(filename)
+    start(filename, journal=False)
+    add({"name": "Noelia"})
+    with open("corrupted.json", "w") as f:
+        f.write('[{"id": 1, "rev": 1, "table": "default", "data": {}}, {"id"')
+    with pytest.raises(FileNotFoundError):
+        load("corrupted.json")
+    assert find_one(id=1)["data"] == {"name": "Noelia"}
+    os.remove("corrupted.json")
+    os.remove(filename)
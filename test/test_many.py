@@ -0,0 +1,98 @@
+import asyncio
+from fiabledb import AsyncFiableDB, FiableDB
+
+
+def add_people(db: FiableDB) -> FiableDB:
+    """Add some people to a database that is never saved."""
+    db.add(
+        [
+            {"name": "Noelia", "age": 34, "city": "Valencia"},
+            {"name": "Juan", "age": 41, "city": "Madrid"},
+            {"name": "Sara", "age": 12, "city": "Valencia"},
+            {"name": "Luciano", "age": 54, "city": "Valencia"},
+        ]
+    )
+    return db
+
+
+def test_update_many():
+    """Every matching record gets a new revision, the others are kept."""
+    db = add_people(FiableDB("many.json"))
+    updated = db.update_many({"city": "Valencia", "age": {"$gt": 20}}, {"adult": True})
+    assert [(row["id"], row["rev"]) for row in updated] == [(1, 2), (4, 2)]
+    assert updated[0]["data"] == {
+        "name": "Noelia",
+        "age": 34,
+        "city": "Valencia",
+        "adult": True,
+    }
+    assert db.find_one(id=3)["rev"] == 1
+    assert db.update_many({"city": "Madrid"}, {"city": None})[0]["data"] == {
+        "name": "Juan",
+        "age": 41,
+    }
+    assert db.update_many({"city": "Paris"}, {"adult": True}) == []
+    assert [row["id"] for row in db.find_all(data={"adult": True})] == [1, 4]
+
+
+def test_update_many_moves_indexes():
+    """The hash and sorted indexes follow the new revisions."""
+    db = add_people(FiableDB("many.json"))
+    db.create_index("city")
+    db.create_index("age", ordered=True)
+    db.update_many({"city": "Valencia"}, {"city": "Madrid", "age": 20})
+    assert [row["id"] for row in db.find_all(data={"city": "Valencia"})] == []
+    assert [row["id"] for row in db.find_all(data={"city": "Madrid"})] == [1, 2, 3, 4]
+    assert [row["id"] for row in db.find_all(data={"age": {"$lt": 30}})] == [1, 3, 4]
+    assert [row["id"] for row in db.find_all(sort="age")] == [1, 3, 4, 2]
+    assert db.sorted_indexes["default"]["age"]["number"] == [
+        (20, 1),
+        (20, 3),
+        (20, 4),
+        (41, 2),
+    ]
+
+
+def test_update_many_every_table():
+    """With table "" the indexes of every table are updated."""
+    db = add_people(FiableDB("many.json"))
+    db.add([{"name": "Luciano", "x": 1}, {"name": "Sara", "x": 3}], table="users")
+    db.create_index("x", "users")
+    db.create_index("x", "users", ordered=True)
+    db.update_many({"city": "Madrid"}, {"x": 1})
+    updated = db.update_many({"x": 1}, {"x": 2}, table="")
+    assert [(row["table"], row["id"]) for row in updated] == [
+        ("default", 2),
+        ("users", 1),
+    ]
+    assert [row["id"] for row in db.find_all({"x": 2}, table="users")] == [1]
+    assert db.find_all({"x": 1}, table="users") == []
+    assert [row["id"] for row in db.find_all(table="users", sort="x")] == [1, 2]
+    assert [row["id"] for row in db.find_all({"x": {"$gt": 1}}, table="users")] == [
+        1,
+        2,
+    ]
+
+
+def test_delete_many():
+    """The matching records are emptied, their revisions are kept."""
+    db = add_people(FiableDB("many.json"))
+    db.add({"name": "Luciano", "city": "Valencia"}, table="users")
+    deleted = db.delete_many({"city": "Valencia"})
+    assert [(row["id"], row["data"]) for row in deleted] == [(1, {}), (3, {}), (4, {})]
+    assert [row["id"] for row in db.find_all() if row["data"]] == [2]
+    assert db.find_one(id=1, rev=1)["data"]["name"] == "Noelia"
+    assert db.find_one(id=1, table="users")["rev"] == 1
+
+
+def test_async_update_many():
+    """The coroutines mirror update_many and delete_many."""
+
+    async def main():
+        db = AsyncFiableDB(add_people(FiableDB("many.json")))
+        updated = await db.update_many({"age": {"$lt": 40}}, {"young": True})
+        assert [row["id"] for row in updated] == [1, 3]
+        deleted = await db.delete_many({"young": True})
+        assert [row["rev"] for row in deleted] == [3, 3]
+
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+import os
+import shutil
+import pytest
+from fiabledb import PartitionedFiableDB
+from .helpers import remove_files
+
+directory = "partitioned"
+
+
+def reset() -> PartitionedFiableDB:
+    """Start an empty database with two tables."""
+    remove_files(directory)
+    db = PartitionedFiableDB(directory)
+    db.start()
+    db.add({"name": "Miguel", "age": 41})
+    db.add([{"token": "a"}, {"token": "b"}], table="sessions")
+    assert db.save()
+    return db
+
+
+def test_one_file_per_table():
+    """Every table is saved to its own journal."""
+    db = reset()
+    assert sorted(os.listdir(directory)) == ["default.jsonl", "sessions.jsonl"]
+    db.add({"name": "Luciano"}, table="users/admins")
+    assert db.get_tables() == ["default", "sessions", "users/admins"]
+    assert db.find_one(id=1, table="users/admins")["data"] == {"name": "Luciano"}
+    assert db.save()
+    assert "users%2Fadmins.jsonl" in os.listdir(directory)
+    with pytest.raises(ValueError):
+        db.add({"name": "Juan"}, table="")
+    shutil.rmtree(directory)
+
+
+def test_tables_load_on_first_access():
+    """Starting loads no table, only the ones used are read."""
+    reset()
+    db = PartitionedFiableDB(directory)
+    db.start()
+    assert db.tables == {}
+    assert db.get_tables() == ["default", "sessions"]
+    assert [row["data"]["token"] for row in db.find_all(table="sessions")] == ["a", "b"]
+    assert list(db.tables) == ["sessions"]
+    assert db.update(1, {"age": 42})["rev"] == 2
+    assert sorted(db.tables) == ["default", "sessions"]
+    shutil.rmtree(directory)
+
+
+def test_only_dirty_tables_are_saved():
+    """Saving appends only to the tables with new revisions."""
+    db = reset()
+    sizes = {name: os.path.getsize(db.get_table_file(name)) for name in db.get_tables()}
+    db.delete(2, table="sessions")
+    saved = []
+    for table_db in db.tables.values():
+        save = table_db.save
+        table_db.save = lambda save=save, db=table_db: saved.append(db.file) or save()
+    assert db.save()
+    assert saved == [db.get_table_file("sessions")]
+    assert os.path.getsize(db.get_table_file("default")) == sizes["default"]
+    assert os.path.getsize(db.get_table_file("sessions")) > sizes["sessions"]
+    assert db.save()
+    assert len(saved) == 1
+    shutil.rmtree(directory)
+
+
+def test_find_in_every_table():
+    """With table "" every table is searched in order."""
+    db = reset()
+    db.add({"token": "c", "age": 12}, table="sessions")
+    found = db.find_all(table="")
+    assert [(row["table"], row["id"]) for row in found] == [
+        ("default", 1),
+        ("sessions", 1),
+        ("sessions", 2),
+        ("sessions", 3),
+    ]
+    found = db.find_all({"age": {"$gt": 10}}, table="", sort="age", limit=1)
+    assert [row["data"] for row in found] == [{"token": "c", "age": 12}]
+    assert db.find_one(data={"token": "b"}, table="")["table"] == "sessions"
+    shutil.rmtree(directory)
+
+
+def test_find_in_every_table_sorts_before_projecting():
+    """The field sorted by does not have to be returned, the arguments are checked."""
+    db = reset()
+    db.add({"token": "c", "age": 12}, table="sessions")
+    found = db.find_all(table="", sort="-age", fields=["token"], limit=2)
+    assert [(row["table"], row["data"]) for row in found] == [
+        ("default", {}),
+        ("sessions", {"token": "c"}),
+    ]
+    with pytest.raises(ValueError):
+        db.find_all(table="", sort="")
+    shutil.rmtree(directory)
+    # Checked even without tables
+    empty = PartitionedFiableDB(directory)
+    empty.start()
+    with pytest.raises(TypeError):
+        empty.find_all([], table="")
+    with pytest.raises(ValueError):
+        empty.find_all({"age": {"$foo": 1}}, table="")
+    with pytest.raises(ValueError):
+        empty.find_all(table="", sort="-")
+    shutil.rmtree(directory)
+
+
+def test_reads_do_not_create_tables():
+    """Searching a table that does not exist returns nothing and creates no file."""
+    db = reset()
+    assert db.find_all(table="typo") == []
+    assert list(db.find_all(table="typo", cursor=True)) == []
+    assert db.find_one(id=1, table="typo") is None
+    assert db.find_one(data={"name": "Miguel"}, table="typo") is None
+    assert db.get_revision(1, 1, table="typo") is None
+    assert list(db.history(1, table="typo")) == []
+    assert db.diff(1, 1, 2, table="typo") is None
+    assert db.get_tables() == ["default", "sessions"]
+    assert sorted(os.listdir(directory)) == ["default.jsonl", "sessions.jsonl"]
+    shutil.rmtree(directory)
@@ -0,0 +1,90 @@
+import pytest
+from fiabledb import (
+    add,
+    update,
+    find_all,
+    find_one,
+    create_index,
+    find_candidates,
+)
+from .helpers import reset
+
+filename = "fiabledb.json"
+
+
+def add_people():
+    """Add some people to the default table."""
+    add(
+        [
+            {"name": "Noelia", "age": 34},
+            {"name": "Juan", "age": 41},
+            {"name": "Valentina", "age": 12},
+            {"name": "Sara"},
+            {"name": "Cristo", "age": "unknown"},
+        ]
+    )
+
+
+def names(rows):
+    """Get the names of the rows found."""
+    return [row["data"]["name"] for row in rows]
+
+
+def test_operators():
+    """Filter with comparison operators."""
+    reset(filename)
+    add_people()
+    assert names(find_all(data={"age": {"$gt": 34}})) == ["Juan"]
+    assert names(find_all(data={"age": {"$gte": 34}})) == ["Noelia", "Juan"]
+    assert names(find_all(data={"age": {"$lt": 34}})) == ["Valentina"]
+    assert names(find_all(data={"age": {"$gte": 12, "$lte": 34}})) == [
+        "Noelia",
+        "Valentina",
+    ]
+    assert names(find_all(data={"age": {"$in": [12, 41]}})) == ["Juan", "Valentina"]
+    assert names(find_all(data={"age": {"$ne": 34}})) == [
+        "Juan",
+        "Valentina",
+        "Sara",
+        "Cristo",
+    ]
+    assert find_one(data={"age": {"$gt": 40}, "name": "Juan"})["id"] == 2
+
+
+def test_unknown_operator():
+    """Unknown operators are rejected."""
+    reset(filename)
+    with pytest.raises(ValueError):
+        find_all(data={"age": {"$regex": "1"}})
+    with pytest.raises(TypeError):
+        find_all(data={"age": {"$in": 12}})
+
+
+def test_sorted_index():
+    """A sorted index returns the same records as a full scan."""
+    reset(filename)
+    add_people()
+    filters = [
+        {"age": {"$gt": 12}},
+        {"age": {"$gte": 12, "$lt": 41}},
+        {"age": {"$lte": "z"}},
+        {"age": {"$gt": 12, "$lt": "z"}},
+        {"age": {"$in": [34, "unknown"]}},
+        {"age": {"$ne": 41}},
+    ]
+    expected = [find_all(data=data) for data in filters]
+    assert create_index("age", ordered=True)
+    assert [find_all(data=data) for data in filters] == expected
+    assert find_candidates({"age": {"$gt": 12, "$lt": 40}}) == [1]
+    assert find_candidates({"age": {"$ne": 41}}) is None
+
+
+def test_sorted_index_update():
+    """The sorted index follows the latest revisions."""
+    reset(filename)
+    add_people()
+    create_index("age", ordered=True)
+    update(2, {"age": 10})
+    update(3, {"age": None})
+    assert names(find_all(data={"age": {"$lt": 20}})) == ["Juan"]
+    assert find_candidates({"age": {"$lt": 20}}) == [2]
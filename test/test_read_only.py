@@ -0,0 +1,104 @@
+import json
+import os
+import pytest
+from types import MappingProxyType
+from fiabledb import FiableDB, freeze
+from .helpers import remove_files
+
+filename = "read_only.jsonl"
+
+
+def reset(**options) -> FiableDB:
+    """Start an empty database."""
+    remove_files(filename)
+    db = FiableDB(filename, **options)
+    db.start(journal=True)
+    return db
+
+
+def test_freeze():
+    """Dicts are wrapped without copying unless they hold dicts or lists."""
+    data = {"name": "Juan", "age": 41}
+    frozen = freeze(data)
+    assert isinstance(frozen, MappingProxyType)
+    data["age"] = 42
+    assert frozen["age"] == 42
+    nested = freeze({"tags": ["a", {"b": 1}], "address": {"city": "Valencia"}})
+    assert nested["tags"] == ("a", {"b": 1})
+    assert isinstance(nested["tags"][1], MappingProxyType)
+    assert isinstance(nested["address"], MappingProxyType)
+
+
+def test_read_only_results():
+    """Results can not modify the revisions stored."""
+    db = reset(read_only=True)
+    added = db.add({"name": "Juan", "tags": ["a"], "address": {"city": "Valencia"}})
+    db.add([{"name": "Noelia"}])
+    db.update(2, {"age": 34})
+    results = [
+        added,
+        db.find_one(id=1),
+        db.find_one(data={"name": "Noelia"}),
+        *db.find_all(),
+        *db.get_database(),
+        db.delete(2),
+    ]
+    for row in results:
+        with pytest.raises(TypeError):
+            row["rev"] = 10
+        with pytest.raises(TypeError):
+            row["data"]["name"] = "Sara"
+    with pytest.raises(AttributeError):
+        added["data"]["tags"].append("b")
+    with pytest.raises(TypeError):
+        added["data"]["address"]["city"] = "Madrid"
+    assert db.find_one(id=1)["data"]["address"] == {"city": "Valencia"}
+    assert db.find_one(id=2, rev=2) == {
+        "id": 2,
+        "rev": 2,
+        "table": "default",
+        "data": {"name": "Noelia", "age": 34},
+    }
+    assert db.find_one(id=3) is None
+    os.remove(filename)
+
+
+def test_results_are_stored_dicts_by_default():
+    """Without read_only the stored revisions are returned."""
+    db = reset()
+    db.add({"name": "Juan"})
+    assert type(db.find_one(id=1)) is dict
+    assert db.find_one(id=1)["data"] is db.find_one(id=1)["data"]
+    os.remove(filename)
+
+
+def test_trusted_input():
+    """Trusted writes store the data passed, other writes a copy of it."""
+    data = {"name": "Juan", "tags": ["a"]}
+    db = reset()
+    db.add(data)
+    db.update(1, {"tags": data["tags"]})
+    assert db.find_one(id=1)["data"] is not data
+    assert db.find_one(id=1)["data"]["tags"] is not data["tags"]
+
+    db = reset(trusted=True)
+    db.add(data)
+    assert db.find_one(id=1)["data"] is data
+    db.update(1, {"tags": data["tags"]})
+    assert db.find_one(id=1)["data"]["tags"] is data["tags"]
+    db.save()
+    db = FiableDB(filename)
+    db.start()
+    assert db.find_one(id=1)["data"] == data
+    os.remove(filename)
+
+
+def test_read_only_without_table():
+    """Revisions saved without a table are returned without it."""
+    with open(filename, "w") as f:
+        json.dump([{"id": 1, "rev": 1, "data": {"name": "Juan"}}], f)
+    db = FiableDB(filename, read_only=True)
+    db.start()
+    assert db.find_one(id=1) == {"id": 1, "rev": 1, "data": {"name": "Juan"}}
+    assert [row["id"] for row in db.find_all()] == [1]
+    os.remove(filename)
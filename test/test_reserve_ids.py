@@ -0,0 +1,39 @@
+import os
+import pytest
+from fiabledb import FiableDB
+
+filename = "reserve_ids.json"
+
+
+def test_reserve_block():
+    """A block of consecutive ids is never given again."""
+    db = FiableDB(filename)
+    db.add([{"n": 1}, {"n": 2}])
+    assert db.reserve_ids(5) == 3
+    assert db.get_next_id() == 8
+    assert db.add({"n": 3})["id"] == 8
+    assert db.reserve_ids(1, table="users") == 1
+    assert db.add({"n": 4}, table="users")["id"] == 2
+    for count in (0, -1, "2"):
+        with pytest.raises(ValueError):
+            db.reserve_ids(count)
+    assert db.get_next_id() == 9
+
+
+def test_reserve_after_load():
+    """After loading, ids continue after the highest one saved."""
+    if os.path.exists(filename):
+        os.remove(filename)
+    db = FiableDB(filename)
+    db.start()
+    db.add([{"n": 1}, {"n": 2}])
+    db.reserve_ids(10)
+    db.add({"n": 3})
+    db.delete(1)
+    assert db.save()
+    db = FiableDB(filename)
+    db.start()
+    assert db.get_next_id() == 14
+    assert db.reserve_ids(2) == 14
+    assert db.add({"n": 4})["id"] == 16
+    os.remove(filename)
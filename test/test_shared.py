@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import pytest
+from fiabledb import FiableDB
+from .helpers import read_lines, remove_files
+
+filename = "shared.jsonl"
+
+
+def test_shared_instances():
+    """Writes are appended at once and read by the other databases."""
+    remove_files(filename)
+    first = FiableDB(filename)
+    first.start(shared=True)
+    second = FiableDB(filename)
+    second.start(shared=True)
+    first.add({"name": "Noelia"})
+    assert len(read_lines(filename)) == 1
+    assert second.find_one(id=1)["data"] == {"name": "Noelia"}
+    # The ids continue after the ones the other database used
+    assert second.add({"name": "Juan"})["id"] == 2
+    second.update(1, {"age": 34})
+    assert first.find_one(id=1)["rev"] == 2
+    assert [row["id"] for row in first.find_all()] == [1, 2]
+    assert first.save()
+    assert len(read_lines(filename)) == 3
+    with pytest.raises(ValueError):
+        first.checkpoint()
+    remove_files(filename)
+
+
+def test_refresh_reads_only_the_tail():
+    """A refresh reads the new revisions, an incomplete one waits for the rest."""
+    remove_files(filename)
+    db = FiableDB(filename)
+    db.start(shared=True)
+    db.add({"name": "Noelia"})
+    size = db.journal_size
+    with open(filename, "ab") as f:
+        f.write(b'{"id": 2, "rev": 1, "table": "default", "data": {"name": "Juan"}}\n')
+        f.write(b'{"id": 3, "rev": 1, "table": "default", "da')
+    assert db.refresh() == 1
+    assert db.journal_size > size
+    assert db.refresh() == 0
+    with open(filename, "ab") as f:
+        f.write(b'ta": {"name": "Sara"}}\n')
+    assert db.refresh() == 1
+    assert [row["data"]["name"] for row in db.find_all()] == ["Noelia", "Juan", "Sara"]
+    remove_files(filename)
+
+
+def write_records(count: int) -> None:
+    """Add records to the shared journal from another process."""
+    db = FiableDB(filename)
+    db.start(shared=True)
+    for i in range(count):
+        db.add({"pid": os.getpid(), "n": i})
+        db.update(db.find_one(data={"pid": os.getpid(), "n": i})["id"], {"done": True})
+
+
+def test_shared_processes():
+    """Several processes write to the same journal without losing revisions."""
+    remove_files(filename)
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=write_records, args=(25,)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+    db = FiableDB(filename)
+    db.start(shared=True)
+    rows = db.find_all()
+    assert [row["id"] for row in rows] == list(range(1, 101))
+    assert all(row["rev"] == 2 and row["data"]["done"] for row in rows)
+    assert len(read_lines(filename)) == 200
+    remove_files(filename)
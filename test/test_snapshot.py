@@ -0,0 +1,103 @@
+import os
+import pickle
+import pytest
+from fiabledb import (
+    start,
+    add,
+    update,
+    save,
+    load,
+    checkpoint,
+    get_database,
+    get_snapshot_file,
+    find_one,
+)
+
+filename = "fiabledb.jsonl"
+
+
+def reset(journal=True):
+    """Start from an empty journal without snapshot."""
+    for name in (filename, get_snapshot_file(filename)):
+        if os.path.exists(name):
+            os.remove(name)
+    start(filename, journal=journal)
+
+
+def test_checkpoint():
+    """Loading restores the snapshot and replays the rest of the journal."""
+    reset()
+    add([{"name": "Noelia"}, {"name": "Juan"}])
+    update(1, {"age": 34})
+    assert checkpoint()
+    with open(filename) as f:
+        assert f.read() == '{"checkpoint": 3}\n'
+    add({"name": "Valentina"})
+    update(2, {"age": 41})
+    save()
+    expected = get_database()
+    load()
+    assert get_database() == expected
+    assert find_one(id=2)["rev"] == 2
+    assert find_one(id=3)["data"] == {"name": "Valentina"}
+    add({"name": "Sara"})
+    assert find_one(id=4)["rev"] == 1
+
+
+def test_checkpoint_interrupted():
+    """Revisions of the journal already in the snapshot are skipped."""
+    reset()
+    add([{"name": "Noelia"}, {"name": "Juan"}])
+    save()
+    with open(filename, "rb") as f:
+        journal = f.read()
+    checkpoint()
+    # As if the journal was not emptied after writing the snapshot
+    with open(filename, "wb") as f:
+        f.write(journal)
+    load()
+    assert len(get_database()) == 2
+
+
+def test_snapshot_missing():
+    """A journal that starts after a checkpoint needs its snapshot."""
+    reset()
+    add({"name": "Noelia"})
+    checkpoint()
+    os.remove(get_snapshot_file(filename))
+    with pytest.raises(FileNotFoundError):
+        load()
+
+
+def test_checkpoint_needs_journal():
+    """Only journals can be checkpointed."""
+    reset(journal=False)
+    with pytest.raises(ValueError):
+        checkpoint()
+    os.remove(filename)
+
+
+class Exploit:
+    """Creates a file when it is unpickled."""
+
+    def __reduce__(self):
+        return (open, ("unpickled.txt", "w"))
+
+
+def test_snapshot_is_data_only():
+    """The snapshot is not a pickle, a pickle in its place is never loaded."""
+    reset()
+    add([{"name": "Noelia"}, {"name": "Juan"}], table="users")
+    update(1, {"age": 34}, table="users")
+    add({"name": "Sara"})
+    assert checkpoint()
+    with open(get_snapshot_file(filename), "rb") as f:
+        assert f.read().startswith(b"fiabledb-snapshot 4\n")
+    expected = get_database()
+    load()
+    assert get_database() == expected
+    with open(get_snapshot_file(filename), "wb") as f:
+        pickle.dump(Exploit(), f)
+    with pytest.raises(FileNotFoundError):
+        load()
+    assert not os.path.exists("unpickled.txt")
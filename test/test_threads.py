@@ -0,0 +1,90 @@
+import os
+import threading
+from fiabledb import FiableDB
+from .helpers import remove_files
+
+filename = "threads.json"
+
+
+def reset() -> FiableDB:
+    """Start an empty database."""
+    remove_files(filename)
+    db = FiableDB(filename)
+    db.start()
+    return db
+
+
+def run_threads(*targets):
+    """Run every target in its own thread and wait for them."""
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_adds_get_unique_ids():
+    """Ids are never repeated when several threads add at once."""
+    db = reset()
+
+    def writer():
+        for i in range(200):
+            db.add({"n": i})
+
+    run_threads(*[writer] * 4)
+    assert [row["id"] for row in db.find_all()] == list(range(1, 801))
+    os.remove(filename)
+
+
+def test_readers_see_whole_writes():
+    """A batch added at once is seen completely or not at all."""
+    db = reset()
+    db.create_index("batch")
+    db.create_index("n", ordered=True)
+    errors = []
+    done = threading.Event()
+
+    def writer():
+        for batch in range(100):
+            db.add([{"batch": batch, "n": n} for n in range(10)])
+            db.update(batch * 10 + 1, {"n": -1})
+        done.set()
+
+    def reader():
+        while not done.is_set():
+            rows = db.find_all()
+            if len(rows) % 10:
+                errors.append(len(rows))
+            batch = len(rows) // 10 - 1
+            if batch >= 0 and len(db.find_all(data={"batch": batch})) != 10:
+                errors.append(batch)
+            # The sorted index gives the same records as a scan of the snapshot
+            indexed, scanned = db.read(
+                lambda seq: (
+                    list(db.iter_matches({"n": {"$gte": 0}}, seq=seq)),
+                    [row for row in db.iter_latest(seq=seq) if row["data"]["n"] >= 0],
+                )
+            )
+            if indexed != scanned:
+                errors.append("range")
+
+    run_threads(writer, reader, reader)
+    assert errors == []
+    assert len(db.find_all(data={"n": -1})) == 100
+    os.remove(filename)
+
+
+def test_snapshot_ignores_later_revisions():
+    """A read pinned before a write does not see it."""
+    db = reset()
+    db.add({"name": "Noelia"})
+    db.create_index("name")
+    seq = db.seq
+    db.update(1, {"name": "Juan"})
+    db.add({"name": "Noelia"})
+    assert db.get_latest_revision(1, seq=seq)["data"] == {"name": "Noelia"}
+    assert db.get_revision(1, -1, seq=seq)["rev"] == 1
+    assert db.get_revision(1, 2, seq=seq) is None
+    assert [row["id"] for row in db.iter_matches({"name": "Noelia"}, seq=seq)] == [1]
+    assert db.find_one(data={"name": "Noelia"})["id"] == 2
+    os.remove(filename)